@@ -0,0 +1,116 @@
+from counter import TimeIndependentCounter
+from event import CustomerArrival, SimulationTermination
+from simresult import RESULT_FIELDS
+
+"""
+This file contains the batch means method, which estimates confidence intervals from a single long simulation run.
+"""
+
+
+class BatchMeans(object):
+
+    """
+    BatchMeans divides one long simulation run into consecutive batches of a fixed number of packets or a fixed
+    simulation time and treats the results of the batches as (approximately) independent samples.
+
+    After every batch, all fields of SimResult (see RESULT_FIELDS) are counted in a TimeIndependentCounter, so running
+    confidence intervals are available for all of them, including the time dependent ones like the system
+    utilization. Results, that are not available in a batch (nan, e.g. the waiting times of a batch without served
+    packets), are skipped. The system state is kept between the batches, only the counters and the packet numbers are
+    reset, hence the warm-up is done only once.
+    """
+
+    def __init__(self, sim, batch_packets=None, batch_time=None):
+        """
+        Create the batch means method for a simulation, which has not been started yet.
+        :param sim: simulation object
+        :param batch_packets: number of packet arrivals per batch
+        :param batch_time: simulation time per batch in ms (if batch_packets is not given)
+        """
+        if (batch_packets is None) == (batch_time is None):
+            raise ValueError("Batches are defined either by batch_packets or by batch_time.")
+        self.sim = sim
+        self.batch_packets = batch_packets
+        self.batch_time = batch_time
+        self.num_batches = 0
+        self.counters = dict((field, TimeIndependentCounter(field)) for field in RESULT_FIELDS)
+
+    def run_batch(self):
+        """
+        Continue the simulation for one batch and count its results.
+        :return: SimResult object of the batch
+        """
+        sim = self.sim
+        if self.num_batches == 0:
+            sim.event_chain.insert(sim.event_pool.acquire(CustomerArrival, sim.sim_state.now))
+        else:
+            sim.counter_collection.reset()
+            sim.sim_state.start_batch()
+
+        if self.batch_packets is not None:
+            r = sim.process_events(self.batch_packets)
+        else:
+            sim.event_chain.insert(SimulationTermination(sim, sim.sim_state.now + self.batch_time))
+            r = sim.process_events()
+
+        self.num_batches += 1
+        for field in RESULT_FIELDS:
+            value = getattr(r, field)
+            # results, that are not available in this batch (nan, e.g. no served packets), are not counted
+            if value == value:
+                self.counters[field].count(value)
+        return r
+
+    def run(self, max_batches=None, alpha=None, epsilon=None, field="blocking_probability", min_batches=5,
+            print_report=False):
+        """
+        Run batches until max_batches batches are done or the confidence interval of a field is small enough.
+        :param max_batches: maximum number of batches
+        :param alpha: significance level (default: ALPHA of the simulation parameters)
+        :param epsilon: stop as soon as the half width of the confidence interval of field is smaller than epsilon
+        :param field: SimResult field used for the stopping criterion
+        :param min_batches: minimum number of batches before the stopping criterion is checked
+        :param print_report: print the running confidence interval of field after every batch
+        :return: number of batches
+        """
+        if max_batches is None and epsilon is None:
+            raise ValueError("Either max_batches or epsilon has to be given.")
+        if alpha is None:
+            alpha = self.sim.sim_param.ALPHA
+        while True:
+            self.run_batch()
+            if print_report and self.num_batches > 1:
+                print "Batch " + str(self.num_batches) + ": " + field + " = " + str(self.get_mean(field)) + \
+                      " +- " + str(self.get_confidence_interval(field, alpha))
+            if max_batches is not None and self.num_batches >= max_batches:
+                break
+            if epsilon is not None and self.num_batches >= min_batches and \
+                    self.get_confidence_interval(field, alpha) < epsilon:
+                break
+        return self.num_batches
+
+    def get_mean(self, field):
+        """
+        Return the mean of a SimResult field over all batches.
+        """
+        return self.counters[field].get_mean()
+
+    def get_confidence_interval(self, field, alpha=None):
+        """
+        Return the half width of the confidence interval of a SimResult field over all batches.
+        :param field: SimResult field
+        :param alpha: significance level (default: ALPHA of the simulation parameters)
+        """
+        if alpha is None:
+            alpha = self.sim.sim_param.ALPHA
+        return self.counters[field].report_confidence_interval(alpha, print_report=False)
+
+    def report(self, alpha=None):
+        """
+        Print the confidence intervals of all SimResult fields.
+        """
+        if alpha is None:
+            alpha = self.sim.sim_param.ALPHA
+        print "Batch means with " + str(self.num_batches) + " batches:"
+        for field in RESULT_FIELDS:
+            self.counters[field].report_confidence_interval(alpha, print_report=True)
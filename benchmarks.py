@@ -0,0 +1,349 @@
+import math
+import numpy
+import random
+import sys
+import timeit
+try:
+    import tracemalloc
+except ImportError:
+    # not available before python 3.4, only the event allocations are reported then
+    tracemalloc = None
+from simparam import SimParam
+from simulation import Simulation
+from finitequeue import QUEUE_TYPES
+from rng import RNG, ExponentialRNS
+from replication import ReplicationRunner
+from counter import TimeIndependentAutocorrelationCounter
+from bootstrap import bootstrap_confidence_interval
+from snapshot import take_snapshot, restore_snapshot
+import multiprocessing
+from packet import Packet, PacketLedger
+from event import EventChain, CustomerArrival, ServiceCompletion, SimulationTermination, EVENT_CHAIN_TYPES
+
+"""
+This file contains microbenchmarks for the performance critical parts of the simulator.
+Every benchmark prints its results to the console and can be run separately.
+"""
+
+# speedup of the chunked bootstrap over the former resampling loop, that is aimed at
+BOOTSTRAP_TARGET_SPEEDUP = 20
+
+
+def run_timed_simulation(sim_param):
+    """
+    Run a single simulation with the given parameters and measure its wall clock time.
+    The number of events is estimated from the number of arrivals and the number of accepted packets.
+    :param sim_param: SimParam object used for the simulation
+    :return: number of processed events and elapsed time in seconds
+    """
+    sim = Simulation(sim_param)
+    start = timeit.default_timer()
+    r = sim.do_simulation()
+    elapsed = timeit.default_timer() - start
+    return r.packets_total + r.packets_served, elapsed
+
+
+def benchmark_finite_queue(sim_time=100000, s=10000, rho=.9):
+    """
+    Compare the buffer implementations in a raw add/remove loop and in a complete simulation run.
+    :param sim_time: simulation time of the full runs
+    :param s: buffer size S
+    :param rho: offered load
+    """
+    print "Finite queue benchmark (S = " + str(s) + ")"
+    for queue_type in sorted(QUEUE_TYPES):
+        sim_param = SimParam()
+        sim_param.S = s
+        sim_param.RHO = rho
+        sim_param.SIM_TIME = sim_time
+        sim_param.QUEUE_TYPE = queue_type
+
+        # raw queue operations: fill the queue and empty it again
+        q = QUEUE_TYPES[queue_type](Simulation(sim_param))
+        ops = 2 * s
+        t = min(timeit.repeat(lambda: ([q.add(i) for i in xrange(s)], [q.remove() for _ in xrange(s)]),
+                              number=1, repeat=5))
+        print "  " + queue_type + ": " + str(int(ops / t)) + " queue operations/s"
+
+        events, elapsed = run_timed_simulation(sim_param)
+        print "  " + queue_type + ": " + str(int(events / elapsed)) + " events/s (" + str(events) + " events in " + \
+              str(round(elapsed, 2)) + "s)"
+
+
+def benchmark_packet_ledger(n=1000000):
+    """
+    Compare the cost of allocating a Packet object per arrival with registering the packet in the PacketLedger.
+    Memory is given per packet that is in the system at the same time.
+    :param n: number of packets
+    """
+    sim = Simulation(SimParam())
+    print "Packet ledger benchmark (" + str(n) + " packets)"
+
+    def objects():
+        for i in xrange(n):
+            p = Packet(sim, 1.)
+            p.start_service()
+            p.complete_service()
+            p.get_waiting_time(), p.get_service_time(), p.get_system_time()
+
+    ledger = PacketLedger(sim)
+
+    def columns():
+        for i in xrange(n):
+            packet_id = ledger.add_packet(1.)
+            ledger.start_service(packet_id)
+            ledger.complete_service(packet_id)
+            ledger.get_times(packet_id)
+            ledger.release(packet_id)
+
+    p = Packet(sim, 1.)
+    t = timeit.timeit(objects, number=1)
+    print "  Packet objects: " + str(int(n / t)) + " packets/s, " + \
+          str(sys.getsizeof(p) + sys.getsizeof(p.__dict__)) + " bytes/packet"
+    t = timeit.timeit(columns, number=1)
+    print "  PacketLedger:   " + str(int(n / t)) + " packets/s, " + \
+          str(4 * ledger.t_arrival.itemsize) + " bytes/packet"
+
+
+def benchmark_event_chain(n=1000000, sim_time=100000):
+    """
+    Compare the keyed event chain with the event chain comparing SimEvent objects directly.
+    The first part is a hold model with the pending events of an M/M/1/S simulation (arrival, service completion
+    and termination): the oldest event is removed and a new one is inserted. The second part runs the simulation.
+    :param n: number of push/pop pairs in the hold model
+    :param sim_time: simulation time of the full runs
+    """
+    print "Event chain benchmark"
+    for keyed in [False, True]:
+        mode = "keyed " if keyed else "object"
+        sim = Simulation(SimParam())
+        rng = sim.rng
+        chain = EventChain(keyed=keyed)
+        chain.insert(CustomerArrival(sim, 0))
+        chain.insert(ServiceCompletion(sim, 0))
+        chain.insert(SimulationTermination(sim, float("inf")))
+
+        def hold():
+            for _ in xrange(n):
+                e = chain.remove_oldest_event()
+                if isinstance(e, CustomerArrival):
+                    chain.insert(CustomerArrival(sim, e.timestamp + rng.get_iat()))
+                else:
+                    chain.insert(ServiceCompletion(sim, e.timestamp + rng.get_st()))
+
+        t = timeit.timeit(hold, number=1)
+        print "  " + mode + ": " + str(int(n / t)) + " push/pop pairs/s (hold model)"
+
+        sim_param = SimParam()
+        sim_param.SIM_TIME = sim_time
+        sim = Simulation(sim_param)
+        sim.event_chain = EventChain(keyed=keyed)
+        start = timeit.default_timer()
+        r = sim.do_simulation()
+        elapsed = timeit.default_timer() - start
+        print "  " + mode + ": " + str(int((r.packets_total + r.packets_served) / elapsed)) + " events/s (simulation)"
+
+
+def benchmark_pending_events(sizes=(1000, 10000, 100000, 1000000), n=100000):
+    """
+    Compare the event chain implementations for a large number of pending events (hold model): the oldest event is
+    removed and a new event with an exponentially distributed offset is inserted.
+    :param sizes: numbers of pending events
+    :param n: number of push/pop pairs per measurement
+    """
+    print "Pending events benchmark"
+    sim = Simulation(SimParam())
+    rng = sim.rng
+    for size in sizes:
+        for chain_type in sorted(EVENT_CHAIN_TYPES):
+            chain = EVENT_CHAIN_TYPES[chain_type]()
+            for _ in xrange(size):
+                chain.insert(CustomerArrival(sim, rng.get_iat() * size))
+
+            def hold():
+                for _ in xrange(n):
+                    e = chain.remove_oldest_event()
+                    chain.insert(CustomerArrival(sim, e.timestamp + rng.get_iat() * size))
+
+            t = timeit.timeit(hold, number=1)
+            print "  " + str(size) + " pending events, " + chain_type + ": " + str(int(n / t)) + " push/pop pairs/s"
+
+
+def benchmark_event_pool(sim_time=10 ** 7):
+    """
+    Compare the number of event allocations per simulated second with and without event pooling.
+    If tracemalloc is available, the peak of the traced memory is reported as well.
+    :param sim_time: simulation time in ms (the default 10^7 is a long run of several minutes per mode)
+    """
+    print "Event pool benchmark (SIM_TIME = " + str(sim_time) + ")"
+    for pooling in [False, True]:
+        sim_param = SimParam()
+        sim_param.SIM_TIME = sim_time
+        sim_param.EVENT_POOLING = pooling
+        sim = Simulation(sim_param)
+        if tracemalloc:
+            tracemalloc.start()
+        start = timeit.default_timer()
+        sim.do_simulation()
+        elapsed = timeit.default_timer() - start
+        result = "  pooling " + ("on: " if pooling else "off:") + " " + \
+                 str(sim.event_pool.allocated / (sim_time / 1000.)) + " event allocations per simulated second, " + \
+                 str(round(elapsed, 2)) + "s"
+        if tracemalloc:
+            result += ", peak traced memory " + str(tracemalloc.get_traced_memory()[1]) + " bytes"
+            tracemalloc.stop()
+        print result
+
+
+def benchmark_rng(n=1000000, block=100000):
+    """
+    Measure the cost per sample of RNG.get_iat, of drawing blocks with RNG.get_iat_block and of the former
+    implementation, which draws every number with random.Random and math.log in python.
+    :param n: number of samples
+    :param block: block size for get_iat_block
+    """
+    print "RNG benchmark"
+
+    class PythonRNS(object):
+        # per-call implementation used before the block sampling
+        def __init__(self, mean, the_seed):
+            self.r = random.Random(the_seed)
+            self.lamb = 1. / mean
+
+        def next(self):
+            p = self.r.random()
+            return -(math.log(1 - p)) / float(self.lamb)
+
+    class PythonRNG(object):
+        def __init__(self, rns):
+            self.iat_rns = rns
+
+        def get_iat(self):
+            return self.iat_rns.next()
+
+    reference = PythonRNG(PythonRNS(1, 0))
+    t = timeit.timeit(reference.get_iat, number=n)
+    print "  python per call:     " + str(round(t / n * 1e9, 1)) + " ns/sample"
+    rng = RNG(ExponentialRNS(1, 0), ExponentialRNS(1, 1))
+    t = timeit.timeit(rng.get_iat, number=n)
+    print "  RNG.get_iat:         " + str(round(t / n * 1e9, 1)) + " ns/sample"
+    t = timeit.timeit(lambda: rng.get_iat_block(block), number=n // block)
+    print "  RNG.get_iat_block:   " + str(round(t / n * 1e9, 1)) + " ns/sample"
+
+
+def benchmark_autocorrelation(lags=(20, 100, 500), n=200000):
+    """
+    Measure the cost per counted value of the auto correlation counter for different maximum lags.
+    :param lags: values of max_lag
+    :param n: number of counted values
+    """
+    print "Auto correlation counter benchmark"
+    values = ExponentialRNS(1, 0).next_block(n).tolist()
+    for max_lag in lags:
+        counter = TimeIndependentAutocorrelationCounter(max_lag=max_lag)
+
+        def count_all():
+            for v in values:
+                counter.count(v)
+            counter.get_auto_cov(1)
+        t = timeit.timeit(count_all, number=1)
+        print "  max_lag " + str(max_lag).rjust(4) + ": " + str(round(t / n * 1e9, 1)) + " ns/value"
+
+
+def benchmark_counter_profiles(sim_time=1000000, rho=.9):
+    """
+    Compare the throughput of a simulation for the different counter profiles of the CounterCollection.
+    :param sim_time: simulation time of every run
+    :param rho: utilization parameter of the simulation
+    """
+    print "Counter profile benchmark"
+    for profile in ["full", "means", "minimal"]:
+        sim_param = SimParam()
+        sim_param.SIM_TIME = sim_time
+        sim_param.S = 100
+        sim_param.RHO = rho
+        sim_param.COUNTER_PROFILE = profile
+        events, elapsed = run_timed_simulation(sim_param)
+        print "  " + profile.ljust(8) + ": " + str(int(events / elapsed)) + " events/s"
+
+
+def benchmark_replications(replications=16, sim_time=20000):
+    """
+    Compare serial and parallel execution of independent replications and check that the results are identical.
+    :param replications: number of replications
+    :param sim_time: simulation time of every replication
+    """
+    cores = multiprocessing.cpu_count()
+    print "Replication benchmark (" + str(replications) + " replications, " + str(cores) + " cores)"
+    sim_param = SimParam()
+    sim_param.SIM_TIME = sim_time
+    results = []
+    for processes in sorted(set([1, cores])):
+        runner = ReplicationRunner(sim_param, processes=processes)
+        start = timeit.default_timer()
+        results.append(runner.run(replications))
+        elapsed = timeit.default_timer() - start
+        runner.close()
+        print "  " + str(processes) + " process(es): " + str(round(elapsed, 2)) + "s"
+    print "  results identical: " + str(all(r == results[0] for r in results))
+
+
+def benchmark_bootstrap(n=100000, resample_size=5000, reference_resamples=50):
+    """
+    Compare the chunked bootstrap with the former resampling loop (numpy.random.choice on the list of values of the
+    counter) for a long series. The time of the former loop is extrapolated from reference_resamples resamples.
+    The speedup is reported against the target of BOOTSTRAP_TARGET_SPEEDUP.
+    :param n: number of values
+    :param resample_size: number of resamples
+    :param reference_resamples: number of resamples of the former loop
+    """
+    cores = multiprocessing.cpu_count()
+    print "Bootstrap benchmark (" + str(n) + " values, " + str(resample_size) + " resamples)"
+    values = ExponentialRNS(1, 0).next_block(n).tolist()
+
+    def former_loop():
+        for i in range(reference_resamples):
+            numpy.mean(numpy.random.choice(values, len(values), replace=True))
+    former = timeit.timeit(former_loop, number=1) * resample_size / reference_resamples
+    print "  resampling loop     : " + str(round(former, 2)) + "s"
+    for processes in sorted(set([1, cores])):
+        elapsed = timeit.timeit(lambda: bootstrap_confidence_interval(values, resample_size=resample_size, seed=0,
+                                                                      processes=processes), number=1)
+        speedup = former / elapsed
+        print "  chunked, " + str(processes) + " process(es): " + str(round(elapsed, 2)) + "s (" + \
+              str(round(speedup, 1)) + "x, target " + str(BOOTSTRAP_TARGET_SPEEDUP) + "x " + \
+              ("reached" if speedup >= BOOTSTRAP_TARGET_SPEEDUP else "not reached") + ")"
+
+
+def benchmark_snapshot(warmup_packets=100000, forks=10):
+    """
+    Compare the time of a warm-up with the time of taking a snapshot after the warm-up and restoring it.
+    :param warmup_packets: number of packets of the warm-up
+    :param forks: number of restored simulations
+    """
+    print "Snapshot benchmark (" + str(warmup_packets) + " packets warm-up)"
+    sim_param = SimParam()
+    sim_param.RHO = .9
+    sim = Simulation(sim_param)
+    sim.event_chain.insert(sim.event_pool.acquire(CustomerArrival, 0))
+    warmup = timeit.timeit(lambda: sim.process_events(warmup_packets), number=1)
+    snapshot = take_snapshot(sim)
+    take = timeit.timeit(lambda: take_snapshot(sim), number=forks) / forks
+    restore = timeit.timeit(lambda: restore_snapshot(snapshot), number=forks) / forks
+    print "  warm-up : " + str(round(warmup * 1000, 1)) + " ms"
+    print "  snapshot: " + str(round(take * 1000, 2)) + " ms (" + str(len(snapshot)) + " bytes)"
+    print "  restore : " + str(round(restore * 1000, 2)) + " ms"
+
+
+if __name__ == '__main__':
+    benchmark_finite_queue()
+    benchmark_packet_ledger()
+    benchmark_event_chain()
+    benchmark_pending_events()
+    benchmark_event_pool()
+    benchmark_rng()
+    benchmark_autocorrelation()
+    benchmark_counter_profiles()
+    benchmark_replications()
+    benchmark_bootstrap()
+    benchmark_snapshot()
@@ -0,0 +1,136 @@
+import math
+import multiprocessing
+import numpy
+import scipy.stats
+
+"""
+This file contains the bootstrap method for confidence intervals of the mean of recorded samples (e.g. the values of
+a TimeIndependentCounter with keep_values=True).
+
+The resamples are not drawn one by one, but as 2-D arrays of indices with one resample per row, which are drawn as raw
+32 bit random words and scaled to the number of values with a multiplication and a shift (the bias of this mapping is
+below n / 2^32). The resamples are split into blocks of BOOTSTRAP_BLOCK_SIZE resamples with their own seeds, which
+can be distributed to several processes. Within a block, the index arrays are drawn in chunks, that fit into the CPU
+cache (BOOTSTRAP_CACHE_SIZE) and a memory limit, since larger chunks are limited by the memory bandwidth. Since the
+random stream of a block does not depend on how it is chunked, the resampled means only depend on the seed, but
+neither on the memory limit nor on the number of processes.
+"""
+
+# supported confidence interval methods
+BOOTSTRAP_METHODS = ["percentile", "basic", "bca"]
+
+# number of resamples drawn from one seed
+BOOTSTRAP_BLOCK_SIZE = 256
+
+# default memory limit for the random words, index and value arrays of a chunk in bytes
+BOOTSTRAP_MAX_MEMORY = 64 * 1024 * 1024
+
+# size of the arrays of a chunk in bytes, that is preferred, so they stay in the CPU cache
+BOOTSTRAP_CACHE_SIZE = 2 * 1024 * 1024
+
+
+def resample_means(args):
+    """
+    Draw a block of resamples of the values and return their means.
+    :param args: tuple of the values (numpy array), the number of resamples, the seed of the block and the number of
+                 resamples per chunk
+    :return: numpy array with the means of the resamples
+    """
+    values, resamples, seed, chunk_size = args
+    n = len(values)
+    rng = numpy.random.RandomState(seed)
+    means = numpy.empty(resamples)
+    for first in range(0, resamples, chunk_size):
+        rows = min(chunk_size, resamples - first)
+        indices = numpy.frombuffer(rng.bytes(4 * rows * n), dtype=numpy.uint32).astype(numpy.uint64)
+        indices *= numpy.uint64(n)
+        indices >>= numpy.uint64(32)
+        means[first:first + rows] = values.take(indices.view(numpy.int64)).reshape(rows, n).mean(axis=1)
+    return means
+
+
+def bootstrap_means(values, resample_size=5000, seed=None, max_memory=BOOTSTRAP_MAX_MEMORY, processes=1):
+    """
+    Calculate the means of resample_size resamples (with replacement) of the values.
+    :param values: sequence of samples
+    :param resample_size: number of resamples
+    :param seed: seed of the bootstrap (default: random)
+    :param max_memory: memory limit for the arrays of a chunk in bytes
+    :param processes: number of worker processes for the blocks
+    :return: numpy array with resample_size means
+    """
+    values = numpy.asarray(values, dtype=float)
+    n = len(values)
+    if n == 0:
+        raise ValueError("Bootstrapping requires at least one value.")
+
+    # a resampled value costs a random word (4 bytes), an index and a value (8 bytes each)
+    chunk_size = int(max(1, min(BOOTSTRAP_BLOCK_SIZE, max_memory // (20 * n), BOOTSTRAP_CACHE_SIZE // (20 * n))))
+    sizes = [BOOTSTRAP_BLOCK_SIZE] * (resample_size // BOOTSTRAP_BLOCK_SIZE)
+    if resample_size % BOOTSTRAP_BLOCK_SIZE:
+        sizes.append(resample_size % BOOTSTRAP_BLOCK_SIZE)
+    seeds = numpy.random.RandomState(seed).randint(0, 2 ** 31 - 1, size=len(sizes))
+    blocks = [(values, size, s, chunk_size) for size, s in zip(sizes, seeds)]
+
+    if processes > 1 and len(blocks) > 1:
+        pool = multiprocessing.Pool(min(processes, len(blocks)))
+        try:
+            means = pool.map(resample_means, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        means = [resample_means(block) for block in blocks]
+    return numpy.concatenate(means)
+
+
+def bootstrap_confidence_interval(values, alpha=0.05, resample_size=5000, method="percentile", seed=None,
+                                  max_memory=BOOTSTRAP_MAX_MEMORY, processes=1):
+    """
+    Calculate a bootstrap confidence interval for the mean of the values.
+    :param values: sequence of samples
+    :param alpha: significance level
+    :param resample_size: number of resamples
+    :param method: "percentile", "basic" (empirical) or "bca" (bias corrected and accelerated)
+    :param seed: seed of the bootstrap (default: random)
+    :param max_memory: memory limit for the arrays of a chunk in bytes
+    :param processes: number of worker processes for the blocks
+    :return: lower and upper bound of confidence interval
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError("Unknown bootstrap method " + str(method) + ". Choose one of " +
+                         ", ".join(BOOTSTRAP_METHODS) + ".")
+    values = numpy.asarray(values, dtype=float)
+    means = numpy.sort(bootstrap_means(values, resample_size, seed, max_memory, processes))
+    mean = values.mean()
+    lower_index = int(alpha / 2 * resample_size)
+    upper_index = min(int((1 - alpha / 2) * resample_size), resample_size - 1)
+
+    if method == "percentile":
+        return means[lower_index], means[upper_index]
+
+    if method == "basic":
+        # quantiles of the deviations from the sample mean, mirrored around the mean
+        return 2 * mean - means[upper_index], 2 * mean - means[lower_index]
+
+    # bias correction from the fraction of resample means below the sample mean
+    below = numpy.searchsorted(means, mean, side="left") / float(resample_size)
+    z0 = scipy.stats.norm.ppf(min(max(below, .5 / resample_size), 1 - .5 / resample_size))
+
+    # acceleration from the jackknife means, which are all available from the sum of the values
+    n = len(values)
+    if n > 1:
+        jackknife = (values.sum() - values) / (n - 1)
+        d = jackknife.mean() - jackknife
+        ss = numpy.sum(d ** 2)
+        a = numpy.sum(d ** 3) / (6 * ss ** 1.5) if ss > 0 else 0.
+    else:
+        a = 0.
+
+    bounds = []
+    for z in (scipy.stats.norm.ppf(alpha / 2), scipy.stats.norm.ppf(1 - alpha / 2)):
+        q = scipy.stats.norm.cdf(z0 + (z0 + z) / (1 - a * (z0 + z)))
+        if math.isnan(q):
+            q = .5
+        bounds.append(means[min(int(q * resample_size), resample_size - 1)])
+    return bounds[0], bounds[1]
@@ -2,6 +2,42 @@ import math
 import numpy
 import scipy
 import scipy.stats
+from bootstrap import bootstrap_confidence_interval
+
+# quantiles of the t-distribution, that have already been calculated, by (alpha, degrees of freedom)
+T_QUANTILES = {}
+
+
+def get_t_quantile(alpha, df):
+    """
+    Return the 1 - alpha/2 quantile of the t-distribution with df degrees of freedom.
+    The quantiles are cached, since scipy.stats.t.ppf is slow compared to a confidence interval from running moments.
+    :param alpha: significance level
+    :param df: degrees of freedom
+    """
+    key = (alpha, df)
+    t = T_QUANTILES.get(key)
+    if t is None:
+        t = T_QUANTILES[key] = scipy.stats.t.ppf(1 - alpha / 2., df)
+    return t
+
+
+def neumaier_add(total, compensation, x):
+    """
+    Add x to a sum with Neumaier's variant of the Kahan compensated summation.
+    The result is total + compensation, the compensation collects the low order bits lost in total.
+    :param total: current (rounded) sum
+    :param compensation: current compensation term
+    :param x: value to add
+    :return: tuple of new total and new compensation
+    """
+    t = total + x
+    if abs(total) >= abs(x):
+        compensation += (total - t) + x
+    else:
+        compensation += (x - t) + total
+    return t, compensation
+
 
 class Counter(object):
 
@@ -56,11 +92,17 @@ class Counter(object):
         """
         raise NotImplementedError("Please Implement this method")
 
+    def get_num_samples(self):
+        """
+        Returns the number of values in the internal array.
+        """
+        return len(self.values)
+
     def report(self):
         """
         Print report for this counter.
         """
-        if len(self.values) != 0:
+        if self.get_num_samples() != 0:
             print "Name: " + str(self.name) + ", Mean: " + str(self.get_mean()) + ", Variance: " + str(self.get_var())
         else:
             print("List for creating report is empty. Please check.")
@@ -71,44 +113,114 @@ class TimeIndependentCounter(Counter):
     """
     Counter for counting values independent of their duration.
 
+    The counter keeps running moments (Welford's algorithm), so counting a value and calculating mean and variance
+    take constant time and memory. Counters can be merged exactly (Chan's formula), e.g. counters of different
+    workers or batches. The values themselves are only stored if keep_values is set (e.g. for plots or bootstrapping).
+
     As an extension, the class can report a confidence interval and check if a value lies within this interval.
     """
     
-    def __init__(self, name="default"):
+    def __init__(self, name="default", keep_values=False):
         """
         Initialize the TIC object.
+        :param name: identifier for better distinction between various counters
+        :param keep_values: store all counted values in the internal array
         """
         super(TimeIndependentCounter, self).__init__(name)
+        self.keep_values = keep_values
+        self.num_samples = 0
+        self.running_mean = 0.
+        self.running_m2 = 0.  # sum of squared deviations from the mean
+
+    def reset(self, *args):
+        """
+        Reset the running moments and delete all stored values.
+        """
+        Counter.reset(self)
+        self.num_samples = 0
+        self.running_mean = 0.
+        self.running_m2 = 0.
     
     def count(self, *args):
         """
-        Add a new value to the internal array. Parameters are chosen as *args because of the inheritance to the
-        correlation counters.
-        :param: *args is the value that should be added to the internal array
+        Add a new value to the running moments (and to the internal array, if values are kept). Parameters are chosen
+        as *args because of the inheritance to the correlation counters.
+        :param: *args is the value that should be counted
+        """
+        x = args[0]
+        self.num_samples += 1
+        delta = x - self.running_mean
+        self.running_mean += delta / self.num_samples
+        self.running_m2 += delta * (x - self.running_mean)
+        if self.keep_values:
+            self.values.append(x)
+
+    def count_block(self, values):
+        """
+        Count a block of values (e.g. a numpy array) at once.
+        :param values: sequence of values in the order they would have been counted
+        """
+        values = numpy.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self.merge_moments(len(values), mean, float(numpy.sum((values - mean) ** 2)))
+        if self.keep_values:
+            self.values.extend(values.tolist())
+
+    def merge(self, other):
+        """
+        Add all values counted by another TimeIndependentCounter to this counter.
+        """
+        self.merge_moments(other.num_samples, other.running_mean, other.running_m2)
+        if self.keep_values:
+            self.values.extend(other.values)
+
+    def merge_moments(self, n, mean, m2):
+        """
+        Merge the moments of another set of values into the running moments (Chan et al.).
+        :param n: number of values
+        :param mean: mean of the values
+        :param m2: sum of squared deviations from their mean
+        """
+        if n == 0:
+            return
+        total = self.num_samples + n
+        delta = mean - self.running_mean
+        self.running_m2 += m2 + delta * delta * self.num_samples * n / total
+        self.running_mean += delta * n / total
+        self.num_samples = total
+
+    def get_num_samples(self):
+        """
+        Return the number of counted values.
         """
-        self.values.append(args[0])
+        return self.num_samples
         
     def get_mean(self):
         """
-        Return the mean value of the internal array.
+        Return the mean value of the counted values.
         """
-        if len(self.values) > 0:
-            return numpy.mean(self.values)
+        if self.num_samples > 0:
+            return self.running_mean
         else:
             return 0
 
     def get_var(self):
         """
-        Return the variance of the internal array.
+        Return the variance of the counted values.
         Note, that we take the estimated variance, not the exact variance.
         """
-        return numpy.var(self.values, ddof=1)
+        if self.num_samples > 1:
+            return self.running_m2 / (self.num_samples - 1)
+        else:
+            return numpy.nan
 
     def get_stddev(self):
         """
-        Return the standard deviation of the internal array.
+        Return the standard deviation of the counted values.
         """
-        return numpy.std(self.values, ddof=1)
+        return math.sqrt(self.get_var())
 
     def report_confidence_interval(self, alpha=0.05, print_report=True):
         """
@@ -117,10 +229,10 @@ class TimeIndependentCounter(Counter):
         :param alpha: is the significance level (default: 5%)
         :param print_report: enables an output string
         """
-        n = len(self.values)
+        n = self.num_samples
         mean = self.get_mean()
         var = self.get_var()
-        h = math.sqrt(var/n)*scipy.stats.t.ppf(1-alpha/2., n-1)
+        h = math.sqrt(var/n)*get_t_quantile(alpha, n-1)
 
         if print_report:
             print "Counter: " + str(self.name) + "; number of samples: " + str(n) + "; mean: " + str(mean) + "; var: " + str(var) + "; confidence interval: [" + str(mean-h) + " ; " + str(mean+h) + "] (h/2: " + str(h) + ")"
@@ -141,46 +253,43 @@ class TimeIndependentCounter(Counter):
 
         return math.fabs(m-x) <= h
 
-    def report_bootstrap_confidence_interval(self, alpha=0.05, resample_size=5000, print_report=True):
+    def report_bootstrap_confidence_interval(self, alpha=0.05, resample_size=5000, print_report=True,
+                                             method="percentile", seed=None, processes=1):
         """
         Report bootstrapping confidence interval with given significance level.
-        This is done with the bootstrap method. Hint: use numpy.random.choice for resampling
+        The resamples are drawn in vectorized chunks (see bootstrap.bootstrap_confidence_interval).
         :param alpha: significance level
         :param resample_size: resampling size
         :param print_report: enables an output string
+        :param method: "percentile", "basic" or "bca"
+        :param seed: seed of the resampling (default: random)
+        :param processes: number of worker processes for the resampling
         :return: lower and upper bound of confidence interval
         """
-        n = len(self.values)
-        mean = self.get_mean()
-        var = self.get_var()
-
-        means = []
-        for i in range(resample_size):
-            samples = numpy.random.choice(self.values, len(self.values), replace=True)
-            means.append(numpy.mean(samples))
-
-        # Percentile confidence intervals (option 1)
-        lower_index, upper_index = int(alpha / 2 * resample_size), int(resample_size * (1 - alpha / 2))
-        lower, upper = numpy.sort(means)[lower_index], numpy.sort(means)[upper_index]
-
-        # Empirical confidence intervals (option 2)
-        devs = numpy.subtract(means, mean)
-        lower, upper = mean - numpy.sort(devs)[upper_index], mean - numpy.sort(means)[lower_index]
+        if not self.keep_values:
+            raise ValueError("Bootstrapping requires the values, create the counter with keep_values=True.")
+        lower, upper = bootstrap_confidence_interval(self.values, alpha, resample_size, method, seed,
+                                                     processes=processes)
 
         if print_report:
-            print "Counter: " + str(self.name) + "; number of samples: " + str(n) + "; mean: " + str(mean) + "; var: " + str(var) + "; confidence interval: [" + str(lower) + " ; " + str(upper) + "] "
+            print "Counter: " + str(self.name) + "; number of samples: " + str(len(self.values)) + "; mean: " + \
+                  str(self.get_mean()) + "; var: " + str(self.get_var()) + "; confidence interval: [" + str(lower) + \
+                  " ; " + str(upper) + "] "
 
         return lower, upper
 
-    def is_in_bootstrap_confidence_interval(self, x, resample_size=5000, alpha=0.05):
+    def is_in_bootstrap_confidence_interval(self, x, resample_size=5000, alpha=0.05, method="percentile", seed=None):
         """
         Check if sample x is in bootstrap confidence interval with given resample_size and significance level.
         :param x: is the sample
         :param resample_size: resample size
         :param alpha: is the significance level
+        :param method: "percentile", "basic" or "bca"
+        :param seed: seed of the resampling (default: random)
         :return:
         """
-        (lower, upper) = self.report_bootstrap_confidence_interval(alpha, resample_size, print_report=False)
+        (lower, upper) = self.report_bootstrap_confidence_interval(alpha, resample_size, print_report=False,
+                                                                   method=method, seed=seed)
         m = self.get_mean()
 
         print "Value: " + str(x) + ", mean: " + str(m) + ", confidence interval: [" + str(lower) + " ; " + str(upper) + "]"
@@ -192,6 +301,10 @@ class TimeDependentCounter(Counter):
     """
     Counter, that counts values considering their duration as well.
 
+    The counter accumulates the integrals of the value and of its square over time, so counting and calculating mean
+    and variance take constant time and memory. The integrals are summed up with Neumaier's compensated summation,
+    hence the rounding error does not grow with the number of counted values.
+
     Methods for calculating mean, variance and standard deviation are available.
     """
     
@@ -205,33 +318,70 @@ class TimeDependentCounter(Counter):
         self.sim = sim
         self.first_timestamp = 0
         self.last_timestamp = 0
-        self.sum_power_two = [] #second moment used for variance calculation
+        self.num_samples = 0
+        self.sum_power_one = 0.  # integral of the value over time
+        self.sum_power_one_c = 0.  # compensation of sum_power_one
+        self.sum_power_two = 0.  # second moment used for variance calculation
+        self.sum_power_two_c = 0.  # compensation of sum_power_two
     
     def count(self, value):
         """
-        Adds new value to internal array.
+        Add the new value to the integrals.
         Duration from last to current value is considered.
         """
-        dt = self.sim.sim_state.now - self.last_timestamp
+        now = self.sim.sim_state.now
+        dt = now - self.last_timestamp
         if dt < 0:
             print "Error in calculating time dependent statistics. Current time is smaller than last timestamp."
             raise ValueError
-        self.sum_power_two.append(value * value * dt)
-        self.values.append(value * dt)
-        self.last_timestamp = self.sim.sim_state.now
+        self.num_samples += 1
+        self.sum_power_one, self.sum_power_one_c = neumaier_add(self.sum_power_one, self.sum_power_one_c,
+                                                                value * dt)
+        self.sum_power_two, self.sum_power_two_c = neumaier_add(self.sum_power_two, self.sum_power_two_c,
+                                                                value * value * dt)
+        self.last_timestamp = now
+
+    def count_block(self, values, timestamps):
+        """
+        Count a block of values with their durations at once.
+        values[i] is the value that has been valid from the previous timestamp until timestamps[i], which is the same
+        as calling count(values[i]) at time timestamps[i].
+        :param values: sequence of values
+        :param timestamps: non-decreasing sequence of timestamps (not before the last counted timestamp)
+        """
+        timestamps = numpy.asarray(timestamps, dtype=float)
+        if len(timestamps) == 0:
+            return
+        values = numpy.asarray(values, dtype=float)
+        dt = numpy.diff(numpy.concatenate(([self.last_timestamp], timestamps)))
+        if (dt < 0).any():
+            print "Error in calculating time dependent statistics. Timestamps are not in chronological order."
+            raise ValueError
+        self.num_samples += len(timestamps)
+        self.sum_power_one, self.sum_power_one_c = neumaier_add(self.sum_power_one, self.sum_power_one_c,
+                                                                math.fsum(values * dt))
+        self.sum_power_two, self.sum_power_two_c = neumaier_add(self.sum_power_two, self.sum_power_two_c,
+                                                                math.fsum(values * values * dt))
+        self.last_timestamp = timestamps[-1]
+
+    def get_num_samples(self):
+        """
+        Return the number of counted values.
+        """
+        return self.num_samples
         
     def get_mean(self):
         """
         Return the mean value of the counter, normalized by the total duration of the simulation.
         """
-        return float(sum(self.values)) / float((self.last_timestamp - self.first_timestamp))
+        return (self.sum_power_one + self.sum_power_one_c) / float((self.last_timestamp - self.first_timestamp))
         
     def get_var(self):
         """
         Return the variance of the TDC.
         """
         dt = self.last_timestamp - self.first_timestamp
-        return float(sum(self.sum_power_two)) / float(dt) - self.get_mean() * self.get_mean()
+        return (self.sum_power_two + self.sum_power_two_c) / float(dt) - self.get_mean() * self.get_mean()
         
     def get_stddev(self):
         """
@@ -245,61 +395,215 @@ class TimeDependentCounter(Counter):
         """
         self.first_timestamp = self.sim.sim_state.now
         self.last_timestamp = self.sim.sim_state.now
-        self.sum_power_two = []
+        self.num_samples = 0
+        self.sum_power_one = 0.
+        self.sum_power_one_c = 0.
+        self.sum_power_two = 0.
+        self.sum_power_two_c = 0.
         Counter.reset(self)
 
 
-class TimeIndependentCrosscorrelationCounter(TimeIndependentCounter):
+class TimeIndependentCovarianceCounter(Counter):
 
     """
-    Counter that is able to calculate cross correlation (and covariance).
+    Counter for the covariance matrix of a vector of values, e.g. the times (iat, wt, st, syst) of a packet.
+
+    The counter keeps the mean vector and the matrix of co-moments, i.e. the sums of products of the deviations from
+    the mean, so the memory does not depend on the number of counted vectors. Counted vectors are collected in a
+    buffer of block_size vectors, which is merged into the moments at once (Chan et al.). The vectors themselves are
+    only stored if keep_values is set.
+
+    Variables can be referred to by their name or index.
     """
 
-    def __init__(self, name="default"):
-        """
-        Crosscorrelation counter contains three internal counters containing the variables
-        :param name: is a string for better distinction between counters.
+    def __init__(self, name="default", variables=("x", "y"), keep_values=False, block_size=1024):
         """
-        super(TimeIndependentCrosscorrelationCounter, self).__init__(name)
-        self.x = TimeIndependentCounter()
-        self.y = TimeIndependentCounter()
-        self.xy = TimeIndependentCounter()
+        Initialize the counter.
+        :param name: identifier for better distinction between various counters
+        :param variables: names of the variables of the counted vectors
+        :param keep_values: store all counted vectors in the internal array
+        :param block_size: number of vectors that are buffered before the moments are updated
+        """
+        super(TimeIndependentCovarianceCounter, self).__init__(name)
+        self.variables = list(variables)
+        self.index = dict((v, i) for i, v in enumerate(self.variables))
+        self.keep_values = keep_values
+        self.block_size = block_size
         self.reset()
 
-    def reset(self):
+    def reset(self, *args):
         """
-        Reset the TICCC to its initial state.
+        Reset the moments and delete all stored values.
         """
-        TimeIndependentCounter.reset(self)
-        self.x.reset()
-        self.y.reset()
-        self.xy.reset()
+        Counter.reset(self)
+        d = len(self.variables)
+        self.num_samples = 0
+        self.running_mean = numpy.zeros(d)
+        self.comoments = numpy.zeros((d, d))
+        self.pending = []
 
-    def count(self, x, y):
+    def count(self, *args):
         """
-        Count two values for the correlation between them. They are added to the two internal arrays.
+        Count a vector of values, given in the order of the variables.
         """
-        self.x.count(x)
-        self.y.count(y)
-        self.xy.count(x*y)
+        self.pending.append(args)
+        if self.keep_values:
+            self.values.append(args)
+        if len(self.pending) >= self.block_size:
+            self.flush()
 
-    def get_cov(self):
+    def count_block(self, *columns):
         """
-        Calculate the covariance between the two internal arrays x and y.
+        Count a block of vectors, given as one sequence of values for each variable.
+        """
+        x = numpy.column_stack([numpy.asarray(c, dtype=float) for c in columns])
+        if len(x) == 0:
+            return
+        self.flush()
+        self.count_matrix(x)
+        if self.keep_values:
+            self.values.extend(map(tuple, x.tolist()))
 
-        Simple calculation with numpy:
-        cov = numpy.cov(self.x.values, self.y.values, ddof=0)[0, 1]
+    def flush(self):
         """
-        return self.xy.get_mean() - self.x.get_mean() * self.y.get_mean()
+        Merge the buffered vectors into the moments.
+        """
+        if self.pending:
+            x = numpy.array(self.pending, dtype=float)
+            self.pending = []
+            self.count_matrix(x)
 
-    def get_cor(self):
+    def count_matrix(self, x):
+        """
+        Merge the moments of a matrix with one vector per row.
         """
-        Calculate the correlation coefficient between the two internal arrays x and y.
+        mean = x.mean(axis=0)
+        deviations = x - mean
+        self.merge_moments(len(x), mean, deviations.T.dot(deviations))
+
+    def merge(self, other):
+        """
+        Add all vectors counted by another TimeIndependentCovarianceCounter with the same variables to this counter.
+        """
+        other.flush()
+        self.flush()
+        self.merge_moments(other.num_samples, other.running_mean, other.comoments)
+        if self.keep_values:
+            self.values.extend(other.values)
+
+    def merge_moments(self, n, mean, comoments):
+        """
+        Merge the moments of another set of vectors into the moments of the counter.
+        :param n: number of vectors
+        :param mean: mean vector
+        :param comoments: matrix of the sums of products of the deviations from the mean
+        """
+        if n == 0:
+            return
+        total = self.num_samples + n
+        delta = mean - self.running_mean
+        self.comoments += comoments + numpy.outer(delta, delta) * (float(self.num_samples) * n / total)
+        self.running_mean += delta * (float(n) / total)
+        self.num_samples = total
+
+    def get_num_samples(self):
+        """
+        Return the number of counted vectors.
+        """
+        return self.num_samples + len(self.pending)
+
+    def get_mean(self, variable=0):
+        """
+        Return the mean value of a variable.
+        """
+        self.flush()
+        return float(self.running_mean[self.index.get(variable, variable)])
+
+    def get_var(self, variable=0):
+        """
+        Return the (estimated) variance of a variable.
+        """
+        i = self.index.get(variable, variable)
+        self.flush()
+        if self.num_samples > 1:
+            return float(self.comoments[i, i] / (self.num_samples - 1))
+        else:
+            return numpy.nan
+
+    def get_stddev(self, variable=0):
+        """
+        Return the standard deviation of a variable.
+        """
+        return math.sqrt(self.get_var(variable))
+
+    def get_cov(self, x=0, y=1):
+        """
+        Calculate the covariance between two variables.
 
         Simple calculation with numpy:
-        cor = numpy.corrcoef(self.x.values, self.y.values, ddof=0)[0, 1]
+        cov = numpy.cov(x_values, y_values, ddof=0)[0, 1]
         """
-        return self.get_cov() / math.sqrt(self.x.get_var() * self.y.get_var())
+        self.flush()
+        return float(self.comoments[self.index.get(x, x), self.index.get(y, y)] / self.num_samples)
+
+    def get_cor(self, x=0, y=1):
+        """
+        Calculate the correlation coefficient between two variables.
+        As in the cross correlation counter, the covariance is divided by the product of the estimated standard
+        deviations.
+        """
+        return self.get_cov(x, y) / math.sqrt(self.get_var(x) * self.get_var(y))
+
+    def get_cov_matrix(self):
+        """
+        Return the covariance matrix (normalized with n) of all variables.
+        """
+        self.flush()
+        return self.comoments / self.num_samples
+
+    def get_values(self, variable):
+        """
+        Return the stored values of a variable (only available with keep_values).
+        """
+        i = self.index.get(variable, variable)
+        return [v[i] for v in self.values]
+
+    def report(self):
+        """
+        Print the covariance and correlation of all pairs of variables.
+        """
+        print "Name: " + str(self.name)
+        for i in range(len(self.variables)):
+            for j in range(i + 1, len(self.variables)):
+                print self.variables[i] + " vs. " + self.variables[j] + ": covariance = " + \
+                    str(self.get_cov(i, j)) + "; correlation = " + str(self.get_cor(i, j))
+
+
+class TimeIndependentCrosscorrelationCounter(TimeIndependentCovarianceCounter):
+
+    """
+    Counter that is able to calculate cross correlation (and covariance) of two variables x and y.
+    """
+
+    def __init__(self, name="default", keep_values=False):
+        """
+        Create a cross correlation counter for the variables x and y.
+        :param name: is a string for better distinction between counters.
+        :param keep_values: store the pairs of x and y in the internal array
+        """
+        super(TimeIndependentCrosscorrelationCounter, self).__init__(name, ("x", "y"), keep_values)
+
+    def count(self, x, y):
+        """
+        Count two values for the correlation between them.
+        """
+        TimeIndependentCovarianceCounter.count(self, x, y)
+
+    def count_block(self, x, y):
+        """
+        Count two blocks of values (e.g. numpy arrays) of the same length.
+        """
+        TimeIndependentCovarianceCounter.count_block(self, x, y)
 
     def report(self):
         """
@@ -312,20 +616,28 @@ class TimeIndependentAutocorrelationCounter(TimeIndependentCounter):
 
     """
     Counter, that is able to calculate auto correlation with given lag.
+
+    The counter keeps the sums of the lag products x_i * x_(i-lag) for all lags up to max_lag, the first max_lag + 1
+    samples and the last max_lag samples, but not the series itself. Counted values are collected in a buffer of
+    block_size values, which is added to the lag products with a single numpy.correlate call, so the cost per value
+    does not grow with max_lag in Python.
     """
 
-    def __init__(self, name="default", max_lag=10):
+    def __init__(self, name="default", max_lag=10, block_size=1024):
         """
         Create a new auto correlation counter object.
         :param name: string for better distinction between multiple counters
         :param max_lag: maximum available lag (defaults to 10)
+        :param block_size: number of values that are buffered before the lag products are updated
         """
         super(TimeIndependentAutocorrelationCounter, self).__init__(name)
         self.max_lag = max_lag
         self.cycle_len = max_lag + 1
+        self.block_size = block_size
         self.first_samples = []
         self.last_samples = []
         self.squared_sums = []
+        self.pending = []
         self.reset()
 
     def reset(self):
@@ -334,24 +646,57 @@ class TimeIndependentAutocorrelationCounter(TimeIndependentCounter):
         """
         TimeIndependentCounter.reset(self)
         self.first_samples = numpy.zeros(self.cycle_len)
-        self.last_samples = numpy.zeros(self.cycle_len)
+        self.last_samples = numpy.zeros(self.max_lag)  # chronological, zero padded at the beginning of the series
         self.squared_sums = numpy.zeros(self.cycle_len)
+        self.num_lag_samples = 0  # number of samples contained in squared_sums
+        self.pending = []
 
     def count(self, x):
         """
         Add new element x to counter.
         """
         TimeIndependentCounter.count(self, x)
-        n = len(self.values) - 1
-        if n < self.cycle_len:
-            self.first_samples[n] = x
-        self.last_samples[n % self.cycle_len] = x
+        self.pending.append(x)
+        if len(self.pending) >= self.block_size:
+            self.flush()
+
+    def count_block(self, values):
+        """
+        Add a block of elements to the counter.
+        """
+        x = numpy.asarray(values, dtype=float)
+        if len(x) == 0:
+            return
+        self.flush()
+        self.count_lag_products(x)
+        TimeIndependentCounter.count_block(self, x)
 
-        for i in range(min(self.max_lag, n) + 1):
-            squared_sums_i = self.squared_sums[i]
-            index = (n - i + self.cycle_len) % self.cycle_len
-            last_sample_i = self.last_samples[index]
-            self.squared_sums[i] = squared_sums_i + x*last_sample_i
+    def flush(self):
+        """
+        Add the buffered values to the lag products.
+        """
+        if self.pending:
+            x = numpy.array(self.pending, dtype=float)
+            self.pending = []
+            self.count_lag_products(x)
+
+    def count_lag_products(self, x):
+        """
+        Add the lag products of a block of values, which follow the values counted so far.
+        :param x: numpy array of values
+        """
+        m = len(x)
+        n = self.num_lag_samples
+        y = numpy.concatenate((self.last_samples, x))
+        # element k is sum_i x[i] * y[i + k], i.e. the products of lag max_lag - k
+        self.squared_sums += numpy.correlate(y, x, "valid")[::-1]
+
+        if n < self.cycle_len:
+            k = min(self.cycle_len - n, m)
+            self.first_samples[n:n + k] = x[:k]
+        if self.max_lag > 0:
+            self.last_samples = y[-self.max_lag:]
+        self.num_lag_samples = n + m
 
     def get_auto_cov(self, lag):
         """
@@ -363,12 +708,11 @@ class TimeIndependentAutocorrelationCounter(TimeIndependentCounter):
         :return: auto covariance
         """
         if lag <= self.max_lag:
-            sum_of_firsts = 0
-            sum_of_lasts = 0
-            for i in range(lag):
-                sum_of_firsts += self.first_samples[i]
-                sum_of_lasts += self.last_samples[(len(self.values) - 1 - i + self.max_lag + 1) % (self.max_lag + 1)]
-            return (self.squared_sums[lag] - self.get_mean() * (2 * numpy.sum(self.values) - sum_of_firsts - sum_of_lasts)) /  (len(self.values) - lag) + self.get_mean() * self.get_mean()
+            self.flush()
+            sum_of_firsts = numpy.sum(self.first_samples[:lag])
+            sum_of_lasts = numpy.sum(self.last_samples[self.max_lag - lag:])
+            total = self.get_mean() * self.num_samples
+            return (self.squared_sums[lag] - self.get_mean() * (2 * total - sum_of_firsts - sum_of_lasts)) /  (self.num_samples - lag) + self.get_mean() * self.get_mean()
         else:
             print "lag larger than max_lag, please correct!"
             return -1
@@ -1,6 +1,62 @@
-from counter import TimeIndependentCrosscorrelationCounter, TimeIndependentAutocorrelationCounter
+from counter import TimeIndependentCovarianceCounter, TimeIndependentAutocorrelationCounter
 from counter import TimeIndependentCounter, TimeDependentCounter
-from histogram import TimeIndependentHistogram, TimeDependentHistogram
+from histogram import TimeIndependentHistogram, OccupancyHistogram, LogHistogram
+
+
+# all counters and histograms of the collection: (name, observed quantity, factory)
+# observed quantities: "wt", "syst" and "packet" (iat, wt, st, syst) are counted for every served packet, "ql" and
+# "busy" whenever the system state is counted, None for counters that are only filled by the simulation studies
+COUNTERS = [
+    # waiting time
+    ("cnt_wt", "wt", lambda sim: TimeIndependentCounter(keep_values=sim.sim_param.KEEP_SAMPLES)),
+    ("hist_wt", "wt", lambda sim: LogHistogram(sim, "w")),
+    ("acnt_wt", "wt", lambda sim: TimeIndependentAutocorrelationCounter("waiting time with lags 1 to 20", max_lag=20)),
+
+    # system time
+    ("hist_syst", "syst", lambda sim: LogHistogram(sim, "syst")),
+
+    # queue length
+    ("cnt_ql", "ql", lambda sim: TimeDependentCounter(sim)),
+    ("hist_ql", "ql", lambda sim: OccupancyHistogram(sim, "q", sim.sim_param.S + 1)),
+
+    # system utilization
+    ("cnt_sys_util", "busy", lambda sim: TimeDependentCounter(sim)),
+
+    # blocking probability
+    ("cnt_bp", None, lambda sim: TimeIndependentCounter("bp", keep_values=sim.sim_param.KEEP_SAMPLES)),
+    ("hist_bp", None, lambda sim: TimeIndependentHistogram(sim, "bp")),
+
+    # cross correlations between inter-arrival time, waiting time, service time and system time of the packets,
+    # e.g. cnt_packet.get_cor("iat", "syst")
+    ("cnt_packet", "packet", lambda sim: TimeIndependentCovarianceCounter("packet times", ("iat", "wt", "st", "syst"),
+                                                                          sim.sim_param.KEEP_SAMPLES)),
+]
+
+# counter profiles, that can be selected with SimParam.COUNTER_PROFILE
+COUNTER_PROFILES = {
+    "full": [name for name, _, _ in COUNTERS],
+    # everything needed for the mean values in SimResult
+    "means": ["cnt_wt", "cnt_ql", "cnt_sys_util"],
+    # system utilization only (blocking probability and packet numbers are always available from SimState)
+    "minimal": ["cnt_sys_util"],
+}
+
+
+def get_profile_counters(profile):
+    """
+    Return the names of the counters of a counter profile.
+    :param profile: key of COUNTER_PROFILES or list of counter names (see SimParam.COUNTER_PROFILE)
+    :return: list of counter names
+    """
+    if isinstance(profile, basestring):
+        if profile not in COUNTER_PROFILES:
+            raise ValueError("Unknown counter profile " + profile + ". Choose one of " +
+                             ", ".join(sorted(COUNTER_PROFILES)) + ".")
+        profile = COUNTER_PROFILES[profile]
+    unknown = set(profile) - set(name for name, _, _ in COUNTERS)
+    if unknown:
+        raise ValueError("Unknown counters " + ", ".join(sorted(unknown)) + ".")
+    return list(profile)
 
 
 class CounterCollection(object):
@@ -11,6 +67,10 @@ class CounterCollection(object):
     It contains several counters and histograms, that are used in the different tasks.
     Reporting is done by calling the report function. This function can be adapted, depending on which counters should
     report their results and print strings or plot histograms.
+
+    Only the counters of the selected profile (SimParam.COUNTER_PROFILE, a key of COUNTER_PROFILES or a list of
+    counter names) are created. Disabled counters are None and are neither counted nor reset, so they do not cost
+    anything during the simulation.
     """
 
     def __init__(self, sim):
@@ -20,92 +80,112 @@ class CounterCollection(object):
         """
         self.sim = sim
 
-        # waiting time
-        self.cnt_wt = TimeIndependentCounter()
-        self.hist_wt = TimeIndependentHistogram(self.sim, "w")
-        self.acnt_wt = TimeIndependentAutocorrelationCounter("waiting time with lags 1 to 20", max_lag=20)
-
-        # queue length
-        self.cnt_ql = TimeDependentCounter(self.sim)
-        self.hist_ql = TimeDependentHistogram(self.sim, "q")
-
-        # system utilization
-        self.cnt_sys_util = TimeDependentCounter(self.sim)
-
-        # blocking probability
-        self.cnt_bp = TimeIndependentCounter("bp")
-        self.hist_bp = TimeIndependentHistogram(self.sim, "bp")
+        profile = get_profile_counters(self.sim.sim_param.COUNTER_PROFILE)
+
+        # enabled counters in the order of COUNTERS and their count functions, grouped by the observed quantity
+        self.counters = []
+        self.observers = dict((quantity, []) for quantity in ["wt", "syst", "packet", "ql", "busy"])
+        for name, quantity, factory in COUNTERS:
+            counter = factory(self.sim) if name in profile else None
+            setattr(self, name, counter)
+            if counter is not None:
+                self.counters.append((name, quantity, counter))
+                if quantity is not None:
+                    self.observers[quantity].append(counter)
+        self.bind_observers()
+
+    def bind_observers(self):
+        """
+        Collect the count functions of the enabled counters by the observed quantity.
+        """
+        self.wt_counters = [c.count for c in self.observers["wt"]]
+        self.syst_counters = [c.count for c in self.observers["syst"]]
+        self.packet_counters = [c.count for c in self.observers["packet"]]
+        self.ql_counters = [c.count for c in self.observers["ql"]]
+        self.busy_counters = [c.count for c in self.observers["busy"]]
+        self.count_packets = bool(self.wt_counters or self.syst_counters or self.packet_counters)
+
+    def __getstate__(self):
+        """
+        Return the attributes for pickling and copying, without the lists of bound count functions.
+        """
+        return dict((name, value) for name, value in self.__dict__.items() if not name.endswith("_counters"))
 
-        # cross correlations
-        self.cnt_iat_wt = TimeIndependentCrosscorrelationCounter("inter-arrival time vs. waiting time")
-        self.cnt_iat_st = TimeIndependentCrosscorrelationCounter("inter-arrival time vs. service time")
-        self.cnt_iat_syst = TimeIndependentCrosscorrelationCounter("inter-arrival time vs. system time")
-        self.cnt_st_syst = TimeIndependentCrosscorrelationCounter("service time vs. system time")
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.bind_observers()
 
     def reset(self):
         """
         Resets all counters and histograms.
         """
-        self.cnt_wt.reset()
-        self.hist_wt.reset()
-        self.acnt_wt.reset()
+        for _, _, counter in self.counters:
+            counter.reset()
 
-        self.cnt_ql.reset()
-        self.hist_ql.reset()
-
-        self.cnt_sys_util.reset()
-
-        self.cnt_bp.reset()
-        self.hist_bp.reset()
-
-        self.cnt_iat_wt.reset()
-        self.cnt_iat_st.reset()
-        self.cnt_iat_syst.reset()
-        self.cnt_st_syst.reset()
-    
     def report(self):
         """
         Calls the report function of the counters and histograms.
         Can be adapted, such that not all reports are printed
         """
-        self.cnt_wt.report()
-        self.hist_wt.report()
-        self.acnt_wt.report()
-
-        self.cnt_ql.report()
-        self.hist_ql.report()
+        for _, quantity, counter in self.counters:
+            if quantity is not None:
+                counter.report()
 
-        self.cnt_sys_util.report()
-
-        self.cnt_iat_wt.report()
-        self.cnt_iat_st.report()
-        self.cnt_iat_syst.report()
-        self.cnt_st_syst.report()
-
-    def count_packet(self, packet):
+    def count_packet(self, ledger, packet_id):
         """
-        Count a packet. Its data is counted by the various counters
+        Count a packet. Its data is read from the packet ledger and counted by the various counters
+        :param ledger: PacketLedger containing the timestamps of the packet
+        :param packet_id: id of the completed packet
         """
-        self.cnt_wt.count(packet.get_waiting_time())
-        self.hist_wt.count(packet.get_waiting_time())
-        self.acnt_wt.count(packet.get_waiting_time())
-
-        self.cnt_iat_wt.count(packet.get_interarrival_time(), packet.get_waiting_time())
-        self.cnt_iat_st.count(packet.get_interarrival_time(), packet.get_service_time())
-        self.cnt_iat_syst.count(packet.get_interarrival_time(), packet.get_system_time())
-        self.cnt_st_syst.count(packet.get_service_time(), packet.get_system_time())
+        if not self.count_packets:
+            return
+        iat, wt, st, syst = ledger.get_times(packet_id)
+
+        for count in self.wt_counters:
+            count(wt)
+        for count in self.syst_counters:
+            count(syst)
+        for count in self.packet_counters:
+            count(iat, wt, st, syst)
+
+    def count_packet_block(self, iat, wt, st, syst):
+        """
+        Count a block of completed packets, given as arrays in the order of their service completion.
+        :param iat: inter-arrival times
+        :param wt: waiting times
+        :param st: service times
+        :param syst: system times
+        """
+        for counter in self.observers["wt"]:
+            counter.count_block(wt)
+        for counter in self.observers["syst"]:
+            counter.count_block(syst)
+        for counter in self.observers["packet"]:
+            counter.count_block(iat, wt, st, syst)
+
+    def count_state_block(self, timestamps, queue_lengths, server_busy):
+        """
+        Count the queue length and the server status for a block of consecutive time intervals.
+        queue_lengths[i] and server_busy[i] are the values from the previous timestamp until timestamps[i].
+        """
+        for counter in self.observers["ql"]:
+            counter.count_block(queue_lengths, timestamps)
+        for counter in self.observers["busy"]:
+            counter.count_block(server_busy, timestamps)
 
-    def count_queue(self):
+    def count_state(self, queue_length, server_busy):
         """
-        Count the number of packets in the buffer and add the values to the corresponding (time dependent) histogram.
-        This function should be called at least whenever the number of packets in the buffer changes.
+        Count the number of packets in the buffer and the server status with the time dependent counters and
+        histograms. The values have been valid since the last call.
+        This function has to be called whenever the number of packets in the buffer or the server status changes
+        (right before the change) and before the results are read (see SystemState.count_state).
 
         The system utilization is counted as well and can be counted from the counter cnt_sys_util.
         """
-        self.cnt_ql.count(self.sim.system_state.get_queue_length())
-        self.hist_ql.count(self.sim.system_state.get_queue_length())
+        for count in self.ql_counters:
+            count(queue_length)
 
-        if self.sim.system_state.server_busy:
-            self.cnt_sys_util.count(1)
-        else:
-            self.cnt_sys_util.count(0)
+        if self.busy_counters:
+            busy = 1 if server_busy else 0
+            for count in self.busy_counters:
+                count(busy)
@@ -1,3 +1,4 @@
+import bisect
 import heapq
 import random
 
@@ -7,14 +8,23 @@ class EventChain(object):
     This class contains a queue of events.
 
     Events can be inserted and removed from queue and are sorted by their time.
-    Always the oldest event is removed.
+    Always the oldest event is removed. The chain is implemented as a binary heap. Other implementations (see
+    CalendarEventChain) provide the same methods insert, remove_oldest_event and __len__.
+
+    In keyed mode (default), the heap stores tuples (timestamp, priority, insertion sequence, event), so all
+    comparisons are done on floats and integers in C instead of calling SimEvent.__lt__. Events with equal
+    timestamp and priority are removed in insertion (FIFO) order, which makes tie-breaking deterministic.
     """
 
-    def __init__(self):
+    def __init__(self, keyed=True):
         """
         Initialize variables and event chain
+        :param keyed: if True, events are ordered by a (timestamp, priority, sequence) key,
+        else the events are compared directly using SimEvent.__lt__
         """
         self.event_list = []
+        self.keyed = keyed
+        self.sequence = 0
 
     def insert(self, e):
         """
@@ -22,14 +32,203 @@ class EventChain(object):
         :param: e is of type SimEvent
 
         """
-        heapq.heappush(self.event_list, e)
+        if self.keyed:
+            self.sequence += 1
+            heapq.heappush(self.event_list, (e.timestamp, e.priority, self.sequence, e))
+        else:
+            heapq.heappush(self.event_list, e)
 
     def remove_oldest_event(self):
         """
         Remove event with smallest timestamp (and priority) from queue
         :return: next event in event chain
         """
-        return heapq.heappop(self.event_list)
+        if self.keyed:
+            return heapq.heappop(self.event_list)[3]
+        else:
+            return heapq.heappop(self.event_list)
+
+    def __len__(self):
+        """
+        :return: number of pending events
+        """
+        return len(self.event_list)
+
+
+class CalendarEventChain(EventChain):
+
+    """
+    Event chain implemented as a calendar queue (R. Brown, 1988), with O(1) amortized insertion and removal.
+
+    Events are sorted into buckets ("days") of a fixed width, each bucket holding a sorted list of
+    (timestamp, priority, sequence, event) keys like the keyed heap. A bucket covers all timestamps t with
+    int(t / width) equal to the bucket number modulo the number of buckets ("year"). Removal scans the buckets
+    starting at the current day. Whenever the number of events grows above twice or drops below half the number
+    of buckets, the calendar is rebuilt and the bucket width is set from the average separation of the earliest
+    pending events, so the calendar adapts to the observed event-time distribution.
+    """
+
+    # number of events sampled for estimating the bucket width
+    WIDTH_SAMPLES = 25
+
+    def __init__(self):
+        """
+        Initialize an empty calendar with two buckets of width one.
+        """
+        super(CalendarEventChain, self).__init__()
+        self.width = 1.
+        self.buckets = [[], []]
+        self.mask = 1
+        self.size = 0
+        self.current = 0
+
+    def insert(self, e):
+        """
+        Inserts event e into the bucket of its timestamp.
+        :param: e is of type SimEvent
+        """
+        self.sequence += 1
+        day = int(e.timestamp / self.width)
+        bisect.insort(self.buckets[day & self.mask], (e.timestamp, e.priority, self.sequence, e))
+        if day < self.current:
+            self.current = day
+        self.size += 1
+        if self.size > 2 * len(self.buckets):
+            self.resize(2 * len(self.buckets))
+
+    def remove_oldest_event(self):
+        """
+        Remove event with smallest timestamp (and priority) from the calendar
+        :return: next event in event chain
+        """
+        if self.size == 0:
+            raise IndexError("remove from empty event chain")
+        buckets = self.buckets
+        width = self.width
+        day = self.current
+        for _ in xrange(len(buckets)):
+            bucket = buckets[day & self.mask]
+            if bucket and int(bucket[0][0] / width) <= day:
+                return self.pop_from(bucket, day)
+            day += 1
+
+        # no event within the next year: jump directly to the earliest event
+        bucket = min((b for b in buckets if b), key=lambda b: b[0])
+        return self.pop_from(bucket, int(bucket[0][0] / width))
+
+    def pop_from(self, bucket, day):
+        """
+        Remove the first entry of the bucket and set the current day.
+        :return: event of the removed entry
+        """
+        entry = bucket.pop(0)
+        self.current = day
+        self.size -= 1
+        if self.size < len(self.buckets) // 2 and len(self.buckets) > 2:
+            self.resize(len(self.buckets) // 2)
+        return entry[3]
+
+    def resize(self, num_buckets):
+        """
+        Rebuild the calendar with the given number of buckets and a new bucket width.
+        """
+        entries = [entry for bucket in self.buckets for entry in bucket]
+        self.width = self.estimate_width(entries)
+        self.buckets = [[] for _ in xrange(num_buckets)]
+        self.mask = num_buckets - 1
+        for entry in entries:
+            self.buckets[int(entry[0] / self.width) & self.mask].append(entry)
+        for bucket in self.buckets:
+            bucket.sort()
+        if entries:
+            self.current = int(min(entries)[0] / self.width)
+
+    def estimate_width(self, entries):
+        """
+        Estimate the bucket width as three times the average separation of the earliest events.
+        Separations larger than twice the average are not considered.
+        :return: new bucket width (the old width if no estimation is possible)
+        """
+        sample = heapq.nsmallest(CalendarEventChain.WIDTH_SAMPLES, entries)
+        separations = [b[0] - a[0] for a, b in zip(sample, sample[1:])]
+        if not separations:
+            return self.width
+        average = sum(separations) / len(separations)
+        separations = [s for s in separations if s <= 2 * average]
+        width = 3 * sum(separations) / len(separations) if separations else 0
+        return width if width > 0 else self.width
+
+    def __len__(self):
+        """
+        :return: number of pending events
+        """
+        return self.size
+
+
+# available event chain implementations, selected by sim_param.EVENT_CHAIN_TYPE
+EVENT_CHAIN_TYPES = {
+    "heap": EventChain,
+    "calendar": CalendarEventChain
+}
+
+
+def create_event_chain(sim):
+    """
+    Create the event chain implementation configured in sim_param.EVENT_CHAIN_TYPE.
+    :param sim: simulation object, the event chain belongs to
+    :return: EventChain or CalendarEventChain object
+    """
+    try:
+        event_chain_type = EVENT_CHAIN_TYPES[sim.sim_param.EVENT_CHAIN_TYPE]
+    except KeyError:
+        raise ValueError("Unknown event chain type: " + str(sim.sim_param.EVENT_CHAIN_TYPE))
+    return event_chain_type()
+
+
+class EventPool(object):
+
+    """
+    EventPool keeps free lists of processed events of one simulation.
+
+    Instead of constructing a new event object for every arrival and service completion, processed events are
+    returned to the pool by the simulation and handed out again with a new timestamp. Only event types with a free
+    list (CustomerArrival and ServiceCompletion) are recycled. Pooling can be disabled with sim_param.EVENT_POOLING.
+    """
+
+    def __init__(self, sim):
+        """
+        Initialize empty free lists.
+        :param sim: simulation, the pool belongs to
+        """
+        self.sim = sim
+        if sim.sim_param.EVENT_POOLING:
+            self.free_lists = {CustomerArrival: [], ServiceCompletion: []}
+        else:
+            self.free_lists = {}
+        self.allocated = 0
+
+    def acquire(self, event_type, timestamp):
+        """
+        Return an event of the given type with the given timestamp, recycled from the free list if possible.
+        :param event_type: subclass of SimEvent
+        :param timestamp: execution time of the event
+        :return: event object
+        """
+        free_list = self.free_lists.get(event_type)
+        if free_list:
+            e = free_list.pop()
+            e.timestamp = timestamp
+            return e
+        self.allocated += 1
+        return event_type(self.sim, timestamp)
+
+    def release(self, e):
+        """
+        Return a processed event to its free list. The event must not be referenced anymore (e.g. by the event chain).
+        """
+        free_list = self.free_lists.get(type(e))
+        if free_list is not None:
+            free_list.append(e)
 
 
 class SimEvent(object):
@@ -38,15 +237,18 @@ class SimEvent(object):
     SimEvent represents an abstract type of simulation event.
 
     Contains mainly abstract methods that should be implemented in the subclasses.
-    Comparison for EventChain insertion is implemented by comparing first the timestamps and then the priorities
+    Comparison for EventChain insertion is implemented by comparing first the timestamps and then the priorities.
+    Events use __slots__ and the priority is a class attribute, so events do not carry an instance dictionary.
     """
 
+    __slots__ = ("timestamp", "sim")
+    priority = 0
+
     def __init__(self, sim, timestamp):
         """
         Initialization routine, setting the timestamp of the event and the simulation it belongs to.
         """
         self.timestamp = timestamp
-        self.priority = 0
         self.sim = sim
 
     def process(self):
@@ -61,8 +263,6 @@ class SimEvent(object):
         """
         if self.timestamp != other.timestamp:
             return self.timestamp < other.timestamp
-        elif self.priority != other.priority:
-            return self.priority < other.priority
         else:
             return self.priority < other.priority
 
@@ -71,16 +271,12 @@ class CustomerArrival(SimEvent):
 
     """
     Defines a new customer arrival event (new packet comes into the system)
-    """
 
-    def __init__(self, sim, timestamp):
-        """
-        Create a new customer arrival event with given execution time.
+    Priority of customer arrival event is set to 1 (second highest)
+    """
 
-        Priority of customer arrival event is set to 1 (second highest)
-        """
-        super(CustomerArrival, self).__init__(sim, timestamp)
-        self.priority = 1
+    __slots__ = ()
+    priority = 1
 
     def process(self):
         """
@@ -91,38 +287,34 @@ class CustomerArrival(SimEvent):
         If packet is added to the server, a service completion event is generated.
         Each customer is counted either as accepted or as dropped.
         """
-        ev = CustomerArrival(self.sim, self.sim.sim_state.now + self.sim.rng.get_iat())
-        self.sim.event_chain.insert(ev)
+        sim = self.sim
+        now = sim.sim_state.now
+        event_chain = sim.event_chain
+        event_chain.insert(sim.event_pool.acquire(CustomerArrival, now + sim.rng.get_iat()))
 
-        if self.sim.system_state.add_packet_to_server():
+        if sim.system_state.add_packet_to_server():
             # packet is added to server and served
-            ev = ServiceCompletion(
-                self.sim, self.sim.sim_state.now + self.sim.rng.get_st())
-            self.sim.event_chain.insert(ev)
-            self.sim.sim_state.packet_accepted()
+            event_chain.insert(sim.event_pool.acquire(ServiceCompletion, now + sim.rng.get_st()))
+            sim.sim_state.packet_accepted()
 
         else:
-            if self.sim.system_state.add_packet_to_queue():
+            if sim.system_state.add_packet_to_queue():
                 # packet is added to queue
-                self.sim.sim_state.packet_accepted()
+                sim.sim_state.packet_accepted()
             else:
-                self.sim.sim_state.packet_dropped()
+                sim.sim_state.packet_dropped()
 
 
 class ServiceCompletion(SimEvent):
 
     """
     Defines a service completion event (highest priority in EventChain)
-    """
 
-    def __init__(self, sim, timestamp):
-        """
-        Create a new service completion event with given execution time.
+    Priority of service completion event is set to 0 (highest).
+    """
 
-        Priority of service completion event is set to 0 (highest).
-        """
-        super(ServiceCompletion, self).__init__(sim, timestamp)
-        self.priority = 0
+    __slots__ = ()
+    priority = 0
 
     def process(self):
         """
@@ -132,31 +324,27 @@ class ServiceCompletion(SimEvent):
         Then, if the queue is not empty, the next packet is taken from the queue and served,
         hence a new service completion event is created and inserted in the event chain.
         """
-        self.sim.system_state.complete_service()
-        if self.sim.system_state.start_service():
+        sim = self.sim
+        system_state = sim.system_state
+        system_state.complete_service()
+        if system_state.start_service():
             # trigger next packet
-            ev = ServiceCompletion(
-                self.sim, self.sim.sim_state.now + self.sim.rng.get_st())
-            self.sim.event_chain.insert(ev)
+            sim.event_chain.insert(sim.event_pool.acquire(ServiceCompletion, sim.sim_state.now + sim.rng.get_st()))
 
 
 class SimulationTermination(SimEvent):
 
     """
     Defines the end of a simulation. (least priority in EventChain)
-    """
 
-    def __init__(self, sim, timestamp):
-        """
-        Create a new simulation termination event with given execution time.
+    Priority of simulation termination event is set to 2 (lowest)
+    """
 
-        Priority of simulation termination event is set to 2 (lowest)
-        """
-        super(SimulationTermination, self).__init__(sim, timestamp)
-        self.priority = 2
+    __slots__ = ()
+    priority = 2
 
     def process(self):
         """
         Simulation stop flag is set to true, so simulation is stopped after this event.
         """
-        self.sim.sim_state.stop = True
\ No newline at end of file
+        self.sim.sim_state.stop = True
@@ -52,8 +52,130 @@ class FiniteQueue(object):
         """
         return self.buffer.empty()
 
+    def is_full(self):
+        """
+        :return: true if queue is full
+        """
+        return self.buffer.qsize() >= self.sim.sim_param.S
+
     def flush(self):
         """
         erase all packets from the FIFO
         """
         self.buffer = Queue.Queue()
+
+    def __getstate__(self):
+        """
+        Return the attributes for pickling and copying. Queue.Queue contains locks, so only the packets are kept.
+        """
+        return {"sim": self.sim, "packets": list(self.buffer.queue)}
+
+    def __setstate__(self, state):
+        self.sim = state["sim"]
+        self.buffer = Queue.Queue()
+        for packet in state["packets"]:
+            self.buffer.put(packet)
+
+
+class RingBufferQueue(object):
+
+    """
+    Finite FIFO queue backed by a preallocated array, used as a ring buffer.
+
+    Like FiniteQueue, the capacity is read from sim_param.S on every add, so a change of S (e.g. between the runs of
+    a simulation study) takes effect immediately. The array is grown, if S exceeds its size. Since the simulator is
+    single-threaded, no locking is done, so all operations (including flush) run in constant time.
+    """
+
+    def __init__(self, sim):
+        """
+        Initialize the ring buffer with an array of size S.
+        :param sim: simulation object, the queue belongs to
+        :return: RingBufferQueue object
+        """
+        self.sim = sim
+        self.buffer = [None] * max(sim.sim_param.S, 1)
+        self.head = 0
+        self.length = 0
+
+    def add(self, packet):
+        """
+        Try to add a packet to the queue
+        :param packet: packet which is supposed to be queued
+        :return: true if packet has been enqueued, false if rejected
+        """
+        if self.length < self.sim.sim_param.S:
+            if self.length == len(self.buffer):
+                self.grow()
+            self.buffer[(self.head + self.length) % len(self.buffer)] = packet
+            self.length += 1
+            return True
+        else:
+            return False
+
+    def grow(self):
+        """
+        Double the size of the array (at least to S) and move the packets to its beginning.
+        """
+        size = len(self.buffer)
+        packets = self.buffer[self.head:] + self.buffer[:self.head]
+        self.buffer = packets + [None] * (max(self.sim.sim_param.S, 2 * size) - size)
+        self.head = 0
+
+    def remove(self):
+        """
+        Return the first packet in line and remove it from the FIFO
+        :return: first packet in line
+        """
+        if self.length == 0:
+            return None
+        packet = self.buffer[self.head]
+        self.buffer[self.head] = None
+        self.head = (self.head + 1) % len(self.buffer)
+        self.length -= 1
+        return packet
+
+    def get_queue_length(self):
+        """
+        :return: fill status of the queue
+        """
+        return self.length
+
+    def is_empty(self):
+        """
+        :return: true if queue is empty
+        """
+        return self.length == 0
+
+    def is_full(self):
+        """
+        :return: true if queue is full
+        """
+        return self.length >= self.sim.sim_param.S
+
+    def flush(self):
+        """
+        Erase all packets from the FIFO. Only the indices are reset, stale entries are overwritten by later packets.
+        """
+        self.head = 0
+        self.length = 0
+
+
+# available buffer implementations, selected by sim_param.QUEUE_TYPE
+QUEUE_TYPES = {
+    "queue": FiniteQueue,
+    "ring": RingBufferQueue
+}
+
+
+def create_queue(sim):
+    """
+    Create the buffer implementation configured in sim_param.QUEUE_TYPE.
+    :param sim: simulation object, the queue belongs to
+    :return: FiniteQueue or RingBufferQueue object
+    """
+    try:
+        queue_type = QUEUE_TYPES[sim.sim_param.QUEUE_TYPE]
+    except KeyError:
+        raise ValueError("Unknown queue type: " + str(sim.sim_param.QUEUE_TYPE))
+    return queue_type(sim)
@@ -1,3 +1,4 @@
+import math
 import numpy
 from matplotlib import pyplot
 
@@ -120,6 +121,12 @@ class TimeIndependentHistogram(Histogram):
         """
         self.values.append(value)
 
+    def count_block(self, values):
+        """
+        Add a block of values (e.g. a numpy array) to the histogram.
+        """
+        self.values.extend(numpy.asarray(values, dtype=float).tolist())
+
     def report(self):
         """
         Make report, i.e., calculate histogram and bins using numpy.
@@ -149,6 +156,299 @@ class TimeIndependentHistogram(Histogram):
             raise ValueError("Can't plot histogram with no values.")
 
 
+class LogHistogram(Histogram):
+
+    """
+    Histogram with log-linear buckets (like HdrHistogram) for non-negative values spanning many orders of magnitude.
+
+    Values are not stored. Below 2^k * lowest, the buckets have the width lowest. Above, every power of two is split
+    into 2^k buckets of equal width, hence the relative error of a bucket is at most 2^-k. With k = 7 and
+    lowest = 1e-3, a value costs one bucket increment and values up to 1e9 need less than 5000 buckets. The bucket
+    array grows with the largest counted value, so the memory does not depend on the number of values.
+
+    Histograms with the same parameters can be merged, e.g. the histograms of different replications. Quantiles are
+    calculated from the buckets and returned as the midpoint of the bucket.
+    """
+
+    def __init__(self, sim, typestr, lowest=1e-3, sub_bucket_bits=7):
+        """
+        Initialize the histogram.
+        :param sim: simulation object, the histogram belongs to
+        :param typestr: typestring for better distinction
+        :param lowest: width of the linear buckets, i.e. the resolution for small values
+        :param sub_bucket_bits: k, the number of buckets per power of two is 2^k
+        """
+        super(LogHistogram, self).__init__(sim, typestr)
+        self.lowest = float(lowest)
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.reset()
+
+    def reset(self):
+        """
+        Reset all buckets to zero.
+        """
+        Histogram.reset(self)
+        self.counts = [0] * (2 * self.sub_buckets)
+        self.num_values = 0
+        self.min_value = float("inf")
+        self.max_value = 0.
+
+    def get_bucket(self, value):
+        """
+        Return the index of the bucket, the value belongs to.
+        """
+        scaled = value / self.lowest
+        if scaled < self.sub_buckets:
+            if scaled < 0:
+                raise ValueError("LogHistogram can only count non-negative values.")
+            return int(scaled)
+        m, e = math.frexp(scaled)
+        # scaled = m * 2^e with .5 <= m < 1, i.e. in the octave [2^(e-1), 2^e) with e - 1 >= k
+        return (e - self.sub_bucket_bits) * self.sub_buckets + int((2 * m - 1) * self.sub_buckets)
+
+    def get_bucket_bounds(self, index):
+        """
+        Return lower and upper bound of a bucket.
+        """
+        if index < self.sub_buckets:
+            return index * self.lowest, (index + 1) * self.lowest
+        octave, sub = divmod(index, self.sub_buckets)
+        width = math.ldexp(self.lowest, octave - 1)
+        lower = math.ldexp(self.lowest, octave - 1 + self.sub_bucket_bits) + sub * width
+        return lower, lower + width
+
+    def count(self, value):
+        """
+        Add a value to its bucket.
+        """
+        index = self.get_bucket(value)
+        if index >= len(self.counts):
+            self.grow(index + 1)
+        self.counts[index] += 1
+        self.num_values += 1
+        if value < self.min_value:
+            self.min_value = value
+        if value > self.max_value:
+            self.max_value = value
+
+    def count_block(self, values):
+        """
+        Add a block of values (e.g. a numpy array) to the histogram.
+        """
+        values = numpy.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        if values.min() < 0:
+            raise ValueError("LogHistogram can only count non-negative values.")
+        scaled = values / self.lowest
+        m, e = numpy.frexp(scaled)
+        index = numpy.where(scaled < self.sub_buckets, scaled.astype(int),
+                            (e - self.sub_bucket_bits) * self.sub_buckets + ((2 * m - 1) * self.sub_buckets).astype(int))
+        self.add_counts(numpy.bincount(index))
+        self.num_values += len(values)
+        self.min_value = min(self.min_value, values.min())
+        self.max_value = max(self.max_value, values.max())
+
+    def grow(self, size):
+        """
+        Extend the bucket array by whole powers of two, such that it contains at least size buckets.
+        """
+        size = -(-size // self.sub_buckets) * self.sub_buckets
+        self.counts.extend([0] * (size - len(self.counts)))
+
+    def add_counts(self, counts):
+        """
+        Add an array of bucket counts to the buckets.
+        """
+        if len(counts) > len(self.counts):
+            self.grow(len(counts))
+        for i in numpy.flatnonzero(counts):
+            self.counts[i] += int(counts[i])
+
+    def merge(self, other):
+        """
+        Add the buckets of another LogHistogram with the same parameters to this histogram.
+        """
+        if other.lowest != self.lowest or other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Only histograms with the same bucket parameters can be merged.")
+        self.add_counts(other.counts)
+        self.num_values += other.num_values
+        self.min_value = min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+
+    def get_sketch(self):
+        """
+        Return a compact, immutable copy of the histogram: a tuple of lowest, sub_bucket_bits, the index of the first
+        non-empty bucket, the counts from this bucket to the last non-empty bucket, the minimum and the maximum.
+        :return: sketch tuple or None, if no values have been counted
+        """
+        if self.num_values == 0:
+            return None
+        used = numpy.flatnonzero(self.counts)
+        return (self.lowest, self.sub_bucket_bits, int(used[0]), tuple(self.counts[used[0]:used[-1] + 1]),
+                self.min_value, self.max_value)
+
+    def merge_sketch(self, sketch):
+        """
+        Add the buckets of a sketch (see get_sketch) of a histogram with the same parameters to this histogram.
+        """
+        if sketch is None:
+            return
+        lowest, sub_bucket_bits, first, counts, min_value, max_value = sketch
+        if lowest != self.lowest or sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Only histograms with the same bucket parameters can be merged.")
+        self.add_counts(numpy.concatenate((numpy.zeros(first, dtype=int), counts)))
+        self.num_values += sum(counts)
+        self.min_value = min(self.min_value, min_value)
+        self.max_value = max(self.max_value, max_value)
+
+    def get_num_values(self):
+        """
+        Return the number of counted values.
+        """
+        return self.num_values
+
+    def get_quantile(self, q):
+        """
+        Return the q-quantile of the counted values, e.g. q = .99 for the 99th percentile.
+        The result lies within the bucket of the quantile, i.e. its relative error is at most 2^-k.
+        """
+        if self.num_values == 0:
+            raise ValueError("Can't calculate quantile with no values.")
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile has to be between 0 and 1.")
+        rank = max(1, int(math.ceil(q * self.num_values)))
+        index = numpy.searchsorted(numpy.cumsum(self.counts), rank)
+        lower, upper = self.get_bucket_bounds(index)
+        return min(max((lower + upper) / 2., self.min_value), self.max_value)
+
+    def get_quantiles(self, qs):
+        """
+        Return a list of quantiles, one for every q in qs.
+        """
+        return [self.get_quantile(q) for q in qs]
+
+    def report(self):
+        """
+        Print the median and tail quantiles and plot the distribution of the buckets on a logarithmic axis.
+        """
+        if self.num_values == 0:
+            raise ValueError("Can't plot histogram with no values.")
+        print "Histogram " + str(self.type) + ": p50 = " + str(self.get_quantile(.5)) + "; p99 = " + \
+            str(self.get_quantile(.99)) + "; p99.9 = " + str(self.get_quantile(.999)) + "; max = " + \
+            str(self.max_value)
+        used = numpy.flatnonzero(self.counts)
+        indices = range(used[0], used[-1] + 1)
+        self.bins = [self.get_bucket_bounds(i)[0] for i in indices] + [self.get_bucket_bounds(indices[-1])[1]]
+        self.bin_mids = [sum(self.get_bucket_bounds(i)) / 2. for i in indices]
+        self.histogram = numpy.array(self.counts[used[0]:used[-1] + 1], dtype=float) / self.num_values
+        pyplot.semilogx(self.bin_mids, self.histogram, "+-", label='S=' + str(self.sim.sim_param.S))
+        pyplot.legend(loc='upper right')
+
+
+class OccupancyHistogram(Histogram):
+
+    """
+    Time dependent histogram for a small non-negative integer state, e.g. the queue length 0, ..., S.
+
+    The duration of every value is added to an occupancy array indexed by the value, so counting takes constant time
+    and the memory only depends on the largest value. The occupancy divided by the total time is the exact time
+    average distribution of the state. With Poisson arrivals, arriving packets see the time average (PASTA), hence
+    the blocking probability of a buffer with S places is the fraction of time, the queue length has been S.
+    """
+
+    def __init__(self, sim, typestr, size=1):
+        """
+        Initialize histogram with the simulation it belongs to and a typestring for better distinction
+        :param sim: simulation object, the histogram belongs to
+        :param typestr: typestring for better distinction
+        :param size: number of states, which are allocated initially (e.g. S + 1 for the queue length)
+        """
+        super(OccupancyHistogram, self).__init__(sim, typestr)
+        self.size = size
+        self.first_timestamp = 0
+        self.last_timestamp = 0
+        self.occupancy = [0.] * size
+
+    def count(self, value):
+        """
+        Add the time since the last count to the occupancy of the value.
+        """
+        now = self.sim.sim_state.now
+        if value >= len(self.occupancy):
+            self.occupancy.extend([0.] * (value + 1 - len(self.occupancy)))
+        self.occupancy[value] += now - self.last_timestamp
+        self.last_timestamp = now
+
+    def count_block(self, values, timestamps):
+        """
+        Add a block of values, values[i] has been valid from the previous timestamp until timestamps[i].
+        """
+        timestamps = numpy.asarray(timestamps, dtype=float)
+        if len(timestamps) == 0:
+            return
+        values = numpy.asarray(values).astype(int)
+        dt = numpy.diff(numpy.concatenate(([self.last_timestamp], timestamps)))
+        occupancy = numpy.bincount(values, weights=dt)
+        if len(occupancy) > len(self.occupancy):
+            self.occupancy.extend([0.] * (len(occupancy) - len(self.occupancy)))
+        for i in numpy.flatnonzero(occupancy):
+            self.occupancy[i] += occupancy[i]
+        self.last_timestamp = timestamps[-1]
+
+    def reset(self):
+        """
+        Reset the occupancy of all states to zero.
+        """
+        self.first_timestamp = self.sim.sim_state.now
+        self.last_timestamp = self.sim.sim_state.now
+        self.occupancy = [0.] * self.size
+        Histogram.reset(self)
+
+    def get_distribution(self):
+        """
+        Return the time average distribution, i.e. the fraction of time spent in every state.
+        """
+        return numpy.array(self.occupancy) / (self.last_timestamp - self.first_timestamp)
+
+    def get_mean(self):
+        """
+        Return the time average of the state.
+        """
+        distribution = self.get_distribution()
+        return float(numpy.dot(numpy.arange(len(distribution)), distribution))
+
+    def get_blocking_probability(self, s=None):
+        """
+        Return the blocking probability of a buffer with s places (by PASTA, the fraction of time it has been full).
+        Only buffers with at least one place can be evaluated: without places, the queue length is always 0 and a
+        packet is blocked, if the server is busy, which is not counted by the histogram (see cnt_sys_util).
+        :param s: number of places in the buffer (default: S of the simulation)
+        """
+        if s is None:
+            s = self.sim.sim_param.S
+        if s < 1:
+            raise ValueError("Blocking probability of the queue length histogram requires a buffer with s >= 1.")
+        if s >= len(self.occupancy):
+            return 0.
+        return float(sum(self.occupancy[s:])) / (self.last_timestamp - self.first_timestamp)
+
+    def report(self):
+        """
+        Calculate the distribution of the states and plot it.
+        """
+        if self.last_timestamp > self.first_timestamp:
+            self.histogram = self.get_distribution()
+            self.bins = numpy.arange(len(self.histogram) + 1) - .5
+            if self.sim.sim_param.S in self.sim.sim_param.S_VALUES:
+                self.plot(diag_type="side-by-side")
+            else:
+                self.plot(diag_type="line")
+        else:
+            raise ValueError("Can't plot histogram with no values.")
+
+
 class TimeDependentHistogram(Histogram):
 
     """
@@ -176,6 +476,17 @@ class TimeDependentHistogram(Histogram):
         self.weights.append(dt)
         self.last_timestamp = self.sim.sim_state.now
 
+    def count_block(self, values, timestamps):
+        """
+        Add a block of values, values[i] has been valid from the previous timestamp until timestamps[i].
+        """
+        timestamps = numpy.asarray(timestamps, dtype=float)
+        if len(timestamps) == 0:
+            return
+        self.values.extend(numpy.asarray(values, dtype=float).tolist())
+        self.weights.extend(numpy.diff(numpy.concatenate(([self.last_timestamp], timestamps))).tolist())
+        self.last_timestamp = timestamps[-1]
+
     def reset(self):
         self.first_timestamp = self.sim.sim_state.now
         self.last_timestamp = self.sim.sim_state.now
@@ -0,0 +1,135 @@
+import numpy
+
+# simulation engines, that can be selected with SimParam.ENGINE
+ENGINES = ["events", "lindley"]
+
+
+def can_use_lindley_engine(sim):
+    """
+    Return True, if a run until SIM_TIME can be done by the LindleyEngine: the simulation has not been started yet and
+    all enabled counters can count blocks of packets and states.
+    :param sim: simulation object
+    """
+    if sim.sim_state.now != 0 or sim.sim_state.num_packets != 0:
+        return False
+    return all(hasattr(counter, "count_block") for _, quantity, counter in sim.counter_collection.counters
+               if quantity is not None)
+
+
+class LindleyEngine(object):
+
+    """
+    Vectorized simulation engine for a single FIFO server with an (effectively) infinite buffer.
+
+    Without blocking, the waiting time of packet k follows the Lindley recursion
+    W_k = max(0, W_(k-1) + ST_(k-1) - IAT_k), which can be solved for a whole block of packets with numpy:
+    with X_k = W_0 + sum_(i<k) (ST_i - IAT_(i+1)), the waiting times are W_k = X_k - min(0, min_(j<=k) X_j).
+
+    The inter-arrival and service times are drawn in blocks from the RNG of the simulation, in the same order as the
+    event driven simulation draws them, so both produce the same results for the same seeds. Packets are processed
+    in chunks of block_size arrivals, hence the memory does not depend on the simulation time.
+
+    Results are written to the SimState, CounterCollection and SimResult objects of the simulation, just like a run
+    of Simulation.do_simulation(). The buffer size S of the simulation must never be reached, otherwise a
+    ValueError is raised.
+    """
+
+    def __init__(self, sim, block_size=100000):
+        """
+        Create the engine for the given simulation.
+        :param sim: simulation providing parameters, RNG, counters and result objects
+        :param block_size: number of arrivals processed at once
+        """
+        self.sim = sim
+        self.block_size = block_size
+
+        # time of the last arrival and departure time of the last packet
+        self.last_arrival = 0.
+        self.last_departure = 0.
+
+        # changes of queue length and server status after the last counted timestamp
+        self.pending_times = numpy.zeros(0)
+        self.pending_dq = numpy.zeros(0)
+        self.pending_db = numpy.zeros(0)
+        self.queue_length = 0
+        self.server_busy = 0
+        self.max_queue_length = 0
+
+    def do_simulation(self):
+        """
+        Do one simulation run until SIM_TIME.
+        :return: SimResult object
+        """
+        sim_time = self.sim.sim_param.SIM_TIME
+        arrival = 0.
+        first = True
+        while True:
+            # arrival times: the first packet arrives at 0, each arrival draws the IAT to the next one
+            iat = self.sim.rng.get_iat_block(self.block_size)
+            arrivals = numpy.cumsum(numpy.concatenate(([arrival], iat)))
+            if not first:
+                arrivals = arrivals[1:]
+            arrival = arrivals[-1]
+            done = arrivals[-1] > sim_time
+            arrivals = arrivals[arrivals <= sim_time]
+            self.process_arrivals(arrivals, sim_time if done else arrivals[-1], sim_time, first)
+            first = False
+            if done:
+                break
+
+        sim_state = self.sim.sim_state
+        sim_state.now = sim_time
+        sim_state.stop = True
+        self.sim.sim_result.gather_results()
+        return self.sim.sim_result
+
+    def process_arrivals(self, arrivals, boundary, sim_time, first):
+        """
+        Serve a chunk of arrivals and count all packets and state changes up to the boundary time.
+        :param arrivals: arrival times of the chunk (sorted)
+        :param boundary: all state changes up to this time are counted, later ones are kept for the next chunk
+        :param sim_time: end of the simulation
+        :param first: True for the first chunk of the run
+        """
+        n = len(arrivals)
+        st = self.sim.rng.get_st_block(n)
+        self.sim.sim_state.num_packets += n
+
+        if n > 0:
+            iat = numpy.diff(numpy.concatenate(([arrivals[0] if first else self.last_arrival], arrivals)))
+            w0 = max(0., self.last_departure - arrivals[0])
+            x = w0 + numpy.concatenate(([0.], numpy.cumsum(st[:-1] - iat[1:])))
+            wt = x - numpy.minimum(numpy.minimum.accumulate(x), 0.)
+            start = arrivals + wt
+            departure = start + st
+            self.last_arrival = arrivals[-1]
+            self.last_departure = departure[-1]
+
+            completed = departure <= sim_time
+            self.sim.counter_collection.count_packet_block(iat[completed], wt[completed], st[completed],
+                                                           (departure - arrivals)[completed])
+
+            waiting = wt > 0
+            times = numpy.concatenate((self.pending_times, arrivals[waiting], start[waiting], start, departure))
+            dq = numpy.concatenate((self.pending_dq, numpy.ones(waiting.sum()), -numpy.ones(waiting.sum()),
+                                    numpy.zeros(2 * n)))
+            db = numpy.concatenate((self.pending_db, numpy.zeros(2 * waiting.sum()), numpy.ones(n), -numpy.ones(n)))
+        else:
+            times, dq, db = self.pending_times, self.pending_dq, self.pending_db
+
+        # count the state changes in chronological order, each value is valid until the next change
+        order = numpy.argsort(times, kind="mergesort")
+        times, dq, db = times[order], dq[order], db[order]
+        now = times <= boundary
+        self.pending_times, self.pending_dq, self.pending_db = times[~now], dq[~now], db[~now]
+        times, dq, db = times[now], dq[now], db[now]
+
+        queue_lengths = self.queue_length + numpy.concatenate(([0.], numpy.cumsum(dq)))
+        busy = self.server_busy + numpy.concatenate(([0.], numpy.cumsum(db)))
+        self.queue_length, self.server_busy = queue_lengths[-1], busy[-1]
+        if len(queue_lengths) > 0:
+            self.max_queue_length = max(self.max_queue_length, queue_lengths.max())
+        if self.max_queue_length > self.sim.sim_param.S:
+            raise ValueError("Buffer size S exceeded. Lindley engine requires an (effectively) infinite buffer.")
+
+        self.sim.counter_collection.count_state_block(numpy.concatenate((times, [boundary])), queue_lengths, busy)
@@ -1,3 +1,6 @@
+import numpy
+
+
 class Packet(object):
 
     """
@@ -76,4 +79,110 @@ class Packet(object):
         Return the inter-arrival time between the current and the last customer/packet
         :return: inter-arrival time
         """
-        return self.iat
\ No newline at end of file
+        return self.iat
+
+
+class PacketLedger(object):
+
+    """
+    PacketLedger stores the measurement timestamps of all packets in the system in preallocated numpy columns.
+
+    Instead of allocating a Packet object per arrival, an accepted packet is represented by an integer id, which is
+    passed through the queue. The columns t_arrival, t_start, t_complete and iat are used as ring buffers indexed by
+    id & mask. Since packets leave the system in FIFO order, only the ids between the oldest packet still in the
+    system and the newest packet are alive. The columns grow (doubling their size) if more packets are in the system
+    than there are slots, so the memory footprint depends on the buffer size only, not on the number of packets.
+    """
+
+    def __init__(self, sim, capacity=16):
+        """
+        Initialize the ledger with empty columns.
+        :param sim: simulation, the ledger belongs to
+        :param capacity: number of preallocated slots, rounded up to the next power of two
+        :return: PacketLedger object
+        """
+        self.sim = sim
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.mask = size - 1
+        self.t_arrival = numpy.zeros(size)
+        self.t_start = numpy.zeros(size)
+        self.t_complete = numpy.zeros(size)
+        self.iat = numpy.zeros(size)
+        self.next_id = 0
+        self.first_id = 0
+
+    def add_packet(self, iat=None):
+        """
+        Register a newly arrived packet with the current simulation time as arrival time.
+        :param iat: inter-arrival time with respect to the last arrival
+        :return: id of the new packet
+        """
+        if self.next_id - self.first_id > self.mask:
+            self.grow()
+        packet_id = self.next_id
+        slot = packet_id & self.mask
+        self.t_arrival[slot] = self.sim.sim_state.now
+        self.t_start[slot] = -1
+        self.t_complete[slot] = -1
+        self.iat[slot] = iat if iat is not None else numpy.nan
+        self.next_id = packet_id + 1
+        return packet_id
+
+    def start_service(self, packet_id):
+        """
+        Set the service start timestamp of the packet to the current simulation time.
+        """
+        self.t_start[packet_id & self.mask] = self.sim.sim_state.now
+
+    def complete_service(self, packet_id):
+        """
+        Set the service completion timestamp of the packet to the current simulation time.
+        """
+        self.t_complete[packet_id & self.mask] = self.sim.sim_state.now
+
+    def release(self, packet_id):
+        """
+        Remove the packet and all older packets from the ledger, their slots can be reused afterwards.
+        """
+        self.first_id = packet_id + 1
+
+    def get_times(self, packet_id):
+        """
+        Return the measurements of a completed packet.
+        :return: tuple of inter-arrival time, waiting time, service time and system time
+        """
+        slot = packet_id & self.mask
+        t_arrival = self.t_arrival.item(slot)
+        t_start = self.t_start.item(slot)
+        t_complete = self.t_complete.item(slot)
+        return self.iat.item(slot), t_start - t_arrival, t_complete - t_start, t_complete - t_arrival
+
+    def get_packet(self, packet_id):
+        """
+        Create a Packet object from the ledger entry, e.g. for inspecting a single packet.
+        :return: Packet object with the timestamps and status of the given packet
+        """
+        slot = packet_id & self.mask
+        p = Packet(self.sim, self.iat.item(slot))
+        p.t_arrival = self.t_arrival.item(slot)
+        p.t_start = self.t_start.item(slot)
+        p.t_complete = self.t_complete.item(slot)
+        p.completed = p.t_complete >= 0
+        p.served = p.t_start >= 0 and not p.completed
+        p.waiting = p.t_start < 0
+        return p
+
+    def grow(self):
+        """
+        Double the size of all columns and move the packets, that are still in the system, to their new slots.
+        """
+        ids = numpy.arange(self.first_id, self.next_id)
+        old_mask = self.mask
+        self.mask = 2 * (old_mask + 1) - 1
+        for name in ["t_arrival", "t_start", "t_complete", "iat"]:
+            old = getattr(self, name)
+            new = numpy.zeros(self.mask + 1)
+            new[ids & self.mask] = old[ids & old_mask]
+            setattr(self, name, new)
@@ -1,10 +1,22 @@
 import unittest
 from simulation import Simulation
 from systemstate import SystemState
-from packet import Packet
+from simparam import SimParam
+from finitequeue import RingBufferQueue
+from lindley import LindleyEngine
+from event import EventChain, CalendarEventChain, EventPool, CustomerArrival, ServiceCompletion, SimulationTermination
+from packet import Packet, PacketLedger
 from counter import TimeIndependentCounter, TimeDependentCounter
+from histogram import LogHistogram, OccupancyHistogram
+from resultcache import ResultCache, get_result_cache
+from snapshot import take_snapshot, restore_snapshot, fork_simulation, save_snapshot, load_snapshot
+from simresult import RESULT_FIELDS, SimResultRecord
+import cPickle
 import random
 import numpy
+import os
+import shutil
+import tempfile
 
 class DESTestExtended(unittest.TestCase):
 
@@ -155,6 +167,373 @@ class DESTestExtended(unittest.TestCase):
         self.assertEqual(s.get_queue_length(), 0,
                          msg="Error in FiniteQueue. Wrong queue length.")
 
+    def test_packet_ledger(self):
+        """
+        Check the columnar packet ledger, including growing the columns while packets are in the system.
+        """
+        sim = Simulation(SimParam())
+        ledger = PacketLedger(sim, capacity=2)
+        ids = []
+        for t in range(5):
+            sim.sim_state.now = t
+            ids.append(ledger.add_packet(1))
+        self.assertEqual(ids, range(5), msg="Error in PacketLedger. Packet ids should be consecutive.")
+        self.assertEqual(ledger.mask, 7, msg="Error in PacketLedger. Columns should have grown to 8 slots.")
+
+        sim.sim_state.now = 6
+        ledger.start_service(ids[0])
+        sim.sim_state.now = 9
+        ledger.complete_service(ids[0])
+        ledger.start_service(ids[1])
+        self.assertEqual(ledger.get_times(ids[0]), (1, 6, 3, 9),
+                         msg="Error in PacketLedger. Wrong iat, waiting, service or system time.")
+        ledger.release(ids[0])
+
+        p = ledger.get_packet(ids[1])
+        self.assertEqual([p.t_arrival, p.t_start, p.served, p.completed], [1, 9, True, False],
+                         msg="Error in PacketLedger. Wrong packet view of ledger entry.")
+
+    def test_event_chain(self):
+        """
+        Check the ordering of the keyed event chain: timestamp first, then priority, then insertion order.
+        """
+        sim = Simulation(SimParam())
+        chain = EventChain()
+        events = [SimulationTermination(sim, 5), CustomerArrival(sim, 5), CustomerArrival(sim, 1),
+                  ServiceCompletion(sim, 5), CustomerArrival(sim, 5)]
+        for e in events:
+            chain.insert(e)
+        order = [chain.remove_oldest_event() for _ in events]
+        self.assertEqual(order, [events[2], events[3], events[1], events[4], events[0]],
+                         msg="Error in EventChain. Events removed in wrong order.")
+
+    def test_calendar_event_chain(self):
+        """
+        Check that the calendar queue returns the events in the same order as the heap, while it grows and shrinks.
+        """
+        sim = Simulation(SimParam())
+        heap = EventChain()
+        calendar = CalendarEventChain()
+        r = random.Random(0)
+        now = 0
+        for i in range(3000):
+            # fill up to 1000 pending events, then drain the chain again
+            if i < 1500 or len(heap) == 0 or r.random() < .1:
+                e = CustomerArrival(sim, now + r.expovariate(1.) * r.choice([.01, 1, 100]))
+                heap.insert(e)
+                calendar.insert(e)
+            if i >= 500 and len(heap) > 0:
+                e = heap.remove_oldest_event()
+                self.assertIs(calendar.remove_oldest_event(), e,
+                              msg="Error in CalendarEventChain. Events removed in wrong order.")
+                now = e.timestamp
+        self.assertEqual(len(calendar), len(heap), msg="Error in CalendarEventChain. Wrong number of events.")
+
+    def test_event_pool(self):
+        """
+        Check that processed events are recycled by the event pool.
+        """
+        sim = Simulation(SimParam())
+        pool = EventPool(sim)
+        e = pool.acquire(ServiceCompletion, 3)
+        pool.release(e)
+        self.assertIs(pool.acquire(ServiceCompletion, 7), e, msg="Error in EventPool. Event has not been recycled.")
+        self.assertEqual([e.timestamp, e.priority, pool.allocated], [7, 0, 1],
+                         msg="Error in EventPool. Wrong timestamp, priority or number of allocated events.")
+        self.assertIsInstance(pool.acquire(CustomerArrival, 7), CustomerArrival,
+                              msg="Error in EventPool. Wrong event type returned.")
+        self.assertFalse(hasattr(e, "__dict__"), msg="Error in SimEvent. Events should not have an instance dict.")
+
+    def test_ring_buffer_queue(self):
+        """
+        Test the ring buffer implementation of the finite queue, including wrap-around and flushing.
+        """
+        sim_param = SimParam()
+        sim_param.S = 3
+        q = RingBufferQueue(Simulation(sim_param))
+        self.assertEqual([q.is_empty(), q.remove()], [True, None],
+                         msg="Error in RingBufferQueue. Queue should be empty.")
+        for i in range(3):
+            self.assertEqual(q.add(i), True, msg="Error in RingBufferQueue. Could not add packet to queue.")
+        self.assertEqual(q.add(3), False,
+                         msg="Error in RingBufferQueue. Could add packet to queue though it should be full.")
+        self.assertEqual([q.remove(), q.remove()], [0, 1],
+                         msg="Error in RingBufferQueue. Packets not removed in FIFO order.")
+        q.add(4)
+        q.add(5)
+        self.assertEqual(q.get_queue_length(), 3, msg="Error in RingBufferQueue. Wrong queue length.")
+        self.assertEqual([q.remove(), q.remove(), q.remove()], [2, 4, 5],
+                         msg="Error in RingBufferQueue. Packets not removed in FIFO order after wrap-around.")
+        q.add(6)
+        q.flush()
+        self.assertEqual([q.is_empty(), q.get_queue_length(), q.remove()], [True, 0, None],
+                         msg="Error in RingBufferQueue. Queue should be empty after flush.")
+
+        # the buffer size is read on every add, like in FiniteQueue
+        q.add(7)
+        q.add(8)
+        q.remove()
+        q.add(9)
+        q.add(10)
+        sim_param.S = 5
+        self.assertEqual([q.is_full(), q.add(11), q.add(12), q.add(13)], [False, True, True, False],
+                         msg="Error in RingBufferQueue. Buffer size not updated after a change of S.")
+        self.assertEqual([q.remove() for _ in range(6)], [8, 9, 10, 11, 12, None],
+                         msg="Error in RingBufferQueue. Packets not removed in FIFO order after growing.")
+        sim_param.S = 2
+        q.add(14)
+        q.add(15)
+        self.assertEqual([q.is_full(), q.add(16)], [True, False],
+                         msg="Error in RingBufferQueue. Buffer size not updated after a change of S.")
+
+    def test_lindley_engine(self):
+        """
+        Cross-check the vectorized Lindley engine against the event driven simulation for fixed seeds.
+        """
+        sims = []
+        for _ in range(2):
+            sim_param = SimParam()
+            sim_param.S = 10000
+            sim_param.SIM_TIME = 20000
+            sim_param.RHO = 1.
+            sims.append(Simulation(sim_param))
+        r1 = sims[0].do_simulation()
+        r2 = LindleyEngine(sims[1], block_size=1000).do_simulation()
+
+        self.assertEqual([r2.packets_total, r2.packets_served, r2.packets_dropped],
+                         [r1.packets_total, r1.packets_served, r1.packets_dropped],
+                         msg="Error in LindleyEngine. Wrong number of packets.")
+        for name in ["system_utilization", "mean_waiting_time", "mean_queue_length"]:
+            self.assertAlmostEqual(getattr(r2, name), getattr(r1, name), delta=1e-9 * getattr(r1, name),
+                                   msg="Error in LindleyEngine. Wrong " + name + ".")
+        c1, c2 = sims[0].counter_collection, sims[1].counter_collection
+        self.assertEqual(c2.cnt_wt.get_num_samples(), c1.cnt_wt.get_num_samples(),
+                         msg="Error in LindleyEngine. Wrong number of counted waiting times.")
+        self.assertAlmostEqual(c2.cnt_ql.get_var(), c1.cnt_ql.get_var(), delta=1e-9 * c1.cnt_ql.get_var(),
+                               msg="Error in LindleyEngine. Wrong variance of the queue length.")
+        self.assertAlmostEqual(c2.cnt_packet.get_cor("iat", "syst"), c1.cnt_packet.get_cor("iat", "syst"), delta=1e-9,
+                               msg="Error in LindleyEngine. Wrong correlation of iat and system time.")
+        self.assertAlmostEqual(c2.acnt_wt.get_auto_cor(5), c1.acnt_wt.get_auto_cor(5), delta=1e-9,
+                               msg="Error in LindleyEngine. Wrong auto correlation of the waiting time.")
+
+    def test_engine_selection(self):
+        """
+        Test that SimParam.ENGINE selects the Lindley engine and falls back to the event loop for a small buffer
+        """
+        for s, rho in [(10000, 1.), (4, .5)]:
+            results = []
+            for engine in ["events", "lindley"]:
+                sim_param = SimParam()
+                sim_param.S = s
+                sim_param.SIM_TIME = 20000
+                sim_param.RHO = rho
+                sim_param.ENGINE = engine
+                results.append(Simulation(sim_param).do_simulation())
+            r1, r2 = results
+            self.assertEqual([r2.packets_total, r2.packets_served, r2.packets_dropped],
+                             [r1.packets_total, r1.packets_served, r1.packets_dropped],
+                             msg="Error in engine selection. Wrong number of packets.")
+            for name in ["system_utilization", "mean_waiting_time", "mean_queue_length"]:
+                self.assertAlmostEqual(getattr(r2, name), getattr(r1, name), delta=1e-9 * getattr(r1, name),
+                                       msg="Error in engine selection. Wrong " + name + ".")
+        self.assertGreater(r1.packets_dropped, 0, msg="Error in test. The fallback to the event loop is not tested.")
+
+        sim_param = SimParam()
+        sim_param.ENGINE = "unknown"
+        self.assertRaises(ValueError, Simulation(sim_param).do_simulation)
+
+    def test_counter_profiles(self):
+        """
+        Test that counter profiles only create the selected counters without changing their results
+        """
+        results = []
+        for profile in ["full", "minimal", ["cnt_wt", "cnt_packet"]]:
+            sim_param = SimParam()
+            sim_param.SIM_TIME = 20000
+            sim_param.COUNTER_PROFILE = profile
+            sim = Simulation(sim_param)
+            results.append(sim.do_simulation())
+            counters = sim.counter_collection
+            if profile == "minimal":
+                self.assertEqual([counters.cnt_wt, counters.cnt_ql, counters.cnt_packet], [None, None, None],
+                                 msg="Error in CounterCollection. Disabled counters should not be created.")
+            if profile == ["cnt_wt", "cnt_packet"]:
+                self.assertEqual(counters.cnt_packet.get_num_samples(), counters.cnt_wt.get_num_samples(),
+                                 msg="Error in CounterCollection. Selected counters should count every packet.")
+        self.assertEqual(results[1].system_utilization, results[0].system_utilization,
+                         msg="Error in CounterCollection. Profile changes the system utilization.")
+        self.assertEqual(results[2].mean_waiting_time, results[0].mean_waiting_time,
+                         msg="Error in CounterCollection. Profile changes the mean waiting time.")
+
+        sim_param = SimParam()
+        sim_param.COUNTER_PROFILE = "unknown"
+        with self.assertRaises(ValueError):
+            Simulation(sim_param)
+
+    def test_state_change_counting(self):
+        """
+        Test that the time dependent counters are only informed about changes of the system state
+        """
+        sim = Simulation(SimParam())
+        sim.sim_param.S = 1
+        sim.reset()
+        s = sim.system_state
+        counters = sim.counter_collection
+        s.add_packet_to_server()
+        sim.sim_state.now = 4
+        s.add_packet_to_queue()
+        samples = counters.cnt_ql.get_num_samples()
+        sim.sim_state.now = 5
+        self.assertEqual(s.add_packet_to_queue(), False,
+                         msg="Error in SystemState. Packet should be dropped.")
+        self.assertEqual(counters.cnt_ql.get_num_samples(), samples,
+                         msg="Error in SystemState. Dropped packets do not change the state and should not be counted.")
+        sim.sim_state.now = 6
+        s.complete_service()
+        s.start_service()
+        sim.sim_state.now = 10
+        s.complete_service()
+        s.count_state()
+        self.assertEqual(counters.cnt_ql.get_mean(), .2,
+                         msg="Error in SystemState. Wrong mean queue length.")
+        self.assertEqual(counters.cnt_sys_util.get_mean(), 1.,
+                         msg="Error in SystemState. Wrong system utilization.")
+
+    def test_result_cache(self):
+        """
+        Test that cached runs give the same results and random number streams as simulated runs (and, if configured,
+        the same counters and system state) and that the cache is bounded.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            def results(sim_param, runs=2, state=False):
+                sim = Simulation(sim_param)
+                r = []
+                for i in range(runs):
+                    sim.reset()
+                    result = sim.do_simulation()
+                    r.append(dict((name, getattr(result, name)) for name in RESULT_FIELDS))
+                    r[-1].update(now=sim.sim_state.now, iat=sim.rng.get_iat())
+                    if state:
+                        counters = sim.counter_collection
+                        r[-1].update(wt=counters.cnt_wt.get_mean(), ql=counters.cnt_ql.get_mean(),
+                                     ql_distribution=counters.hist_ql.get_distribution().tolist(),
+                                     queue_length=sim.system_state.get_queue_length(),
+                                     bound=counters.cnt_ql.sim is sim and sim.system_state.sim is sim)
+                return r
+
+            sim_param = SimParam()
+            sim_param.SIM_TIME = 5000
+            expected = results(sim_param, state=True)
+            expected_results = [dict((name, e[name]) for name in RESULT_FIELDS + ["now", "iat"]) for e in expected]
+            sim_param.RESULT_CACHE = directory
+            cache = get_result_cache(sim_param)
+            self.assertEqual(results(sim_param), expected_results, msg="Error in ResultCache. Wrong results of a miss.")
+            self.assertEqual((cache.hits, cache.misses), (0, 2), msg="Error in ResultCache. Runs should not be cached.")
+            for path in cache.get_paths():
+                with open(path, "rb") as f:
+                    self.assertEqual(sorted(cPickle.load(f)), ["now", "result", "rng_state"],
+                                     msg="Error in ResultCache. Records should only contain the results.")
+            self.assertEqual(results(sim_param), expected_results, msg="Error in ResultCache. Wrong results of a hit.")
+            self.assertEqual(cache.hits, 2, msg="Error in ResultCache. Runs should be cached.")
+
+            sim_param.RESULT_CACHE_STATE = True
+            self.assertEqual(results(sim_param, state=True), expected,
+                             msg="Error in ResultCache. Wrong state of a miss.")
+            self.assertEqual(results(sim_param, state=True), expected,
+                             msg="Error in ResultCache. Wrong state of a hit.")
+            self.assertEqual((cache.hits, cache.misses), (4, 4), msg="Error in ResultCache. States should be cached.")
+            sim_param.RESULT_CACHE_STATE = False
+
+            sim_param.RHO = .6
+            results(sim_param, 1)
+            self.assertEqual(cache.misses, 5, msg="Error in ResultCache. Parameters are not part of the key.")
+            # without reset, the service times keep the old rate
+            sim_param.RHO = .7
+            sim = Simulation(sim_param)
+            sim_param.RHO = .6
+            sim.do_simulation()
+            self.assertEqual(cache.misses, 6, msg="Error in ResultCache. Rates of the streams are not part of the key.")
+
+            small = ResultCache(tempfile.mkdtemp(dir=directory), max_size=2500)
+            for key in ["a", "b", "c"]:
+                small.put(key, "x" * 1000)
+            self.assertEqual(small.get("a"), None, msg="Error in ResultCache. Oldest record should be evicted.")
+            self.assertEqual(small.get("c"), "x" * 1000, msg="Error in ResultCache. Newest record should be kept.")
+            self.assertLessEqual(small.size, 2500, msg="Error in ResultCache. Cache is too large.")
+        finally:
+            shutil.rmtree(directory)
+
+    def test_sim_result_record(self):
+        """
+        Test that the detached result record contains the results and sketches and does not refer to the simulation.
+        """
+        sim_param = SimParam()
+        sim_param.SIM_TIME = 20000
+        sim = Simulation(sim_param)
+        r = sim.do_simulation()
+        record = r.gather_results(detached=True, sketches=True)
+        self.assertIsInstance(record, SimResultRecord, msg="Error in SimResult. Wrong record type.")
+        for name in RESULT_FIELDS:
+            self.assertEqual(getattr(record, name), getattr(r, name), msg="Error in SimResult. Wrong record field.")
+        self.assertRaises(AttributeError, setattr, record, "packets_total", 0)
+        self.assertLess(len(cPickle.dumps(r.get_record(), 2)), 1000,
+                        msg="Error in SimResultRecord. Record should not contain the simulation.")
+        self.assertEqual(cPickle.loads(cPickle.dumps(record, 2)), record,
+                         msg="Error in SimResultRecord. Record changed by pickling.")
+        self.assertAlmostEqual(sum(record.ql_distribution), 1., delta=1e-12,
+                               msg="Error in SimResultRecord. Wrong queue length distribution.")
+        self.assertEqual(r.get_record().wt_sketch, None, msg="Error in SimResult. Sketches should be optional.")
+
+        merged = LogHistogram(None, "w")
+        merged.merge_sketch(record.wt_sketch)
+        merged.merge_sketch(record.wt_sketch)
+        hist_wt = sim.counter_collection.hist_wt
+        self.assertEqual(merged.get_num_values(), 2 * hist_wt.get_num_values(),
+                         msg="Error in LogHistogram. Wrong number of values of a merged sketch.")
+        self.assertEqual(merged.get_quantiles([.5, .99]), hist_wt.get_quantiles([.5, .99]),
+                         msg="Error in LogHistogram. Wrong quantiles of a merged sketch.")
+
+    def test_snapshot(self):
+        """
+        Test that restored and forked simulations continue like the simulation, the snapshot was taken from.
+        """
+        def results(sim):
+            sim.sim_state.stop = False
+            r = sim.process_events()
+            return [getattr(r, name) for name in RESULT_FIELDS] + [sim.counter_collection.acnt_wt.get_auto_cor(1)]
+
+        for queue_type in ["ring", "queue"]:
+            sim_param = SimParam()
+            sim_param.SIM_TIME = 20000
+            sim_param.RHO = .9
+            sim_param.QUEUE_TYPE = queue_type
+            sim = Simulation(sim_param)
+            sim.event_chain.insert(sim.event_pool.acquire(CustomerArrival, 0))
+            sim.event_chain.insert(SimulationTermination(sim, sim_param.SIM_TIME))
+            sim.process_events(100)
+
+            snapshot = take_snapshot(sim)
+            directory = tempfile.mkdtemp()
+            try:
+                path = os.path.join(directory, "sim.snapshot")
+                save_snapshot(sim, path)
+                loaded = load_snapshot(path)
+            finally:
+                shutil.rmtree(directory)
+            same = fork_simulation(sim, 1, reseed=False)[0]
+            forks = fork_simulation(sim, 2)
+            expected = results(sim)
+
+            self.assertEqual(results(restore_snapshot(snapshot)), expected,
+                             msg="Error in snapshot. Restored simulation continues differently.")
+            self.assertEqual(results(loaded), expected,
+                             msg="Error in snapshot. Loaded simulation continues differently.")
+            self.assertEqual(results(same), expected,
+                             msg="Error in snapshot. Fork without new seeds continues differently.")
+            self.assertNotEqual(results(forks[0]), results(forks[1]),
+                                msg="Error in snapshot. Forks with new seeds should continue differently.")
+
     def test_TIC(self):
         """
         Test the TimeIndependentCounter
@@ -182,6 +561,100 @@ class DESTestExtended(unittest.TestCase):
         self.assertEqual(tic.get_stddev(), numpy.std([3,2,5,0], ddof=1),
                          msg="Error in TimeIndependentCounter. Wrong std dev calculation or wrong counting.")
 
+    def test_TIC_merge(self):
+        """
+        Test merging and block counting of streaming TimeIndependentCounters
+        """
+        values = numpy.random.RandomState(0).exponential(2., 1000)
+        tic1 = TimeIndependentCounter()
+        for v in values[:300]:
+            tic1.count(v)
+        tic2 = TimeIndependentCounter()
+        tic2.count_block(values[300:])
+        tic1.merge(tic2)
+        self.assertEqual(tic1.get_num_samples(), 1000,
+                         msg="Error in TimeIndependentCounter. Wrong number of samples after merge.")
+        self.assertAlmostEqual(tic1.get_mean(), numpy.mean(values), delta=1e-12,
+                               msg="Error in TimeIndependentCounter. Wrong mean after merge.")
+        self.assertAlmostEqual(tic1.get_var(), numpy.var(values, ddof=1), delta=1e-12,
+                               msg="Error in TimeIndependentCounter. Wrong variance after merge.")
+        self.assertEqual(tic1.values, [],
+                         msg="Error in TimeIndependentCounter. Values should only be stored with keep_values.")
+
+        # large offsets must not cancel out
+        tic = TimeIndependentCounter()
+        for v in [1e9 + 4, 1e9 + 7, 1e9 + 13, 1e9 + 16]:
+            tic.count(v)
+        self.assertEqual(tic.get_var(), 30.,
+                         msg="Error in TimeIndependentCounter. Variance is not numerically stable.")
+
+    def test_log_histogram(self):
+        """
+        Test quantiles and merging of the log bucketed histogram
+        """
+        values = numpy.random.RandomState(0).lognormal(3., 2., 100000)
+        hist1 = LogHistogram(DESTestExtended.sim, "w")
+        for v in values[:50000]:
+            hist1.count(v)
+        hist2 = LogHistogram(DESTestExtended.sim, "w")
+        hist2.count_block(values[50000:])
+        hist1.merge(hist2)
+
+        self.assertEqual(hist1.get_num_values(), 100000,
+                         msg="Error in LogHistogram. Wrong number of values after merge.")
+        self.assertLess(len(hist1.counts), 5000,
+                        msg="Error in LogHistogram. Too many buckets.")
+        for q in [.5, .99, .999]:
+            exact = numpy.sort(values)[int(numpy.ceil(q * len(values))) - 1]
+            self.assertAlmostEqual(hist1.get_quantile(q), exact, delta=exact / 128.,
+                                   msg="Error in LogHistogram. Quantile outside of the bucket.")
+        self.assertEqual(hist1.get_quantile(1.), values.max(),
+                         msg="Error in LogHistogram. Maximum should be exact.")
+
+        # single and block counting use the same buckets
+        hist3 = LogHistogram(DESTestExtended.sim, "w")
+        for v in values[:1000]:
+            hist3.count(v)
+        hist4 = LogHistogram(DESTestExtended.sim, "w")
+        hist4.count_block(values[:1000])
+        self.assertEqual(hist3.counts, hist4.counts,
+                         msg="Error in LogHistogram. Block counting uses different buckets.")
+
+    def test_occupancy_histogram(self):
+        """
+        Test the time weighted occupancy histogram of the queue length
+        """
+        DESTestExtended.sim.reset()
+        hist = OccupancyHistogram(DESTestExtended.sim, "q", 3)
+        hist.reset()
+        for now, value in [(2, 0), (6, 2), (8, 1), (10, 4)]:
+            DESTestExtended.sim.sim_state.now = now
+            hist.count(value)
+        self.assertEqual(list(hist.get_distribution()), [.2, .2, .4, 0., .2],
+                         msg="Error in OccupancyHistogram. Wrong distribution.")
+        self.assertEqual(hist.get_mean(), 1.8,
+                         msg="Error in OccupancyHistogram. Wrong mean queue length.")
+        self.assertEqual(hist.get_blocking_probability(2), .6,
+                         msg="Error in OccupancyHistogram. Wrong blocking probability.")
+        self.assertRaises(ValueError, hist.get_blocking_probability, 0)
+
+        # without buffer, the PASTA blocking probability is the fraction of time, the server is busy
+        sim_param = SimParam()
+        sim_param.S = 0
+        sim_param.SIM_TIME = 20000
+        r = Simulation(sim_param).do_simulation()
+        self.assertAlmostEqual(r.pasta_blocking_probability, r.system_utilization, delta=1e-12,
+                               msg="Error in SimResult. Wrong PASTA blocking probability without buffer.")
+        self.assertAlmostEqual(r.pasta_blocking_probability, r.blocking_probability, delta=.01,
+                               msg="Error in SimResult. Wrong PASTA blocking probability without buffer.")
+
+        # block counting gives the same occupancy
+        DESTestExtended.sim.sim_state.now = 0
+        hist2 = OccupancyHistogram(DESTestExtended.sim, "q", 3)
+        hist2.reset()
+        hist2.count_block([0, 2, 1, 4], [2, 6, 8, 10])
+        self.assertEqual(hist2.occupancy, hist.occupancy,
+                         msg="Error in OccupancyHistogram. Wrong occupancy after block counting.")
 
     def test_TDC(self):
         """
@@ -204,6 +677,19 @@ class DESTestExtended(unittest.TestCase):
         self.assertEqual(tdc.get_stddev(), 4.0,
                          msg="Error in TimeDeependentCounter. Wrong std dev calculation or wrong counting.")
 
+        # many small contributions must not be lost in a large sum
+        DESTestExtended.sim.sim_state.now = 0
+        tdc.reset()
+        DESTestExtended.sim.sim_state.now = 1
+        tdc.count(1e16)
+        for i in range(1000):
+            DESTestExtended.sim.sim_state.now += 1
+            tdc.count(1.)
+        self.assertEqual(tdc.get_mean() * 1001, 1e16 + 1000,
+                         msg="Error in TimeDeependentCounter. Summation is not compensated.")
+        self.assertEqual(tdc.get_num_samples(), 1001,
+                         msg="Error in TimeDeependentCounter. Wrong number of counted values.")
+
     def test_do_simulation(self):
         """
         Test whole simulation with different seeds for the correct results. Simulation is reinitialized after every run.
@@ -216,11 +702,11 @@ class DESTestExtended(unittest.TestCase):
             self.assertEqual(DESTestExtended.sim.do_simulation().packets_dropped, results[seed],
                              msg="Error in Simulation. Wrong number of dropped packets for given seed.")
 
-        self.assertLess(len(DESTestExtended.sim.counter_collection.cnt_wt.values), 210,
+        self.assertLess(DESTestExtended.sim.counter_collection.cnt_wt.get_num_samples(), 210,
                         msg="Error in Simulation. Should count less than 210 values for waiting time.")
-        self.assertGreater(len(DESTestExtended.sim.counter_collection.cnt_wt.values), 160,
+        self.assertGreater(DESTestExtended.sim.counter_collection.cnt_wt.get_num_samples(), 160,
                            msg="Error in Simulation. Should count more than 160 values for waiting time.")
-        self.assertGreater(len(DESTestExtended.sim.counter_collection.cnt_ql.values), 5,
+        self.assertGreater(DESTestExtended.sim.counter_collection.cnt_ql.get_num_samples(), 5,
                            msg="Error in Simulation. Should count more than 5 values for queue length.")
 
 if __name__ == '__main__':
@@ -9,7 +9,7 @@ from random import Random
 import math
 import numpy
 from matplotlib import pyplot
-from simulation import Simulation
+from sweep import ParameterSweep
 
 """
 This file should be used to keep all necessary code that is used for the verification section in part 3 of the
@@ -50,26 +50,21 @@ def task_3_2_2():
     The first result string keeps the results for 100s, the second one for 1000s simulation time.
     """
     # TODO Task 3.2.2: Your code goes here
-    sim = Simulation()
-    sim.sim_param.SEED_IAT = 0
-    sim.sim_param.SEED_ST = 1
-    sim.sim_param.S = 5
+    sim_param = SimParam()
+    sim_param.SEED_IAT = 0
+    sim_param.SEED_ST = 1
+    sim_param.S = 5
+    # only the system utilization is needed
+    sim_param.COUNTER_PROFILE = "minimal"
 
-    sim.sim_param.SIM_TIME = 100000
-    print("100s Simulation:")
-    for rho in [.01, .5, .8, .9]:
-        sim.sim_param.RHO = rho
-        sim.reset()
-        sys_util = sim.do_simulation().system_utilization
-        print("p = {} System Utilization = {}".format(rho, sys_util))
-
-    sim.sim_param.SIM_TIME = 1000000
-    print("\n1000s Simulation:")
-    for rho in [.01, .5, .8, .9]:
-        sim.sim_param.RHO = rho
-        sim.reset()
-        sys_util = sim.do_simulation().system_utilization
-        print("p = {} System Utilization = {}".format(rho, sys_util))
+    # every point runs once with the fixed seeds of the study
+    sweep = ParameterSweep(sim_param, {"SIM_TIME": [100000, 1000000], "RHO": [.01, .5, .8, .9]}, derive_seeds=False)
+    sweep.run()
+    for sim_time, title in [(100000, "100s Simulation:"), (1000000, "\n1000s Simulation:")]:
+        print(title)
+        for rho in [.01, .5, .8, .9]:
+            sys_util = sweep.get_column("system_utilization", SIM_TIME=sim_time, RHO=rho)[0]
+            print("p = {} System Utilization = {}".format(rho, sys_util))
 
     pass
 
@@ -1,5 +1,6 @@
 import unittest
 from simulation import Simulation
+from rng import ExponentialRNS, UniformRNS
 
 class DESTestRNG(unittest.TestCase):
 
@@ -27,5 +28,25 @@ class DESTestRNG(unittest.TestCase):
                                    msg="Error in RNG or CounterCollection. Should have gotten a different value for" + \
                                        " the system utilization with given rho.")
 
+    def test_block_sampling(self):
+        """
+        Test that the random number streams are reproducible, independent of block size and block-wise drawing.
+        """
+        rns1 = ExponentialRNS(mean=2, the_seed=5, block_size=7)
+        rns2 = ExponentialRNS(mean=2, the_seed=5)
+        x = [rns1.next() for _ in range(10)] + list(rns1.next_block(20)) + [rns1.next() for _ in range(30)]
+        self.assertEqual(x, list(rns2.next_block(60)),
+                         msg="Error in RNS. Stream depends on block size or on drawing blocks.")
+        rns1.set_parameters(4)
+        rns2.set_parameters(4)
+        self.assertEqual([rns1.next(), list(rns1.next_block(3))], [rns2.next(), list(rns2.next_block(3))],
+                         msg="Error in RNS. Stream not reproducible after changing the parameters.")
+
+        values = UniformRNS(low=2, high=3, the_seed=0).next_block(10000)
+        self.assertTrue(2 <= values.min() and values.max() < 3,
+                        msg="Error in UniformRNS. Number out of range.")
+        self.assertAlmostEqual(ExponentialRNS(mean=2, the_seed=0).next_block(100000).mean(), 2, delta=.05,
+                               msg="Error in ExponentialRNS. Wrong mean.")
+
 if __name__ == '__main__':
     unittest.main()
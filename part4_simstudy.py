@@ -1,4 +1,5 @@
 from counter import TimeIndependentAutocorrelationCounter
+from seriesanalysis import auto_cor, effective_sample_size
 from simulation import Simulation
 from matplotlib import pyplot
 
@@ -52,6 +53,7 @@ def task_4_3_1():
     sim = Simulation()
     sim.sim_param.SIM_TIME = 10000000
     sim.sim_param.S = 10000
+    sim.sim_param.ENGINE = "lindley"
     for rho in [.01, .5, .8, .95]:
         sim.sim_param.RHO = rho
         sim.reset()
@@ -72,6 +74,8 @@ def task_4_3_2():
     sim = Simulation()
     sim.sim_param.SIM_TIME = 10000000
     sim.sim_param.S = 10000
+    sim.sim_param.ENGINE = "lindley"
+    sim.sim_param.KEEP_SAMPLES = True
     plot_id = 1
     for rho in [.01, .5, .8, .95]:
         sim.sim_param.RHO = rho
@@ -79,9 +83,9 @@ def task_4_3_2():
         print "NEW RUN with rho=" + str(sim.sim_param.RHO)
         sim.do_simulation()
 
-        iat = sim.counter_collection.cnt_iat_st.x.values
-        service_time = sim.counter_collection.cnt_iat_st.y.values
-        system_time = sim.counter_collection.cnt_iat_syst.y.values
+        iat = sim.counter_collection.cnt_packet.get_values("iat")
+        service_time = sim.counter_collection.cnt_packet.get_values("st")
+        system_time = sim.counter_collection.cnt_packet.get_values("syst")
 
         # Plot iat vs. service time
         pyplot.subplot("42%d" % plot_id)
@@ -107,13 +111,15 @@ def task_4_3_2():
 def task_4_3_3():
     """
     Exercise to plot auto correlation depending on lags. Run simulation until 10000 (or 100) packets are served.
-    For the different rho values, simulation is run and the blocking probability is auto correlated.
+    For the different rho values, simulation is run and the correlogram of the recorded waiting times is calculated,
+    together with their effective sample size.
     Results are plotted for each N value in a different diagram.
     Note, that for some seeds with rho=0.DES and N=100, the variance of the auto covariance is 0 and returns an error.
     """
     sim = Simulation()
 
     sim.sim_param.S = 10000
+    sim.sim_param.KEEP_SAMPLES = True
 
     n = 100
     for rho in [.01, .5, .8, .95]:
@@ -121,13 +127,15 @@ def task_4_3_3():
         sim.reset()
         sim.do_simulation_n_limit(n)
 
-        lag = []
-        cor = []
-
-        for i in range(20):
-            c = sim.counter_collection.acnt_wt.get_auto_cor(i+1)
-            lag.append(i+1)
-            cor.append(c)
+        waiting_times = sim.counter_collection.cnt_wt.values
+        if len(waiting_times) < 2:
+            print "rho = " + str(rho) + "; N = " + str(n) + "; not enough packets served for a correlogram"
+            continue
+        max_lag = min(20, len(waiting_times) - 1)
+        lag = range(1, max_lag + 1)
+        cor = auto_cor(waiting_times, max_lag)[1:]
+        print "rho = " + str(rho) + "; N = " + str(n) + "; effective sample size: " + \
+            str(effective_sample_size(waiting_times))
 
         pyplot.subplot(121)
         pyplot.plot(lag, cor, "-o", label="rho = " + str(rho))
@@ -146,13 +154,15 @@ def task_4_3_3():
         sim.reset()
         sim.do_simulation_n_limit(n)
 
-        lag = []
-        cor = []
-
-        for i in range(20):
-            c = sim.counter_collection.acnt_wt.get_auto_cor(i+1)
-            lag.append(i+1)
-            cor.append(c)
+        waiting_times = sim.counter_collection.cnt_wt.values
+        if len(waiting_times) < 2:
+            print "rho = " + str(rho) + "; N = " + str(n) + "; not enough packets served for a correlogram"
+            continue
+        max_lag = min(20, len(waiting_times) - 1)
+        lag = range(1, max_lag + 1)
+        cor = auto_cor(waiting_times, max_lag)[1:]
+        print "rho = " + str(rho) + "; N = " + str(n) + "; effective sample size: " + \
+            str(effective_sample_size(waiting_times))
 
         pyplot.subplot(122)
         pyplot.plot(lag, cor, "-o", label="rho = " + str(rho))
@@ -1,5 +1,8 @@
 import unittest
+import numpy
 from counter import TimeIndependentAutocorrelationCounter, TimeIndependentCrosscorrelationCounter
+from counter import TimeIndependentCovarianceCounter
+from seriesanalysis import auto_cov, auto_cor, integrated_autocorrelation_time, effective_sample_size
 
 class DESTest(unittest.TestCase):
 
@@ -24,6 +27,30 @@ class DESTest(unittest.TestCase):
         self.assertAlmostEqual(ticcc.get_cor(), -.4722, delta=.01,
                                msg="Error in TimeIndependentCrosscorrelationCounter. Correlation calculation is wrong.")
 
+    def test_covariance_matrix(self):
+        """
+        Test the covariance counter for several variables against numpy.
+        """
+        x = numpy.random.RandomState(0).exponential(1., (2500, 4))
+        x[:, 3] += x[:, 0]
+        ticc = TimeIndependentCovarianceCounter(variables=("iat", "wt", "st", "syst"), block_size=100)
+        for row in x[:1000]:
+            ticc.count(*row)
+        ticc.count_block(x[1000:, 0], x[1000:, 1], x[1000:, 2], x[1000:, 3])
+
+        self.assertEqual(ticc.get_num_samples(), 2500,
+                         msg="Error in TimeIndependentCovarianceCounter. Wrong number of samples.")
+        self.assertTrue(numpy.allclose(ticc.get_cov_matrix(), numpy.cov(x.T, ddof=0), rtol=1e-12),
+                        msg="Error in TimeIndependentCovarianceCounter. Covariance calculation is wrong.")
+        self.assertAlmostEqual(ticc.get_var("syst"), numpy.var(x[:, 3], ddof=1), delta=1e-12,
+                               msg="Error in TimeIndependentCovarianceCounter. Variance calculation is wrong.")
+
+        # the pairwise queries give the same result as a cross correlation counter
+        ticcc = TimeIndependentCrosscorrelationCounter()
+        ticcc.count_block(x[:, 0], x[:, 3])
+        self.assertAlmostEqual(ticc.get_cor("iat", "syst"), ticcc.get_cor(), delta=1e-12,
+                               msg="Error in TimeIndependentCovarianceCounter. Correlation calculation is wrong.")
+
     def test_auto_correlation(self):
         """
         Test the basic implementation of the auto covariance counter.
@@ -42,5 +69,50 @@ class DESTest(unittest.TestCase):
             self.assertAlmostEqual(tiacc.get_auto_cor(lag), results_cor[lag], delta=.05,
                                msg="Error in TimeIndependentAutocorrelationCounter. Correlation calculation is wrong.")
 
+    def test_auto_correlation_large_lag(self):
+        """
+        Test the buffered auto covariance counter with large lags against a direct calculation.
+        """
+        values = numpy.random.RandomState(0).exponential(1., 3000)
+        tiacc = TimeIndependentAutocorrelationCounter(max_lag=300, block_size=100)
+        for v in values[:1234]:
+            tiacc.count(v)
+        tiacc.count_block(values[1234:2000])
+        for v in values[2000:]:
+            tiacc.count(v)
+
+        mean = numpy.mean(values)
+        for lag in [0, 1, 17, 150, 300]:
+            cov = numpy.sum((values[lag:] - mean) * (values[:len(values) - lag] - mean)) / (len(values) - lag)
+            self.assertAlmostEqual(tiacc.get_auto_cov(lag), cov, delta=1e-9,
+                               msg="Error in TimeIndependentAutocorrelationCounter. Covariance calculation is wrong.")
+        self.assertEqual(tiacc.values, [],
+                         msg="Error in TimeIndependentAutocorrelationCounter. Values should not be stored.")
+
+    def test_correlogram(self):
+        """
+        Test the FFT correlogram against the auto correlation counter and the autocorrelation time of an AR(1) series.
+        """
+        tiacc = TimeIndependentAutocorrelationCounter(max_lag=5)
+        series = [i % 25 for i in range(5000)]
+        for x in series:
+            tiacc.count(x)
+        cov = auto_cov(series, 5)
+        for lag in range(6):
+            self.assertAlmostEqual(cov[lag], tiacc.get_auto_cov(lag), delta=1e-9,
+                                   msg="Error in auto_cov. Covariance calculation is wrong.")
+        self.assertEqual(len(auto_cor(series)), 5000,
+                         msg="Error in auto_cor. Correlogram should contain all lags.")
+
+        # AR(1) series with coefficient phi has tau = (1 + phi) / (1 - phi) = 9
+        noise = numpy.random.RandomState(0).normal(size=100000)
+        x = numpy.zeros(len(noise))
+        for i in range(1, len(noise)):
+            x[i] = .8 * x[i - 1] + noise[i]
+        self.assertAlmostEqual(integrated_autocorrelation_time(x), 9., delta=1.,
+                               msg="Error in integrated_autocorrelation_time. Wrong autocorrelation time.")
+        self.assertAlmostEqual(effective_sample_size(noise), 100000, delta=10000,
+                               msg="Error in effective_sample_size. Uncorrelated samples should be independent.")
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,12 @@
-from counter import TimeIndependentCounter
+import os
+import shutil
+import tempfile
 from simulation import Simulation
+from replication import ReplicationRunner, SequentialReplications
+from resultstore import ResultStore
+from simresult import RESULT_FIELDS
 from matplotlib import pyplot
+import numpy
 
 """
 This file should be used to keep all necessary code that is used for the simulation section in part 5
@@ -27,17 +33,14 @@ def task_5_2_1():
         sim.sim_param.SIM_TIME = sim_time * 1000
         for alpha in [.1, .05]:
             sim.sim_param.ALPHA = alpha
-            counter = TimeIndependentCounter("Blocking Probability")
-            counter.reset()
-            tmp = 1.0
-            while len(counter.values) < 5 or tmp > sim.sim_param.EPSILON:
-                sim.reset()
-                sim_result = sim.do_simulation()
-                bp = sim_result.blocking_probability
-                counter.count(bp)
-                tmp = counter.report_confidence_interval(alpha=sim.sim_param.ALPHA, print_report=False)
-            results.append(len(counter.values))
-            counter.report_confidence_interval(alpha=sim.sim_param.ALPHA, print_report=True)
+            # run replications in parallel waves until the confidence interval is small enough
+            runner = ReplicationRunner(sim.sim_param)
+            replications = SequentialReplications(runner, ["blocking_probability"], alpha=alpha,
+                                                  epsilon=sim.sim_param.EPSILON)
+            replications.run()
+            runner.close()
+            results.append(replications.num_replications)
+            replications.counters["blocking_probability"].report_confidence_interval(alpha=alpha, print_report=True)
 
     # print and return results
     print "SIM TIME:  100s; ALPHA: 10%; NUMBER OF RUNS: " + str(results[0]) + "; TOTAL SIMULATION TIME (SECONDS): " + str(results[0]*100)
@@ -67,31 +70,16 @@ def task_5_2_2():
 
     for batch_packets in [100, 1000]:
         for alpha in [.1, .05]:
-            dn = batch_packets
-            n = dn
             sim.sim_param.ALPHA = alpha
-            counter = TimeIndependentCounter("Blocking Probability")
-            counter.reset()
-            confid_level_reached = False
             sim.reset()
 
-            # execute simulation
-            while not confid_level_reached:
-                r = sim.do_simulation_n_limit(dn, new_batch=(n != dn))
-                counter.count(r.blocking_probability)
-                if len(counter.values) > 5 and counter.report_confidence_interval(sim.sim_param.ALPHA,
-                                                                                  print_report=False) < sim.sim_param.EPSILON:
-                    confid_level_reached = True
-                else:
-                    n += dn
-                    sim.counter_collection.reset()
-                    sim.sim_state.num_blocked_packets = 0
-                    sim.sim_state.num_packets = 0
-                    sim.sim_state.stop = False
-
-            counter.report_confidence_interval(sim.sim_param.ALPHA, print_report=True)
-            print "Number of batches (n=" + str(dn) + " for blocking probability confidence): " + str(n / dn) + \
-                  "; simulation time: " + str(int(sim.sim_state.now / 1000)) + "s."
+            # execute simulation, until the confidence interval of the blocking probability is small enough
+            batch_means = sim.do_simulation_batch_means(batch_packets=batch_packets, alpha=alpha,
+                                                        epsilon=sim.sim_param.EPSILON, min_batches=6)
+
+            batch_means.counters["blocking_probability"].report_confidence_interval(alpha, print_report=True)
+            print "Number of batches (n=" + str(batch_packets) + " for blocking probability confidence): " + \
+                  str(batch_means.num_batches) + "; simulation time: " + str(int(sim.sim_state.now / 1000)) + "s."
 
             results.append(sim.sim_state.now)
 
@@ -104,73 +92,117 @@ def task_5_2_2():
     return results
 
 
-def task_5_2_4():
+# simulation parameters, which identify the replications of a configuration in the result store of task 5.2.4
+TASK_5_2_4_PARAMS = ["RHO", "SIM_TIME", "S", "SEED_IAT", "SEED_ST"]
+
+
+def select_rows(store, sim_param):
+    """
+    Select the rows of a result store, that have been simulated with the current simulation parameters.
+    :param store: ResultStore with a column for every parameter in TASK_5_2_4_PARAMS
+    :param sim_param: simulation parameters
+    :return: boolean array
+    """
+    where = numpy.ones(store.get_num_rows(), dtype=bool)
+    if store.get_num_rows() == 0:
+        return where
+    for name in TASK_5_2_4_PARAMS:
+        if name not in store.columns:
+            raise ValueError("Result store " + store.directory + " has no column " + name +
+                             ", remove it and run again.")
+        where &= store.get_column(name) == getattr(sim_param, name)
+    return where
+
+
+def task_5_2_4(directory=None):
     """
     Plot confidence interval as described in the task description given below.
     Use an M/M/1 system and perform multiple runs simulation. Make your study for system offered traffic 0.5 and 0.9.
     Use confidence levels of 0.9 and 0.95. Use 100 s and 1000 s as simulation time. Calculate the confidence interval
     for the system throughput of 30 runs. Repeat this 100 times.
+
+    The results of all replications are kept in a ResultStore. If a directory is given, the store is kept, so the
+    plots can be made again from the store without simulating. Every configuration is written as one chunk, so an
+    interrupted study keeps its complete configurations and only simulates the missing ones. The confidence level does
+    not change the simulation, hence both levels are evaluated from the same replications.
+    :param directory: directory of the result store (default: a temporary store, which is removed afterwards)
     """
     sim = Simulation()
     sim.sim_param.S = 10000
-
-    for sys_util in [.5, .9]:
-        sim.sim_param.RHO = sys_util
-        sim.reset()
-        for alpha in [.1, .05]:
-            sim.sim_param.ALPHA = alpha
+    sim.sim_param.ENGINE = "lindley"
+    # only the system utilization is needed
+    sim.sim_param.COUNTER_PROFILE = "minimal"
+
+    temporary = directory is None
+    if temporary:
+        directory = tempfile.mkdtemp(prefix="task_5_2_4_")
+    else:
+        print "Result store of task 5.2.4: " + os.path.abspath(directory)
+    store = ResultStore(directory)
+    try:
+        for sys_util in [.5, .9]:
+            sim.sim_param.RHO = sys_util
             for time in [100, 1000]:
                 sim.sim_param.SIM_TIME = time * 1000
-
-                sys_util_counter = TimeIndependentCounter("su")
-                mean_counter = TimeIndependentCounter("mc")
-                y_min = []
-                y_max = []
-                x = []
-
-                pyplot.hold(True)
-
-                for run in range(100):
-                    sys_util_counter.reset()
-                    for _ in range(30):
-                        sim.reset()
-                        sim_result = sim.do_simulation()
-                        su = sim_result.system_utilization
-                        sys_util_counter.count(su)
-                    h = sys_util_counter.report_confidence_interval(alpha=sim.sim_param.ALPHA, print_report=False)
-                    m = sys_util_counter.get_mean()
-                    mean_counter.count(m)
-                    y_min.append(m - h)
-                    y_max.append(m + h)
-                    x.append(run + 1)
-
-                mean_calc = sim.sim_param.RHO
-                mean_real = mean_counter.get_mean()
-                total = len(x)
-                good = 0
-                good_real = 0
-                for i in range(len(x)):
-                    if y_min[i] <= mean_calc <= y_max[i]:
-                        good += 1
-                    if y_min[i] <= mean_real <= y_max[i]:
-                        good_real += 1
-                print str(good) + "/" + str(total) + " cover theoretical mean, " + str(good_real) + "/" + str(
-                    total) + " cover sample mean."
-
-                if alpha == .1:
-                    if time == 100:
-                        pyplot.subplot(221)
-                    else:
-                        pyplot.subplot(223)
-                else:
-                    if time == 100:
-                        pyplot.subplot(222)
+                num_rows = numpy.count_nonzero(select_rows(store, sim.sim_param))
+                if num_rows == 100 * 30:
+                    continue
+                if num_rows != 0:
+                    raise ValueError("Result store " + directory + " contains " + str(num_rows) + " rows of RHO = " +
+                                     str(sys_util) + ", SIM_TIME = " + str(time * 1000) + ", remove it and run again.")
+
+                # run all 100 x 30 replications in parallel
+                runner = ReplicationRunner(sim.sim_param)
+                results = runner.run(100 * 30)
+                runner.close()
+                for i, record in enumerate(results):
+                    row = dict((name, getattr(record, name)) for name in RESULT_FIELDS)
+                    row.update(((name, getattr(sim.sim_param, name)) for name in TASK_5_2_4_PARAMS), run=i // 30,
+                               replication=i)
+                    store.append(row)
+                store.flush()
+
+        for sys_util in [.5, .9]:
+            sim.sim_param.RHO = sys_util
+            for alpha in [.1, .05]:
+                sim.sim_param.ALPHA = alpha
+                for time in [100, 1000]:
+                    sim.sim_param.SIM_TIME = time * 1000
+
+                    pyplot.hold(True)
+
+                    # confidence intervals of the 100 runs with 30 replications each
+                    where = select_rows(store, sim.sim_param)
+                    ci = store.get_confidence_intervals(["run"], "system_utilization", alpha, where)
+                    y_min = ci["mean"] - ci["half_width"]
+                    y_max = ci["mean"] + ci["half_width"]
+                    x = ci["run"] + 1
+
+                    mean_calc = sim.sim_param.RHO
+                    mean_real = ci["mean"].mean()
+                    total = len(x)
+                    good = numpy.count_nonzero((y_min <= mean_calc) & (mean_calc <= y_max))
+                    good_real = numpy.count_nonzero((y_min <= mean_real) & (mean_real <= y_max))
+                    print str(good) + "/" + str(total) + " cover theoretical mean, " + str(good_real) + "/" + str(
+                        total) + " cover sample mean."
+
+                    if alpha == .1:
+                        if time == 100:
+                            pyplot.subplot(221)
+                        else:
+                            pyplot.subplot(223)
                     else:
-                        pyplot.subplot(224)
-                plot_confidence(sim, x, y_min, y_max, mean_counter.get_mean(), sim.sim_param.RHO, "system utilization")
-
-        pyplot.hold(False)
-        pyplot.show()
+                        if time == 100:
+                            pyplot.subplot(222)
+                        else:
+                            pyplot.subplot(224)
+                    plot_confidence(sim, x, y_min, y_max, mean_real, sim.sim_param.RHO, "system utilization")
+
+            pyplot.hold(False)
+            pyplot.show()
+    finally:
+        if temporary:
+            shutil.rmtree(directory)
 
 
 def plot_confidence(sim, x, y_min, y_max, calc_mean, act_mean, ylabel):
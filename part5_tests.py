@@ -1,5 +1,17 @@
+import math
+import os
+import shutil
+import tempfile
 import unittest
+import numpy
 from counter import TimeIndependentCounter
+from bootstrap import bootstrap_means, bootstrap_confidence_interval
+from simparam import SimParam
+from replication import ReplicationRunner, SequentialReplications
+from simulation import Simulation
+from simresult import RESULT_FIELDS
+from sweep import ParameterSweep, expand_grid
+from resultstore import ResultStore
 
 class DESTest(unittest.TestCase):
 
@@ -11,7 +23,7 @@ class DESTest(unittest.TestCase):
         """
         Test the basic implementation of the confidence calculation in the time independent counter.
         """
-        tic = TimeIndependentCounter()
+        tic = TimeIndependentCounter(keep_values=True)
         tic.count(0)
         tic.count(3)
         tic.count(5)
@@ -48,7 +60,7 @@ class DESTest(unittest.TestCase):
         self.assertEqual(tic.is_in_confidence_interval(4.0, alpha=.2), True,
                          msg="Error in Confidence interval calculation. Value should be in interval, but isn't.")
 
-        lower, upper = tic.report_bootstrap_confidence_interval(alpha=.05, resample_size=10000)
+        lower, upper = tic.report_bootstrap_confidence_interval(alpha=.05, resample_size=10000, seed=1)
         self.assertAlmostEqual(lower, 1.55556, delta=0.01,
                                msg="Error in bootstrap confidence interval calculation. Wrong lower boundary.")
         self.assertAlmostEqual(upper, 4.66667, delta=0.01,
@@ -59,6 +71,217 @@ class DESTest(unittest.TestCase):
         self.assertEqual(tic.is_in_bootstrap_confidence_interval(1, resample_size=5000, alpha=.05), False,
                          msg="Error in Confidence interval calculation. Value id in interval, but shouldn't.")
 
+    def test_bootstrap(self):
+        """
+        Test that the chunked bootstrap is reproducible and does not depend on the memory limit and the processes.
+        """
+        values = [0, 3, 5, 2, 5, 8, 1, 2, 1, 7, 4, 0, 2]
+        means = bootstrap_means(values, 1000, seed=2)
+        self.assertEqual(len(means), 1000, msg="Error in bootstrap. Wrong number of resamples.")
+        self.assertTrue((means == bootstrap_means(values, 1000, seed=2, max_memory=100)).all(),
+                        msg="Error in bootstrap. Resamples depend on the memory limit.")
+        self.assertTrue((means == bootstrap_means(values, 1000, seed=2, processes=2)).all(),
+                        msg="Error in bootstrap. Resamples depend on the number of processes.")
+        self.assertFalse((means == bootstrap_means(values, 1000, seed=3)).all(),
+                         msg="Error in bootstrap. Resamples do not depend on the seed.")
+
+        mean = sum(values) / float(len(values))
+        percentile = bootstrap_confidence_interval(values, .05, 10000, "percentile", seed=2)
+        basic = bootstrap_confidence_interval(values, .05, 10000, "basic", seed=2)
+        bca = bootstrap_confidence_interval(values, .05, 10000, "bca", seed=2)
+        self.assertAlmostEqual(basic[0], 2 * mean - percentile[1], delta=1e-12,
+                               msg="Error in bootstrap. Basic interval is not the mirrored percentile interval.")
+        self.assertAlmostEqual(basic[1], 2 * mean - percentile[0], delta=1e-12,
+                               msg="Error in bootstrap. Basic interval is not the mirrored percentile interval.")
+        for lower, upper in [percentile, basic, bca]:
+            self.assertLess(lower, mean, msg="Error in bootstrap. Mean is not in the confidence interval.")
+            self.assertGreater(upper, mean, msg="Error in bootstrap. Mean is not in the confidence interval.")
+        self.assertRaises(ValueError, bootstrap_confidence_interval, values, method="normal")
+        self.assertRaises(ValueError, TimeIndependentCounter().report_bootstrap_confidence_interval)
+
+    def test_replication_runner(self):
+        """
+        Test that parallel replications give the same results as serial replications with independent seeds.
+        """
+        sim_param = SimParam()
+        sim_param.SIM_TIME = 5000
+        serial = ReplicationRunner(sim_param, processes=1).run(4)
+        runner = ReplicationRunner(sim_param, processes=2)
+        parallel = runner.run(2) + runner.run(2, first=2)
+        runner.close()
+        self.assertEqual(serial, parallel, msg="Error in ReplicationRunner. Parallel and serial results differ.")
+        self.assertEqual(len(set(r.packets_total for r in serial)), 4,
+                         msg="Error in ReplicationRunner. Replications should use different seeds.")
+
+    def test_parameter_sweep(self):
+        """
+        Test that the parameter sweep runs every point and replication once, matches the replication runner and can be
+        resumed from its output file.
+        """
+        self.assertEqual(expand_grid({"S": [5, 6], "RHO": [.5, .9]}),
+                         [{"RHO": .5, "S": 5}, {"RHO": .5, "S": 6}, {"RHO": .9, "S": 5}, {"RHO": .9, "S": 6}],
+                         msg="Error in ParameterSweep. Wrong grid points.")
+
+        sim_param = SimParam()
+        sim_param.SIM_TIME = 5000
+        sim_param.COUNTER_PROFILE = "means"
+        output = tempfile.mktemp(suffix=".csv")
+        try:
+            sweep = ParameterSweep(sim_param, {"RHO": [.5, .9]}, replications=2, processes=1, output=output)
+            self.assertEqual(len(sweep.run()), 4, msg="Error in ParameterSweep. Wrong number of rows.")
+
+            sim_param.RHO = .9
+            expected = ReplicationRunner(sim_param, processes=1).run(2)
+            for r, row in enumerate(sweep.get_rows(RHO=.9)):
+                self.assertEqual(row["replication"], r, msg="Error in ParameterSweep. Wrong order of replications.")
+                for field in RESULT_FIELDS:
+                    value = getattr(expected[r], field)
+                    if value == value:
+                        self.assertEqual(row[field], value, msg="Error in ParameterSweep. Wrong result.")
+
+            # drop the last row and cut the line before it, as if the campaign was interrupted while writing
+            with open(output) as f:
+                lines = f.readlines()
+            with open(output, "w") as f:
+                f.writelines(lines[:-2] + [lines[-2][:10]])
+            sweep = ParameterSweep(sim_param, {"RHO": [.5, .9]}, replications=2, processes=2, output=output)
+            self.assertEqual(len(sweep.rows), 2, msg="Error in ParameterSweep. Wrong number of resumed rows.")
+            new_rows = []
+            sweep.run(callback=new_rows.append)
+            self.assertEqual(len(new_rows), 2, msg="Error in ParameterSweep. Completed replications were run again.")
+            resumed = ParameterSweep(sim_param, {"RHO": [.5, .9]}, replications=2, output=output)
+            self.assertEqual(len(resumed.get_pending()), 0, msg="Error in ParameterSweep. Rows were not written.")
+            self.assertEqual(resumed.get_column("blocking_probability", RHO=.9),
+                             [e.blocking_probability for e in expected],
+                             msg="Error in ParameterSweep. Wrong results after resuming.")
+
+            # without derived seeds, a point runs with the seeds of the base parameters
+            sweep = ParameterSweep(sim_param, [{"RHO": .5}], processes=1, derive_seeds=False)
+            sweep.run()
+            sim_param.RHO = .5
+            self.assertEqual(sweep.get_column("system_utilization", RHO=.5),
+                             [Simulation(sim_param).do_simulation().system_utilization],
+                             msg="Error in ParameterSweep. Base seeds should be used without derived seeds.")
+        finally:
+            if os.path.exists(output):
+                os.remove(output)
+
+    def test_result_store(self):
+        """
+        Test that the result store keeps the rows in chunks on disk and aggregates them per group.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            store = ResultStore(directory, chunk_size=4)
+            values = [0, 3, 5, 2, 5, 8, 1, 2, 1, 7]
+            for i, v in enumerate(values):
+                store.append({"RHO": .5 if i < 9 else .9, "replication": i, "su": float(v)})
+            self.assertEqual(store.get_num_rows(), 8, msg="Error in ResultStore. Rows should be written in chunks.")
+            store.close()
+            store.append_columns({"RHO": [.9, .9], "replication": [10, 11], "su": [4., 1.]})
+            self.assertRaises(ValueError, store.append, {"RHO": .9, "replication": 12})
+            self.assertRaises(ValueError, store.append_columns, {"RHO": [.9], "replication": [.5], "su": [1.]})
+
+            store = ResultStore(directory)
+            self.assertEqual(store.get_num_rows(), 12, msg="Error in ResultStore. Wrong number of rows.")
+            self.assertEqual(store.get_column("replication").dtype, numpy.int64,
+                             msg="Error in ResultStore. Integer columns should keep their type.")
+            self.assertEqual(store.get_column("su").tolist(), values + [4., 1.],
+                             msg="Error in ResultStore. Wrong column.")
+
+            ci = store.get_confidence_intervals(["RHO"], "su", .05)
+            self.assertEqual(ci["RHO"].tolist(), [.5, .9], msg="Error in ResultStore. Wrong groups.")
+            self.assertEqual(ci["count"].tolist(), [9, 3], msg="Error in ResultStore. Wrong group sizes.")
+            tic = TimeIndependentCounter()
+            for v in values[:9]:
+                tic.count(v)
+            self.assertAlmostEqual(ci["mean"][0], tic.get_mean(), delta=1e-12, msg="Error in ResultStore. Wrong mean.")
+            self.assertAlmostEqual(ci["var"][0], tic.get_var(), delta=1e-12, msg="Error in ResultStore. Wrong variance.")
+            self.assertAlmostEqual(ci["half_width"][0], tic.report_confidence_interval(.05, print_report=False),
+                                   delta=1e-12, msg="Error in ResultStore. Wrong confidence interval.")
+
+            where = store.get_column("replication") % 2 == 0
+            self.assertEqual(store.aggregate([], "su", where)["count"].tolist(), [6],
+                             msg="Error in ResultStore. Wrong number of selected rows.")
+
+            # SimResult fields and declared columns do not take their type from the first row
+            store = ResultStore(os.path.join(directory, "typed"), chunk_size=1, dtypes={"su": "float64"})
+            store.append({"mean_waiting_time": 0, "su": 1, "replication": 0})
+            store.append({"mean_waiting_time": .5, "su": 1.5, "replication": 1})
+            self.assertEqual([store.get_column("mean_waiting_time").tolist(), store.get_column("su").tolist()],
+                             [[0., .5], [1., 1.5]], msg="Error in ResultStore. Wrong typed columns.")
+        finally:
+            shutil.rmtree(directory)
+
+    def test_sequential_replications(self):
+        """
+        Test that sequential estimation stops at the first precise replication, independent of the wave size.
+        """
+        sim_param = SimParam()
+        sim_param.SIM_TIME = 5000
+        counts = []
+        for processes, wave_size in [(1, 1), (2, 3)]:
+            runner = ReplicationRunner(sim_param, processes=processes)
+            replications = SequentialReplications(runner, ["system_utilization"], alpha=.1, epsilon=.05,
+                                                  relative=True, wave_size=wave_size)
+            counts.append(replications.run())
+            runner.close()
+            self.assertLessEqual(replications.get_confidence_interval("system_utilization"),
+                                 .05 * replications.get_mean("system_utilization"),
+                                 msg="Error in SequentialReplications. Precision not reached.")
+        self.assertEqual(counts[0], counts[1],
+                         msg="Error in SequentialReplications. Number of replications depends on the wave size.")
+        self.assertGreaterEqual(counts[0], 5, msg="Error in SequentialReplications. Too few replications.")
+
+        replications = SequentialReplications(ReplicationRunner(sim_param, processes=1), ["blocking_probability"],
+                                              epsilon=1e-9, max_replications=7, wave_size=3)
+        self.assertEqual(replications.run(), 7,
+                         msg="Error in SequentialReplications. Maximum number of replications exceeded.")
+
+        # fields without results in the replications are not precise, fields of disabled counters are rejected
+        replications.fields = ["mean_waiting_time"]
+        replications.counters["mean_waiting_time"].reset()
+        self.assertFalse(replications.is_precise(), msg="Error in SequentialReplications. Field without results.")
+        sim_param.COUNTER_PROFILE = "minimal"
+        self.assertRaises(ValueError, SequentialReplications, ReplicationRunner(sim_param, processes=1),
+                          ["mean_waiting_time"], epsilon=.1)
+
+    def test_batch_means(self):
+        """
+        Test that batch means continue one simulation run and count the results of every batch.
+        """
+        sim = Simulation(SimParam())
+        sim.sim_param.S = 4
+        sim.reset()
+        batch_means = sim.do_simulation_batch_means(batch_packets=500, max_batches=4)
+        reference = Simulation(SimParam())
+        reference.sim_param.S = 4
+        reference.reset()
+        r = reference.do_simulation_n_limit(2000)
+        self.assertEqual(batch_means.num_batches, 4, msg="Error in BatchMeans. Wrong number of batches.")
+        self.assertEqual(sim.sim_state.now, reference.sim_state.now,
+                         msg="Error in BatchMeans. Batches should continue the same simulation run.")
+        self.assertAlmostEqual(batch_means.get_mean("blocking_probability"), r.blocking_probability, delta=1e-12,
+                               msg="Error in BatchMeans. Wrong mean blocking probability of equally sized batches.")
+
+        sim.reset()
+        batch_means = sim.do_simulation_batch_means(batch_time=10000, alpha=.05, epsilon=.01,
+                                                    field="system_utilization")
+        self.assertEqual(sim.sim_state.now, batch_means.num_batches * 10000,
+                         msg="Error in BatchMeans. Wrong length of time batches.")
+        self.assertLess(batch_means.get_confidence_interval("system_utilization", .05), .01,
+                        msg="Error in BatchMeans. Stopped before the confidence interval is small enough.")
+        self.assertGreaterEqual(batch_means.num_batches, 5, msg="Error in BatchMeans. Too few batches.")
+
+        # a batch without packets has no results instead of the results of the previous batch
+        r = sim.sim_result
+        sim.counter_collection.reset()
+        sim.sim_state.start_batch()
+        r.gather_results()
+        for field in ["mean_waiting_time", "mean_queue_length", "system_utilization", "blocking_probability",
+                      "pasta_blocking_probability", "p50_waiting_time", "p99_waiting_time", "p999_waiting_time"]:
+            self.assertTrue(math.isnan(getattr(r, field)), msg="Error in SimResult. " + field + " should be nan.")
+
 
 if __name__ == '__main__':
     unittest.main()
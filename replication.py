@@ -0,0 +1,193 @@
+import copy
+import multiprocessing
+import numpy
+from simulation import Simulation
+from simresult import RESULT_FIELDS, RESULT_COUNTERS
+from counter import TimeIndependentCounter
+from countercollection import get_profile_counters
+
+"""
+This file contains the replication runner, which executes independent replications of a simulation in parallel, and
+the sequential estimation, which runs replications until the results are precise enough.
+"""
+
+
+def derive_seed(seed, index):
+    """
+    Derive the seed of a replication from the base seed of the study.
+    The base seed and the replication index are used as initialization array of a Mersenne Twister, hence every
+    replication gets a reproducible stream, which is independent of the streams of the other replications.
+    :param seed: base seed (e.g. sim_param.SEED_IAT)
+    :param index: index of the replication
+    :return: seed of the replication
+    """
+    return int(numpy.random.RandomState([seed, index]).randint(0, 2 ** 31 - 1))
+
+
+def run_replication(args):
+    """
+    Run a single replication. This function is executed in the worker processes.
+    :param args: tuple of sim_param (with the seeds of the replication) and n_limit (None for a run until SIM_TIME)
+    :return: SimResultRecord of the replication
+    """
+    sim_param, n_limit = args
+    sim = Simulation(sim_param)
+    if n_limit is None:
+        r = sim.do_simulation()
+    else:
+        r = sim.do_simulation_n_limit(n_limit)
+    return r.get_record()
+
+
+class ReplicationRunner(object):
+
+    """
+    ReplicationRunner executes independent replications of a simulation on a pool of worker processes.
+
+    Replication i uses the seeds derive_seed(SEED_IAT, i) and derive_seed(SEED_ST, i), so the results only depend on
+    the parameters and the replication indices, not on the number of processes or the order of execution. Only the
+    scalar results (SimResultRecord without sketches) are sent back to the calling process.
+    """
+
+    def __init__(self, sim_param, processes=None, n_limit=None):
+        """
+        Create a runner for the given parameters.
+        :param sim_param: SimParam object, that is copied for every replication
+        :param processes: number of worker processes (default: number of cores), 1 runs all replications serially
+        :param n_limit: if given, every replication stops after n_limit packets instead of SIM_TIME
+        """
+        self.sim_param = sim_param
+        self.processes = processes if processes else multiprocessing.cpu_count()
+        self.n_limit = n_limit
+        self.pool = None
+
+    def get_replication_param(self, index):
+        """
+        :return: copy of the simulation parameters with the seeds of replication index
+        """
+        sim_param = copy.deepcopy(self.sim_param)
+        sim_param.SEED_IAT = derive_seed(self.sim_param.SEED_IAT, index)
+        sim_param.SEED_ST = derive_seed(self.sim_param.SEED_ST, index)
+        return sim_param
+
+    def run(self, replications, first=0):
+        """
+        Run replications first, ..., first + replications - 1.
+        :param replications: number of replications
+        :param first: index of the first replication
+        :return: list of SimResultRecords, ordered by replication index
+        """
+        args = [(self.get_replication_param(i), self.n_limit) for i in range(first, first + replications)]
+        if self.processes == 1:
+            return [run_replication(a) for a in args]
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes)
+        return self.pool.map(run_replication, args, chunksize=max(1, replications // (4 * self.processes)))
+
+    def close(self):
+        """
+        Terminate the worker processes.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class SequentialReplications(object):
+
+    """
+    SequentialReplications runs independent replications until the confidence intervals of the requested SimResult
+    fields are small enough (sequential estimation).
+
+    The results are counted in TimeIndependentCounters with running moments and the t-quantiles are cached, hence
+    checking the stopping criterion takes constant time per replication. The replications are started in waves of
+    wave_size replications on the ReplicationRunner. The results of a wave are counted in the order of the
+    replication indices and the campaign stops at the first replication, that reaches the precision. Remaining
+    results of the wave are discarded, so the result does not depend on the number of processes.
+    """
+
+    def __init__(self, runner, fields=("blocking_probability",), alpha=0.05, epsilon=None, relative=False,
+                 min_replications=5, max_replications=None, wave_size=None):
+        """
+        Create the controller.
+        :param runner: ReplicationRunner, that executes the replications
+        :param fields: SimResult fields, whose confidence intervals have to reach the precision
+        :param alpha: significance level
+        :param epsilon: required half width of the confidence intervals
+        :param relative: if True, epsilon is relative to the mean, e.g. 0.01 for 1%
+        :param min_replications: minimum number of replications before the precision is checked
+        :param max_replications: stop after this number of replications, even if the precision is not reached
+        :param wave_size: number of replications started at once (default: number of processes of the runner)
+        """
+        if epsilon is None and max_replications is None:
+            raise ValueError("Either epsilon or max_replications has to be given.")
+        counters = get_profile_counters(runner.sim_param.COUNTER_PROFILE)
+        for field in fields:
+            if field not in RESULT_FIELDS:
+                raise ValueError("Unknown SimResult field " + str(field) + ".")
+            if field in RESULT_COUNTERS and RESULT_COUNTERS[field] not in counters:
+                raise ValueError("SimResult field " + field + " is not available, since the counter profile " +
+                                 str(runner.sim_param.COUNTER_PROFILE) + " disables " + RESULT_COUNTERS[field] + ".")
+        self.runner = runner
+        self.fields = list(fields)
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.relative = relative
+        self.min_replications = max(min_replications, 2)
+        self.max_replications = max_replications
+        self.wave_size = wave_size if wave_size else runner.processes
+        self.counters = dict((field, TimeIndependentCounter(field)) for field in RESULT_FIELDS)
+        self.num_replications = 0
+
+    def is_precise(self):
+        """
+        :return: True, if the confidence intervals of all fields are small enough
+        """
+        if self.epsilon is None or self.num_replications < self.min_replications:
+            return False
+        for field in self.fields:
+            counter = self.counters[field]
+            # fields without results (nan) in most replications, e.g. waiting times without served packets
+            if counter.get_num_samples() < 2:
+                return False
+            h = counter.report_confidence_interval(self.alpha, print_report=False)
+            limit = self.epsilon * abs(counter.get_mean()) if self.relative else self.epsilon
+            if not h <= limit:
+                return False
+        return True
+
+    def run(self):
+        """
+        Run waves of replications until the precision or the maximum number of replications is reached.
+        :return: number of counted replications
+        """
+        while True:
+            wave = self.wave_size
+            if self.num_replications < self.min_replications:
+                wave = max(wave, self.min_replications - self.num_replications)
+            if self.max_replications is not None:
+                wave = min(wave, self.max_replications - self.num_replications)
+            if wave <= 0:
+                return self.num_replications
+            for result in self.runner.run(wave, first=self.num_replications):
+                for field in RESULT_FIELDS:
+                    value = getattr(result, field)
+                    # results, that are not available (nan, e.g. disabled by the counter profile), are not counted
+                    if value == value:
+                        self.counters[field].count(value)
+                self.num_replications += 1
+                if self.is_precise():
+                    return self.num_replications
+
+    def get_mean(self, field):
+        """
+        Return the mean of a SimResult field over all counted replications.
+        """
+        return self.counters[field].get_mean()
+
+    def get_confidence_interval(self, field):
+        """
+        Return the half width of the confidence interval of a SimResult field.
+        """
+        return self.counters[field].report_confidence_interval(self.alpha, print_report=False)
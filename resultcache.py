@@ -0,0 +1,251 @@
+import cPickle
+import cStringIO
+import glob
+import hashlib
+import os
+import tempfile
+from simresult import RESULT_FIELDS
+
+"""
+This file contains the result cache, which stores the results of simulation runs on disk, so the same run is only
+simulated once (e.g. while the plots of a simulation study are changed).
+
+A run is identified by a hash of all simulation parameters, the distributions and the state of the random number
+streams at the start of the run (hence the seeds and the number of random numbers, that have been drawn before), the
+kind of the run and a fingerprint of the source code of the simulator. Changing the code of the simulator therefore
+invalidates all cached results.
+"""
+
+# SimParam fields, that configure the cache itself and are not part of the key
+CACHE_PARAMS = ["RESULT_CACHE", "RESULT_CACHE_SIZE"]
+
+# fingerprint of the source code of the simulator, calculated once per process
+CODE_FINGERPRINT = []
+
+# Simulation attributes, whose state at the end of a run is stored in the cache with SimParam.RESULT_CACHE_STATE (the
+# SimResult is always stored as record)
+STATE_ATTRIBUTES = ["sim_state", "system_state", "event_chain", "event_pool", "counter_collection"]
+
+
+def get_code_fingerprint():
+    """
+    Return a hash of all python files of the simulator (without tests, simulation studies and benchmarks).
+    """
+    if not CODE_FINGERPRINT:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.sha1()
+        for path in sorted(glob.glob(os.path.join(directory, "*.py"))):
+            name = os.path.basename(path)
+            if name.startswith("part") or name == "benchmarks.py":
+                continue
+            with open(path, "rb") as f:
+                h.update(name + "\0" + f.read() + "\0")
+        CODE_FINGERPRINT.append(h.hexdigest())
+    return CODE_FINGERPRINT[0]
+
+
+def get_key(sim, run):
+    """
+    Return the cache key of a simulation run, that starts from the current state of the simulation.
+    :param sim: simulation object (which must not have started yet)
+    :param run: description of the run, e.g. ("time",) or ("packets", n)
+    :return: hex digest
+    """
+    h = hashlib.sha1()
+    h.update(get_code_fingerprint())
+    params = sorted((name, value) for name, value in vars(sim.sim_param).items() if name not in CACHE_PARAMS)
+    h.update(repr(params))
+    h.update(repr(run))
+    # the streams are only rescaled to a new RHO by Simulation.reset, so their rates may differ from the parameters
+    h.update(repr([(type(rns).__name__, rns.get_parameters()) for rns in [sim.rng.iat_rns, sim.rng.st_rns]]))
+    for random_state, block in sim.rng.get_state():
+        h.update(repr(random_state[0]) + repr(random_state[2:]))
+        h.update(random_state[1].tostring())
+        h.update(block.tostring())
+    return h.hexdigest()
+
+
+def dump_state(sim):
+    """
+    Return the pickled state of a simulation (see STATE_ATTRIBUTES) without the simulation object itself, which is
+    referenced by the counters, events and states.
+    :param sim: simulation object
+    :return: binary string
+    """
+    f = cStringIO.StringIO()
+    pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = lambda obj: "sim" if obj is sim else None
+    pickler.dump(dict((name, getattr(sim, name)) for name in STATE_ATTRIBUTES))
+    return f.getvalue()
+
+
+def load_state(sim, state):
+    """
+    Restore the state returned by dump_state into a simulation, so its counters, events and states refer to it.
+    :param sim: simulation object
+    :param state: binary string returned by dump_state
+    """
+    unpickler = cPickle.Unpickler(cStringIO.StringIO(state))
+    unpickler.persistent_load = lambda pid: sim
+    for name, value in unpickler.load().items():
+        setattr(sim, name, value)
+
+
+class ResultCache(object):
+
+    """
+    ResultCache stores records of simulation runs in files named by their key in a directory.
+
+    A record contains the SimResultRecord of the run, the final simulation time and the state of the random number
+    streams at the end of the run, so records are small. With SimParam.RESULT_CACHE_STATE, the record additionally
+    contains the counters, the system state and the event chain at the end of the run (see dump_state), which makes
+    records much larger (e.g. histograms and kept samples). Records are written to a temporary file and renamed, so
+    several processes can share a cache directory. The total size of the records is bounded by max_size: if it is
+    exceeded, the least recently used records (by modification time, which is updated on every hit) are removed.
+    """
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024):
+        """
+        Create the cache for a directory, which is created if it does not exist.
+        :param directory: cache directory
+        :param max_size: maximum total size of the records in bytes
+        """
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.size = sum(os.path.getsize(path) for path in self.get_paths())
+        self.hits = 0
+        self.misses = 0
+
+    def get_paths(self):
+        """
+        :return: paths of all records in the cache directory
+        """
+        return glob.glob(os.path.join(self.directory, "*.pkl"))
+
+    def get_path(self, key):
+        """
+        :return: path of the record of a key
+        """
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        """
+        Return the record of a key and mark it as recently used.
+        :return: record dict or None, if the key is not in the cache
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as f:
+                record = cPickle.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record
+
+    def put(self, key, record):
+        """
+        Store the record of a key and evict the least recently used records, if the cache is too large.
+        """
+        handle, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(handle, "wb") as f:
+            cPickle.dump(record, f, cPickle.HIGHEST_PROTOCOL)
+        path = self.get_path(key)
+        if os.path.exists(path):
+            self.size -= os.path.getsize(path)
+        self.size += os.path.getsize(tmp_path)
+        os.rename(tmp_path, path)
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used records, until the total size is at most max_size.
+        """
+        records = []
+        for path in self.get_paths():
+            try:
+                records.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                # removed by another process
+                pass
+        records.sort()
+        self.size = sum(size for _, size, _ in records)
+        for _, size, path in records:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.size -= size
+
+    def clear(self):
+        """
+        Remove all records.
+        """
+        for path in self.get_paths():
+            os.remove(path)
+        self.size = 0
+
+
+# caches of the simulations by directory, shared by all Simulation objects of a process
+RESULT_CACHES = {}
+
+
+def get_result_cache(sim_param):
+    """
+    Return the cache configured in the simulation parameters (SimParam.RESULT_CACHE) or None.
+    """
+    if sim_param.RESULT_CACHE is None:
+        return None
+    cache = RESULT_CACHES.get(sim_param.RESULT_CACHE)
+    if cache is None:
+        cache = RESULT_CACHES[sim_param.RESULT_CACHE] = ResultCache(sim_param.RESULT_CACHE,
+                                                                    sim_param.RESULT_CACHE_SIZE)
+    return cache
+
+
+def cached_run(sim, run, simulate):
+    """
+    Return the result of a simulation run from the cache of the simulation or simulate and store it.
+    On a hit, the SimResult, the simulation time, the packet numbers and the random number streams of the simulation
+    are set to their values at the end of the run. The counters, the system state and the event chain are only
+    restored with SimParam.RESULT_CACHE_STATE, otherwise they keep their state from before the run.
+    Runs of a started simulation, runs without seed and runs, that keep the samples of the counters, are not cached.
+    :param sim: simulation object
+    :param run: description of the run, e.g. ("time",) or ("packets", n)
+    :param simulate: function, which does the run and returns the SimResult
+    :return: SimResult object
+    """
+    cache = get_result_cache(sim.sim_param)
+    if cache is None or sim.no_seed or sim.sim_param.KEEP_SAMPLES or sim.sim_state.now != 0 or \
+            sim.sim_state.num_packets != 0:
+        return simulate()
+
+    key = get_key(sim, run)
+    record = cache.get(key)
+    if record is None:
+        r = simulate()
+        record = {"result": r.get_record()}
+        record["now"] = sim.sim_state.now
+        record["rng_state"] = sim.rng.get_state()
+        if sim.sim_param.RESULT_CACHE_STATE:
+            record["state"] = dump_state(sim)
+        cache.put(key, record)
+        return r
+
+    if sim.sim_param.RESULT_CACHE_STATE:
+        load_state(sim, record["state"])
+    else:
+        sim.sim_state.now = record["now"]
+        sim.sim_state.num_packets = record["result"].packets_total
+        sim.sim_state.num_blocked_packets = record["result"].packets_dropped
+        sim.sim_state.stop = True
+    sim.rng.set_state(record["rng_state"])
+    for name in RESULT_FIELDS:
+        setattr(sim.sim_result, name, getattr(record["result"], name))
+    return sim.sim_result
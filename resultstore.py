@@ -0,0 +1,271 @@
+import json
+import os
+import numpy
+import scipy.stats
+from simresult import RESULT_FIELDS
+
+"""
+This file contains the columnar result store, which keeps the results of large replication campaigns on disk, so they
+can be analyzed again without running the simulations again.
+
+The store is a directory with a manifest (manifest.json) and one NumPy file per column and chunk. Rows are appended
+in memory and written as a new chunk every chunk_size rows (and on flush/close). The manifest is replaced atomically
+after the files of a chunk have been written, so an interrupted campaign leaves a consistent store with all complete
+chunks. Columns are read memory-mapped and all aggregations are vectorized over the rows.
+"""
+
+# manifest file of a store
+MANIFEST = "manifest.json"
+
+# column types, that do not depend on the first row: SimResult fields may be integers (e.g. 0 without samples) in
+# some rows and floats in others
+RESULT_DTYPES = dict((name, "float64") for name in RESULT_FIELDS)
+
+
+def get_dtype(value):
+    """
+    Return the column type for a value of a row: bool, int64 or float64.
+    """
+    if isinstance(value, (bool, numpy.bool_)):
+        return "bool"
+    if isinstance(value, (int, long, numpy.integer)):
+        return "int64"
+    if isinstance(value, (float, numpy.floating)):
+        return "float64"
+    raise ValueError("ResultStore can only store numbers, not " + repr(value) + ".")
+
+
+class ResultStore(object):
+
+    """
+    ResultStore is an append-only table of numbers with one column per parameter or SimResult field.
+
+    The columns are defined by the first row and all rows need values for all columns. The fields of SimResult (see
+    RESULT_FIELDS) and the columns declared in dtypes have a fixed type, the type of other columns is taken from the
+    first row: integer and boolean columns keep their type, all other numbers are stored as float64 (e.g. nan for
+    results, that are not available).
+
+    Example (one row per replication of a campaign):
+
+        store = ResultStore("results")
+        store.append(dict(RHO=.9, replication=i, **record._asdict()))
+        store.close()
+        ResultStore("results").get_confidence_intervals(["RHO"], "system_utilization", .05)
+    """
+
+    def __init__(self, directory, chunk_size=65536, dtypes=None):
+        """
+        Open a store or create it, if the directory does not contain a manifest.
+        :param directory: directory of the store
+        :param chunk_size: number of rows, that are kept in memory before a chunk is written
+        :param dtypes: dict of column name and type ("bool", "int64" or "float64") for the columns of a new store, that
+                       must not be inferred from the first row
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.declared_dtypes = dict(RESULT_DTYPES)
+        self.declared_dtypes.update(dtypes or {})
+        self.pending = []
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            self.columns = [str(name) for name in manifest["columns"]]
+            self.dtypes = dict((str(name), str(dtype)) for name, dtype in manifest["dtypes"].items())
+            self.chunks = manifest["chunks"]
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.columns = None
+            self.dtypes = None
+            self.chunks = []
+        self.cache = {}
+
+    def append(self, row):
+        """
+        Append a row, given as dict of column name and number.
+        """
+        if self.columns is None:
+            self.columns = sorted(row)
+            self.dtypes = dict((name, self.declared_dtypes.get(name) or get_dtype(row[name])) for name in self.columns)
+        elif len(row) != len(self.columns) or any(name not in row for name in self.columns):
+            raise ValueError("Row does not match the columns " + ", ".join(self.columns) + ".")
+        self.pending.append(row)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, rows):
+        """
+        Append several rows.
+        """
+        for row in rows:
+            self.append(row)
+
+    def append_columns(self, columns):
+        """
+        Append a block of rows, given as dict of column name and array, directly as a new chunk.
+        """
+        self.flush()
+        columns = dict((name, numpy.asarray(values)) for name, values in columns.items())
+        if self.columns is None:
+            self.columns = sorted(columns)
+            self.dtypes = dict((name, self.declared_dtypes.get(name) or get_dtype(columns[name].dtype.type(0)))
+                               for name in self.columns)
+        elif sorted(columns) != self.columns:
+            raise ValueError("Columns do not match the columns " + ", ".join(self.columns) + ".")
+        self.write_chunk(columns)
+
+    def flush(self):
+        """
+        Write the pending rows as a new chunk and update the manifest.
+        """
+        if not self.pending:
+            return
+        columns = dict((name, numpy.array([row[name] for row in self.pending])) for name in self.columns)
+        self.pending = []
+        self.write_chunk(columns)
+
+    def write_chunk(self, columns):
+        """
+        Write the arrays of all columns as a new chunk and update the manifest.
+        """
+        lengths = set(len(column) for column in columns.values())
+        if len(lengths) != 1:
+            raise ValueError("All columns of a chunk need the same length.")
+        index = len(self.chunks)
+        for name in self.columns:
+            dtype = self.dtypes[name]
+            column = columns[name]
+            if not numpy.can_cast(column.dtype, dtype, "same_kind"):
+                raise ValueError("Column " + name + " has the type " + dtype + ", but got " + str(column.dtype) + ".")
+            numpy.save(self.get_path(name, index), column.astype(dtype))
+        self.chunks.append(lengths.pop())
+        self.write_manifest()
+        self.cache = {}
+
+    def close(self):
+        """
+        Write the pending rows.
+        """
+        self.flush()
+
+    def write_manifest(self):
+        """
+        Replace the manifest atomically.
+        """
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"columns": self.columns, "dtypes": self.dtypes, "chunks": self.chunks}, f)
+        os.rename(path + ".tmp", path)
+
+    def get_path(self, name, index):
+        """
+        :return: path of the file of a column in a chunk
+        """
+        return os.path.join(self.directory, name + "." + str(index) + ".npy")
+
+    def get_num_rows(self):
+        """
+        :return: number of written rows (without pending rows)
+        """
+        return sum(self.chunks)
+
+    def get_chunks(self, name):
+        """
+        :return: list of the memory-mapped arrays of a column, one per chunk
+        """
+        if self.columns is None or name not in self.columns:
+            raise ValueError("Unknown column " + str(name) + ".")
+        return [numpy.load(self.get_path(name, index), mmap_mode="r") for index in range(len(self.chunks))]
+
+    def get_column(self, name):
+        """
+        :return: numpy array with all written values of a column
+        """
+        column = self.cache.get(name)
+        if column is None:
+            chunks = self.get_chunks(name)
+            if len(chunks) == 1:
+                column = chunks[0]
+            elif chunks:
+                column = numpy.concatenate(chunks)
+            else:
+                column = numpy.zeros(0, dtype=self.dtypes[name])
+            self.cache[name] = column
+        return column
+
+    def get_selection(self, name, where=None):
+        """
+        :return: numpy array with the values of a column in the rows selected by the boolean array where (or all rows)
+        """
+        column = numpy.asarray(self.get_column(name))
+        return column if where is None else column[where]
+
+    def group_by(self, keys, where=None):
+        """
+        Group the rows by the values of the key columns.
+        :param keys: list of column names (without nan values)
+        :param where: optional boolean array, which selects the rows
+        :return: tuple of a dict with the key columns of the groups (sorted by the keys), the group index of every
+                 selected row and the selection
+        """
+        columns = [self.get_selection(name, where) for name in keys]
+        if not columns:
+            return {}, numpy.zeros(len(self.get_selection(self.columns[0], where)), dtype=int), where
+        # consecutive numbers of the distinct values of every key, combined to a single group number
+        codes = numpy.zeros(len(columns[0]), dtype=numpy.int64)
+        uniques = []
+        for column in columns:
+            unique = numpy.unique(column)
+            uniques.append(unique)
+            codes = codes * len(unique) + numpy.searchsorted(unique, column)
+        size = numpy.prod([len(unique) for unique in uniques])
+        if size <= max(len(codes), 1 << 20):
+            # few possible groups (e.g. a grid of parameters): number the used group numbers without sorting
+            groups = numpy.flatnonzero(numpy.bincount(codes, minlength=size))
+            numbers = numpy.zeros(size, dtype=numpy.int64)
+            numbers[groups] = numpy.arange(len(groups))
+            inverse = numbers[codes]
+        else:
+            groups, inverse = numpy.unique(codes, return_inverse=True)
+        group_keys = {}
+        for name, unique in reversed(zip(keys, uniques)):
+            groups, index = divmod(groups, len(unique))
+            group_keys[name] = unique[index]
+        return group_keys, inverse, where
+
+    def aggregate(self, keys, field, where=None):
+        """
+        Calculate the number of rows, the mean and the variance of a column for every group of rows.
+        :param keys: list of column names, which define the groups
+        :param field: column, that is aggregated
+        :param where: optional boolean array, which selects the rows
+        :return: dict with the key columns and the arrays "count", "mean" and "var" (with n - 1 in the denominator)
+        """
+        group_keys, inverse, where = self.group_by(keys, where)
+        values = numpy.asarray(self.get_selection(field, where), dtype=float)
+        count = numpy.bincount(inverse)
+        mean = numpy.bincount(inverse, values) / count
+        deviation = values - mean[inverse]
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            var = numpy.bincount(inverse, deviation * deviation) / (count - 1)
+        result = dict(group_keys)
+        result.update(count=count, mean=mean, var=var)
+        return result
+
+    def get_confidence_intervals(self, keys, field, alpha, where=None):
+        """
+        Calculate the confidence interval of the mean of a column for every group of rows.
+        :param keys: list of column names, which define the groups
+        :param field: column, whose mean is estimated
+        :param alpha: significance level, a number or the name of one of the key columns
+        :param where: optional boolean array, which selects the rows
+        :return: dict like aggregate with the additional array "half_width"
+        """
+        result = self.aggregate(keys, field, where)
+        if not isinstance(alpha, (int, float)):
+            alpha = result[alpha]
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            t = scipy.stats.t.ppf(1 - numpy.asarray(alpha) / 2., result["count"] - 1)
+            result["half_width"] = t * numpy.sqrt(result["var"] / result["count"])
+        return result
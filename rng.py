@@ -1,5 +1,14 @@
-import math
-from random import Random
+import collections
+import functools
+import itertools
+import numpy
+
+
+def remaining_length(iterator):
+    """
+    Return the number of items, that have not been taken from a list iterator yet.
+    """
+    return iterator.__length_hint__()
 
 
 class RNG(object):
@@ -8,7 +17,7 @@ class RNG(object):
     Class RNG contains two random number streams, one for IAT and one for ST.
 
     Both RNS can be set during initialization or separately. The next random numbers are generated by the functions
-    get_iat() or get_st().
+    get_iat() or get_st(). For speed, get_iat and get_st are bound directly to next() of the RNS.
     """
     
     def __init__(self, rns1, rns2):
@@ -17,21 +26,23 @@ class RNG(object):
         :param rns1: represents the RNS for the inter-arrival times.
         :param rns2: represents the RNS for the service times.
         """
-        self.iat_rns = rns1
-        self.st_rns = rns2
+        self.set_iat_rns(rns1)
+        self.set_st_rns(rns2)
     
     def set_iat_rns(self, rns1):
         """
         Set a new RNS for the inter-arrival times.
         """
         self.iat_rns = rns1
+        self.get_iat = rns1.next
         
     def set_st_rns(self, rns2):
         """
         Set a new RNS for the service times.
         """
         self.st_rns = rns2
-        
+        self.get_st = rns2.next
+    
     def get_iat(self):
         """
         Return a new sample of the IAT RNS
@@ -44,6 +55,41 @@ class RNG(object):
         """
         return self.st_rns.next()
 
+    def get_iat_block(self, n):
+        """
+        Return the next n samples of the IAT RNS as numpy array
+        """
+        return self.iat_rns.next_block(n)
+
+    def get_st_block(self, n):
+        """
+        Return the next n samples of the ST RNS as numpy array
+        """
+        return self.st_rns.next_block(n)
+
+    def get_state(self):
+        """
+        Return the state of both RNS (see RNS.get_state).
+        """
+        return self.iat_rns.get_state(), self.st_rns.get_state()
+
+    def set_state(self, state):
+        """
+        Continue both RNS from a state returned by get_state.
+        """
+        self.iat_rns.set_state(state[0])
+        self.st_rns.set_state(state[1])
+
+    def __getstate__(self):
+        """
+        Return the attributes for pickling and copying, without the bound functions of the RNS.
+        """
+        return {"iat_rns": self.iat_rns, "st_rns": self.st_rns}
+
+    def __setstate__(self, state):
+        self.set_iat_rns(state["iat_rns"])
+        self.set_st_rns(state["st_rns"])
+
 
 class RNS(object):
     
@@ -51,24 +97,129 @@ class RNS(object):
     Basic abstract class for random number streams.
 
     To be implemented in subclass.
-    Contains a Random class r in order to allow different seeds for different RNS
+    Contains a numpy RandomState r in order to allow different seeds for different RNS.
+
+    Random numbers are generated in blocks of block_size standard variates (generate_block), which are transformed
+    to the distribution of the stream (transform). Single numbers are handed out by next(), which is a C level
+    iterator over the blocks, so drawing a number does not execute any python code. The sequence of numbers only
+    depends on the seed, not on the block size or on mixing next() and next_block().
     """
 
-    def __init__(self, the_seed=None):
+    def __init__(self, the_seed=None, block_size=4096):
         """
         Initialize the general RNS with an optional seed.
         All further initialization is done in subclass.
+        :param the_seed: optional seed for the random number stream
+        :param block_size: number of random numbers generated at once
+        """
+        self.r = numpy.random.RandomState(the_seed)
+        self.block_size = block_size
+        self.start()
+
+    def start(self):
+        """
+        Create the iterator, that hands out the numbers of the stream, with an empty current block.
+        """
+        # standard variates of the current block and iterator over their transformed values
+        self.block = numpy.zeros(0)
+        self.block_iter = iter([])
+        self.restarted = False
+        self.next = functools.partial(next, itertools.chain.from_iterable(self.blocks()))
+
+    def blocks(self):
+        """
+        Generator of list iterators over the transformed blocks, consumed by next().
         """
-        self.r = Random(the_seed)
+        while True:
+            if self.restarted:
+                self.restarted = False
+            else:
+                self.block = self.generate_block(self.block_size)
+                self.block_iter = iter(self.transform(self.block).tolist())
+            yield self.block_iter
+
+    def get_remaining_block(self):
+        """
+        :return: standard variates of the current block, that have not been handed out yet
+        """
+        return self.block[len(self.block) - remaining_length(self.block_iter):]
+
+    def set_block(self, block):
+        """
+        Replace the rest of the current block by the given standard variates, e.g. after changing the parameters.
+        """
+        collections.deque(self.block_iter, maxlen=0)
+        self.block = block
+        self.block_iter = iter(self.transform(block).tolist())
+        self.restarted = True
+
+    def get_state(self):
+        """
+        Return the position of the stream: the state of the RandomState and the standard variates of the current
+        block, that have not been handed out yet. The parameters of the distribution are not part of the state.
+        """
+        return self.r.get_state(), self.get_remaining_block().copy()
+
+    def set_state(self, state):
+        """
+        Continue the stream from a state returned by get_state.
+        """
+        random_state, block = state
+        self.r.set_state(random_state)
+        self.set_block(numpy.array(block, dtype=float))
+
+    def __getstate__(self):
+        """
+        Return the attributes for pickling and copying. The iterators can't be pickled, so only the numbers of the
+        current block, that have not been handed out yet, are kept.
+        """
+        state = dict((name, value) for name, value in self.__dict__.items()
+                     if name not in ["block", "block_iter", "restarted", "next"])
+        state["block"] = self.get_remaining_block().copy()
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        block = state.pop("block")
+        self.__dict__.update(state)
+        self.start()
+        self.set_block(block)
 
     def set_parameters(self, *args):
         NotImplementedError("Implement in subclass")
 
-    def next(self):
+    def get_parameters(self):
+        """
+        Return the parameters of the distribution as tuple.
+        Method should be overwritten in subclass.
+        """
+        return ()
+
+    def generate_block(self, n):
         """
+        Generate n standard variates (e.g. uniform on [0, 1) or exponential with mean 1).
         Method should be overwritten in subclass.
         """
-        return 0
+        return numpy.zeros(n)
+
+    def transform(self, block):
+        """
+        Transform a block of standard variates to the distribution of the stream.
+        Method should be overwritten in subclass.
+        """
+        return block
+
+    def next_block(self, n):
+        """
+        Return the next n random numbers of the stream as numpy array (for vectorized consumers).
+        """
+        remaining = self.get_remaining_block()
+        k = min(n, len(remaining))
+        block = remaining[:k]
+        if k < n:
+            block = numpy.concatenate((block, self.generate_block(n - k)))
+        self.set_block(remaining[k:])
+        return self.transform(block)
     
 
 class ExponentialRNS(RNS):
@@ -79,82 +230,85 @@ class ExponentialRNS(RNS):
     :param the_seed: optional seed for the random number stream
     """
     
-    def __init__(self, mean=1, the_seed=None):
+    def __init__(self, mean=1, the_seed=None, block_size=4096):
         """
         Initialize Exponential RNS and set the parameters.
         """
-        super(ExponentialRNS, self).__init__(the_seed)
-        # TODO Task 3.1.1: Your code goes here
-        """
-        Also modify the list of input parameters according to the needs of this distribution.
-        """
         self.lamb = float(1) / float(mean)
-        pass
+        super(ExponentialRNS, self).__init__(the_seed, block_size)
         
     def set_parameters(self, rho=None):
         """
         Set parameters of the distribution.
+        Numbers that have already been generated are rescaled to the new parameter.
+        """
+        if rho:
+            lamb = float(1) / float(rho)  # Considering mean arrival rate = 1
+            if lamb != self.lamb:
+                remaining = self.get_remaining_block()
+                self.lamb = lamb
+                self.set_block(remaining)
+
+    def get_parameters(self):
         """
-        # TODO Task 3.1.1: Your code goes here
+        Return the rate of the distribution.
         """
-        Also modify the list of input parameters according to the needs of this distribution.
+        return self.lamb,
+
+    def generate_block(self, n):
         """
-        #self.lamb = 1 / mean
-        if rho:
-            self.lamb = float(1)/ float(rho) #Considering mean arrival rate = 1
-        
-        pass
-        
-    def next(self):
+        Generate n exponentially distributed numbers with mean 1.
+        """
+        return self.r.standard_exponential(n)
+
+    def transform(self, block):
         """
-        Generate the next random number using the inverse transform method.
+        Scale the exponentially distributed numbers to mean 1/lambda.
         """
-        # TODO Task 3.1.1: Your code goes here
-        p = self.r.random()
-        x = -(math.log(1-p))/ float(self.lamb)
-        return x
-        pass
+        return block / float(self.lamb)
         
 
 class UniformRNS(RNS):
     
     """
-    Class to provide exponentially distributed random numbers. After initialization, new numbers can be generated
+    Class to provide uniformly distributed random numbers. After initialization, new numbers can be generated
     using next(). Initialization with given parameters and optional seed.
     :param the_seed: optional seed for the random number stream
     """
     
-    def __init__(self, low=0, high=0, the_seed=None):
+    def __init__(self, low=0, high=0, the_seed=None, block_size=4096):
         """
         Initialize Uniform RNS and set the parameters.
         """
-        super(UniformRNS, self).__init__(the_seed)
-        # TODO Task 3.1.1: Your code goes here
-        """
-        Also modify the list of input parameters according to the needs of this distribution.
-        """
         self.a = low
         self.b = high
-        pass
+        super(UniformRNS, self).__init__(the_seed, block_size)
         
     def set_parameters(self, low, high):
         """
         Set parameters.
+        Numbers that have already been generated are transformed to the new interval.
         """
-        # TODO Task 3.1.1: Your code goes here
+        if (low, high) != (self.a, self.b):
+            remaining = self.get_remaining_block()
+            self.a = low
+            self.b = high
+            self.set_block(remaining)
+
+    def get_parameters(self):
         """
-        Also modify the list of input parameters according to the needs of this distribution.
+        Return the interval of the distribution.
         """
-        self.a = low
-        self.b = high
-        
-        pass
-        
-    def next(self):
+        return self.a, self.b
+
+    def generate_block(self, n):
+        """
+        Generate n uniformly distributed numbers on [0, 1).
+        """
+        return self.r.random_sample(n)
+
+    def transform(self, block):
         """
-        Generate the next random number using the inverse transform method.
+        Transform the numbers to the interval [low, high) (inverse transform method).
         """
-        # TODO Task 3.1.1: Your code goes here
-        p = self.r.random()
-        x = p*self.b + self.a*(1-p)
-        return x
\ No newline at end of file
+        return block * self.b + self.a * (1 - block)
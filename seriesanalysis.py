@@ -0,0 +1,98 @@
+import math
+import numpy
+import scipy.stats
+
+"""
+This file contains functions for the offline analysis of recorded output series of a simulation (e.g. the waiting
+times stored in cnt_wt.values with SimParam.KEEP_SAMPLES).
+
+All lags of the correlogram are calculated at once with the FFT in O(n log n). From the correlogram, the integrated
+autocorrelation time and the effective sample size are derived, which tell how many independent samples a correlated
+series is worth and hence how long a simulation has to run for a given precision.
+"""
+
+
+def auto_cov(series, max_lag=None):
+    """
+    Calculate the auto covariance of a series for all lags up to max_lag.
+    Like TimeIndependentAutocorrelationCounter.get_auto_cov, the sum of the lag products is divided by n - lag.
+    :param series: sequence of values
+    :param max_lag: maximum lag (default: n - 1)
+    :return: numpy array with the auto covariance for lags 0, ..., max_lag
+    """
+    x = numpy.asarray(series, dtype=float)
+    n = len(x)
+    if n == 0:
+        raise ValueError("Series is empty.")
+    if max_lag is None:
+        max_lag = n - 1
+    if max_lag >= n:
+        raise ValueError("max_lag has to be smaller than the length of the series.")
+    x = x - x.mean()
+
+    # zero padding to at least 2n avoids the circular wrap-around of the FFT correlation
+    size = 1 << int(math.ceil(math.log(2 * n, 2)))
+    f = numpy.fft.rfft(x, size)
+    sums = numpy.fft.irfft(f * numpy.conjugate(f), size)[:max_lag + 1]
+    return sums / numpy.arange(n, n - max_lag - 1, -1)
+
+
+def auto_cor(series, max_lag=None):
+    """
+    Calculate the correlogram, i.e. the auto correlation of a series for all lags up to max_lag.
+    :param series: sequence of values
+    :param max_lag: maximum lag (default: n - 1)
+    :return: numpy array with the auto correlation for lags 0, ..., max_lag (the value for lag 0 is 1)
+    """
+    cov = auto_cov(series, max_lag)
+    if cov[0] == 0:
+        raise ValueError("not applicable, variance == 0!")
+    return cov / cov[0]
+
+
+def integrated_autocorrelation_time(series, c=5.):
+    """
+    Estimate the integrated autocorrelation time tau = 1 + 2 * sum_(k>=1) rho_k of a series.
+
+    The sum is truncated with the automatic window of Sokal: the smallest window m with m >= c * tau(m). Beyond this
+    window, the estimated correlations are dominated by noise. The correlations are estimated with the divisor n
+    (instead of n - lag), which keeps the estimate stable for large lags.
+    :param series: sequence of values
+    :param c: window factor (default 5)
+    :return: integrated autocorrelation time (1 for an uncorrelated series)
+    """
+    x = numpy.asarray(series, dtype=float)
+    n = len(x)
+    cov = auto_cov(x) * numpy.arange(n, 0, -1) / n
+    if cov[0] == 0:
+        raise ValueError("not applicable, variance == 0!")
+    taus = 2 * numpy.cumsum(cov / cov[0]) - 1
+    window = numpy.arange(n) >= c * taus
+    m = numpy.argmax(window) if window.any() else n - 1
+    return max(float(taus[m]), 1. / n)
+
+
+def effective_sample_size(series, c=5.):
+    """
+    Calculate the number of independent samples, a correlated series is worth: n / tau.
+    :param series: sequence of values
+    :param c: window factor for integrated_autocorrelation_time
+    :return: effective sample size
+    """
+    return len(series) / integrated_autocorrelation_time(series, c)
+
+
+def required_sample_size(series, epsilon, alpha=0.05, c=5.):
+    """
+    Estimate the length of the series, that is needed to get a confidence interval of the mean with half width epsilon.
+    The variance of the mean of a correlated series is tau * var / n, hence n = tau * (z * stddev / epsilon)^2.
+    :param series: sequence of values (pilot run)
+    :param epsilon: half width of the confidence interval
+    :param alpha: significance level (default: 5%)
+    :param c: window factor for integrated_autocorrelation_time
+    :return: required number of samples
+    """
+    x = numpy.asarray(series, dtype=float)
+    tau = integrated_autocorrelation_time(x, c)
+    z = scipy.stats.norm.ppf(1 - alpha / 2.)
+    return int(math.ceil(tau * (z * numpy.std(x, ddof=1) / epsilon) ** 2))
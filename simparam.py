@@ -13,6 +13,35 @@ class SimParam(object):
         self.S_VALUES = [5, 6, 7]
         self.S_MAX = 7
 
+        # buffer implementation: "ring" (lock-free ring buffer sized from S) or "queue" (Queue.Queue)
+        self.QUEUE_TYPE = "ring"
+
+        # event chain implementation: "heap" (binary heap) or "calendar" (calendar queue for many pending events)
+        self.EVENT_CHAIN_TYPE = "heap"
+
+        # recycle processed events instead of allocating new event objects
+        self.EVENT_POOLING = True
+
+        # engine of the runs until SIM_TIME: "events" (event loop) or "lindley" (vectorized Lindley recursion for an
+        # effectively infinite buffer, which falls back to the event loop, if it does not apply, see lindley.py)
+        self.ENGINE = "events"
+
+        # retain the raw samples in the counters of the CounterCollection (needed for scatter plots and bootstrapping)
+        self.KEEP_SAMPLES = False
+
+        # counters and histograms, that are created by the CounterCollection: "full", "means" or "minimal" (see
+        # COUNTER_PROFILES in countercollection.py) or a list of counter names
+        self.COUNTER_PROFILE = "full"
+
+        # directory of the on-disk cache of simulation results (None disables the cache, see resultcache.py) and the
+        # maximum size of the cached records in bytes
+        self.RESULT_CACHE = None
+        self.RESULT_CACHE_SIZE = 256 * 1024 * 1024
+
+        # also cache the counters, the system state and the event chain at the end of a run, so they can be read after
+        # a hit (records are no longer compact)
+        self.RESULT_CACHE_STATE = False
+
         # inter-arrival-time and simulation time in ms
         self.IAT = 490
         self.SIM_TIME = 100000
@@ -1,3 +1,57 @@
+import collections
+
+# scalar result fields of SimResult (e.g. sent back from a replication or counted per batch)
+RESULT_FIELDS = ["system_utilization", "packets_dropped", "packets_served", "packets_total", "mean_waiting_time",
+                 "mean_queue_length", "blocking_probability", "pasta_blocking_probability", "p50_waiting_time",
+                 "p99_waiting_time", "p999_waiting_time"]
+
+# counters of the CounterCollection, which the SimResult fields are gathered from (all other fields are taken from
+# SimState and are always available)
+RESULT_COUNTERS = {
+    "system_utilization": "cnt_sys_util",
+    "mean_waiting_time": "cnt_wt",
+    "mean_queue_length": "cnt_ql",
+    "pasta_blocking_probability": "hist_ql",
+    "p50_waiting_time": "hist_wt",
+    "p99_waiting_time": "hist_wt",
+    "p999_waiting_time": "hist_wt",
+}
+
+
+# value of results, that are not available
+nan = float("nan")
+
+
+def get_available(counter, method, args=None, default=nan):
+    """
+    Return the result of a method of a counter or default, if the counter is disabled (None) or has no values.
+    :param counter: counter object or None
+    :param method: name of the method, e.g. "get_mean"
+    :param args: argument of the method (optional)
+    :param default: value, that is returned, if the result is not available
+    """
+    if counter is None:
+        return default
+    try:
+        return getattr(counter, method)() if args is None else getattr(counter, method)(args)
+    except (ZeroDivisionError, ValueError):
+        # no values (or no simulated time) since the last reset
+        return default
+
+
+class SimResultRecord(collections.namedtuple("SimResultRecord", RESULT_FIELDS + ["ql_distribution", "wt_sketch"])):
+
+    """
+    SimResultRecord is an immutable copy of the results of a simulation run, that does not refer to the simulation.
+
+    It contains the scalar fields of SimResult (see RESULT_FIELDS) and optionally summaries of distributions: the time
+    average distribution of the queue length (tuple) and the sketch of the waiting time histogram (see
+    LogHistogram.get_sketch), which can be merged over many records. Records are small tuples without __dict__, so
+    they are cheap to pickle between processes and to keep in large numbers.
+    """
+
+    __slots__ = ()
+
 
 class SimResult(object):
 
@@ -21,22 +75,56 @@ class SimResult(object):
         self.mean_waiting_time = 0
         self.mean_queue_length = 0
         self.blocking_probability = 0
+        self.pasta_blocking_probability = 0
+        self.p50_waiting_time = 0
+        self.p99_waiting_time = 0
+        self.p999_waiting_time = 0
 
-    def gather_results(self):
+    def gather_results(self, detached=False, sketches=False):
         """
         Gather all available simulation results from SimState and CounterCollection
+        :param detached: return a SimResultRecord of the results, which does not keep the simulation alive
+        :param sketches: include the summaries of distributions in the record (see get_record)
+        :return: SimResultRecord object, if detached is True
         """
-        try:
-            self.system_utilization = self.sim.counter_collection.cnt_sys_util.get_mean()
-            self.mean_waiting_time = self.sim.counter_collection.acnt_wt.get_mean()
-            self.mean_queue_length = self.sim.counter_collection.cnt_ql.get_mean()
-        except:
-            #print "counter_collection not available for getting simulation results."
-            pass
+        # results of counters, that are disabled by the counter profile (None) or have no values in this run (or
+        # batch), are not available (nan) instead of keeping the values of a previous call
+        counter_collection = self.sim.counter_collection
+        self.system_utilization = get_available(counter_collection.cnt_sys_util, "get_mean")
+        self.mean_waiting_time = nan
+        if counter_collection.cnt_wt is not None and counter_collection.cnt_wt.get_num_samples() > 0:
+            self.mean_waiting_time = counter_collection.cnt_wt.get_mean()
+        self.mean_queue_length = get_available(counter_collection.cnt_ql, "get_mean")
+        if self.sim.sim_param.S == 0:
+            # without buffer, arriving packets are blocked while the server is busy
+            self.pasta_blocking_probability = get_available(counter_collection.cnt_sys_util, "get_mean")
+        else:
+            self.pasta_blocking_probability = get_available(counter_collection.hist_ql, "get_blocking_probability")
+        self.p50_waiting_time, self.p99_waiting_time, self.p999_waiting_time = \
+            get_available(counter_collection.hist_wt, "get_quantiles", [.5, .99, .999], [nan] * 3)
         self.packets_dropped = self.sim.sim_state.num_blocked_packets
         self.packets_served = self.sim.sim_state.num_packets - self.sim.sim_state.num_blocked_packets
         self.packets_total = self.sim.sim_state.num_packets
-        self.blocking_probability = self.sim.sim_state.get_blocking_probability()
+        self.blocking_probability = get_available(self.sim.sim_state, "get_blocking_probability")
+        if detached:
+            return self.get_record(sketches)
+
+    def get_record(self, sketches=False):
+        """
+        Return a detached SimResultRecord with the current results.
+        :param sketches: include the queue length distribution and the waiting time sketch, if the counters are enabled
+        :return: SimResultRecord object
+        """
+        ql_distribution = None
+        wt_sketch = None
+        if sketches:
+            counter_collection = self.sim.counter_collection
+            if counter_collection.hist_ql is not None and counter_collection.hist_ql.last_timestamp > \
+                    counter_collection.hist_ql.first_timestamp:
+                ql_distribution = tuple(counter_collection.hist_ql.get_distribution().tolist())
+            if counter_collection.hist_wt is not None:
+                wt_sketch = counter_collection.hist_wt.get_sketch()
+        return SimResultRecord(*([getattr(self, name) for name in RESULT_FIELDS] + [ql_distribution, wt_sketch]))
 
     def update(self):
         """
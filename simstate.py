@@ -16,6 +16,14 @@ class SimState(object):
         self.num_packets = 0
         self.num_blocked_packets = 0
 
+    def start_batch(self):
+        """
+        Reset the packet numbers and the stop flag for a new batch of the same simulation run.
+        """
+        self.stop = False
+        self.num_packets = 0
+        self.num_blocked_packets = 0
+
     def packet_accepted(self):
         """
         Count a packet that has been accepted by the system (queue or server).
@@ -1,10 +1,13 @@
 from simstate import SimState
 from systemstate import SystemState
-from event import EventChain, CustomerArrival, SimulationTermination
+from event import create_event_chain, EventPool, CustomerArrival, SimulationTermination
 from simresult import SimResult
 from simparam import SimParam
 from countercollection import CounterCollection
 from rng import RNG, ExponentialRNS
+from batchmeans import BatchMeans
+from resultcache import cached_run
+from lindley import ENGINES, LindleyEngine, can_use_lindley_engine
 
 
 class Simulation(object):
@@ -17,9 +20,11 @@ class Simulation(object):
         a specific seed.
         """
         self.sim_param = sim_param
+        self.no_seed = no_seed
         self.sim_state = SimState()
         self.system_state = SystemState(self)
-        self.event_chain = EventChain()
+        self.event_chain = create_event_chain(self)
+        self.event_pool = EventPool(self)
         self.sim_result = SimResult(self)
         self.counter_collection = CounterCollection(self)
         if no_seed:
@@ -32,59 +37,94 @@ class Simulation(object):
         """
         Reset the Simulation object.
         """
+        self.reset_state()
+        self.rng.iat_rns.set_parameters(1.)
+        self.rng.st_rns.set_parameters(1./float(self.sim_param.RHO))
+
+    def reset_state(self):
+        """
+        Reset the state, events, counters and results of the Simulation object, but not its RNG.
+        """
         self.sim_state = SimState()
         self.system_state = SystemState(self)
-        self.event_chain = EventChain()
+        self.event_chain = create_event_chain(self)
+        self.event_pool = EventPool(self)
         self.sim_result = SimResult(self)
         self.counter_collection = CounterCollection(self)
-        self.rng.iat_rns.set_parameters(1.)
-        self.rng.st_rns.set_parameters(1./float(self.sim_param.RHO))
 
     def do_simulation(self):
         """
         Do one simulation run. Initialize simulation and create first and last event.
         After that, one after another event is processed.
+        If a result cache is configured (SimParam.RESULT_CACHE), the result is taken from the cache, if available.
         :return: SimResult object
         """
-        # insert first and last event
-        self.event_chain.insert(CustomerArrival(self, 0))
-        self.event_chain.insert(SimulationTermination(self, self.sim_param.SIM_TIME))
-
-        # start simulation (run)
-        while not self.sim_state.stop:
+        return cached_run(self, ("time",), self.run_simulation)
 
-            # get next simevent from events
-            e = self.event_chain.remove_oldest_event()
-            if e:
-                # if event exists and timestamps are ok, process the event
-                if self.sim_state.now <= e.timestamp:
-                    self.sim_state.now = e.timestamp
-                    self.counter_collection.count_queue()
-                    e.process()
-                else:
-                    print "NOW: " + str(self.sim_state.now) + ", EVENT TIMESTAMP: " + str(e.timestamp)
-                    raise RuntimeError("ERROR: TIMESTAMP OF EVENT IS SMALLER THAN CURRENT TIME.")
+    def run_simulation(self):
+        """
+        Do one simulation run until SIM_TIME without using the result cache.
+        With SimParam.ENGINE = "lindley", the run is done by the LindleyEngine, if possible. If the simulation has
+        already been started or the buffer size S is reached, the run is done by the event loop.
+        :return: SimResult object
+        """
+        if self.sim_param.ENGINE not in ENGINES:
+            raise ValueError("Unknown simulation engine: " + str(self.sim_param.ENGINE))
+        if self.sim_param.ENGINE == "lindley" and can_use_lindley_engine(self):
+            rng_state = self.rng.get_state()
+            engine = LindleyEngine(self)
+            try:
+                return engine.do_simulation()
+            except ValueError:
+                if engine.max_queue_length <= self.sim_param.S:
+                    raise
+            # the buffer is not effectively infinite: repeat the run with the same random numbers
+            self.reset_state()
+            self.rng.set_state(rng_state)
 
-            else:
-                print "Event chain is empty. Abort"
-                self.sim_state.stop = True
+        # insert first and last event
+        self.event_chain.insert(self.event_pool.acquire(CustomerArrival, 0))
+        self.event_chain.insert(SimulationTermination(self, self.sim_param.SIM_TIME))
 
-        # gather results for sim_result object
-        self.sim_result.gather_results()
-        return self.sim_result
+        return self.process_events()
 
     def do_simulation_n_limit(self, n, new_batch=False):
         """
         Call this function, if the simulation should stop after a given number of packets
         Do one simulation run. Initialize simulation and create first event.
         After that, one after another event is processed.
+        If a result cache is configured (SimParam.RESULT_CACHE), the result is taken from the cache, if available.
         :param n: number of customers, that are processed before the simulation stops
         :return: SimResult object
         """
         # insert first event only if no new batch has been started
-        if not new_batch:
-            self.event_chain.insert(CustomerArrival(self, 0))
+        if new_batch:
+            return self.process_events(n)
+
+        def run():
+            self.event_chain.insert(self.event_pool.acquire(CustomerArrival, 0))
+            return self.process_events(n)
+        return cached_run(self, ("packets", n), run)
+
+    def do_simulation_batch_means(self, batch_packets=None, batch_time=None, max_batches=None, alpha=None,
+                                  epsilon=None, field="blocking_probability", min_batches=5):
+        """
+        Do one long simulation run, which is divided into batches of batch_packets packets or batch_time ms.
+        The results of every batch are counted, until max_batches batches are done or the confidence interval of the
+        given field is smaller than epsilon (see BatchMeans).
+        :return: BatchMeans object with the counters of all SimResult fields
+        """
+        batch_means = BatchMeans(self, batch_packets, batch_time)
+        batch_means.run(max_batches, alpha, epsilon, field, min_batches)
+        return batch_means
 
+    def process_events(self, n=float("inf")):
+        """
+        Process one event after another until the simulation is stopped (e.g. by a SimulationTermination event) or
+        n packets have arrived.
+        :param n: number of customers, that are processed before the simulation stops
+        :return: SimResult object
+        """
         # start simulation (run)
         while not self.sim_state.stop:
 
@@ -94,8 +134,8 @@ class Simulation(object):
                 # if event exists and timestamps are ok, process the event
                 if self.sim_state.now <= e.timestamp:
                     self.sim_state.now = e.timestamp
-                    self.counter_collection.count_queue()
                     e.process()
+                    self.event_pool.release(e)
 
                     if self.sim_state.num_packets >= n:
                         self.sim_state.stop = True
@@ -108,6 +148,7 @@ class Simulation(object):
                 print "Event chain is empty. Abort"
                 self.sim_state.stop = True
 
-        # gather results for sim_result object
+        # count the state until the end of the run and gather results for sim_result object
+        self.system_state.count_state()
         self.sim_result.gather_results()
         return self.sim_result
@@ -0,0 +1,81 @@
+import cPickle
+import os
+import numpy
+from replication import derive_seed
+
+"""
+This file contains snapshots of running simulations. A snapshot contains the complete state of a simulation: the
+simulation parameters, the event chain and the event pool, the system state with the buffer and the packet ledger,
+the simulation state, the positions of the random number streams and all counters.
+
+A restored simulation continues exactly like the original one, e.g. after a warm-up:
+
+    sim = Simulation(sim_param)
+    sim.event_chain.insert(sim.event_pool.acquire(CustomerArrival, 0))
+    sim.process_events(10000)
+    sim.counter_collection.reset()
+    sim.sim_state.start_batch()
+    for fork in fork_simulation(sim, 10):
+        fork.event_chain.insert(SimulationTermination(fork, fork.sim_state.now + 100000))
+        fork.process_events()
+
+The snapshot is a pickle of the simulation. Counters and random number streams, that hold objects which can't be
+pickled (iterators, bound functions, locks), store their plain data and rebuild these objects on restore.
+"""
+
+
+def take_snapshot(sim):
+    """
+    Return a snapshot of the current state of a simulation.
+    :param sim: simulation object
+    :return: binary string
+    """
+    return cPickle.dumps(sim, cPickle.HIGHEST_PROTOCOL)
+
+
+def restore_snapshot(snapshot):
+    """
+    Create a simulation from a snapshot, which continues like the simulation, the snapshot was taken from.
+    :param snapshot: binary string returned by take_snapshot
+    :return: simulation object
+    """
+    return cPickle.loads(snapshot)
+
+
+def fork_simulation(sim, n, reseed=True):
+    """
+    Create n independent continuations of a simulation.
+    :param sim: simulation object
+    :param n: number of forks
+    :param reseed: if True, fork i draws new random numbers with the seeds derive_seed(SEED_IAT, i) and
+                   derive_seed(SEED_ST, i), otherwise all forks continue the random number streams of the simulation
+    :return: list of simulation objects
+    """
+    snapshot = take_snapshot(sim)
+    forks = []
+    for i in range(n):
+        fork = restore_snapshot(snapshot)
+        if reseed:
+            for rns, seed in [(fork.rng.iat_rns, fork.sim_param.SEED_IAT), (fork.rng.st_rns, fork.sim_param.SEED_ST)]:
+                rns.set_state((numpy.random.RandomState(derive_seed(seed, i)).get_state(), numpy.zeros(0)))
+        forks.append(fork)
+    return forks
+
+
+def save_snapshot(sim, path):
+    """
+    Write a snapshot of a simulation to a file. The file is replaced atomically, so a previous snapshot survives an
+    interruption while writing.
+    """
+    with open(path + ".tmp", "wb") as f:
+        f.write(take_snapshot(sim))
+    os.rename(path + ".tmp", path)
+
+
+def load_snapshot(path):
+    """
+    Restore a simulation from a file written by save_snapshot.
+    :return: simulation object
+    """
+    with open(path, "rb") as f:
+        return restore_snapshot(f.read())
@@ -0,0 +1,210 @@
+import ast
+import copy
+import csv
+import itertools
+import multiprocessing
+import os
+from replication import derive_seed, run_replication
+from simresult import RESULT_FIELDS
+
+"""
+This file contains the parameter sweep, which runs replications of a simulation for a grid of parameter values on a
+pool of worker processes, e.g.
+
+    sweep = ParameterSweep(SimParam(), {"RHO": [.5, .9], "S": [5, 10]}, replications=30, output="sweep.csv")
+    sweep.run()
+    sweep.get_column("blocking_probability", RHO=.9, S=5)
+"""
+
+
+def expand_grid(grid):
+    """
+    Expand a grid of parameter values into the list of its points.
+    :param grid: dict (or list of pairs) of SimParam field name and list of values; the fields of a dict are sorted
+                 by name, the first field varies slowest
+    :return: list of dicts with one value per field
+    """
+    items = sorted(grid.items()) if isinstance(grid, dict) else list(grid)
+    names = [name for name, _ in items]
+    return [dict(zip(names, values)) for values in itertools.product(*[values for _, values in items])]
+
+
+def parse_value(text):
+    """
+    Parse a value written with repr to the CSV file of a sweep.
+    """
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        # nan and inf are not python literals
+        return float(text)
+
+
+def run_point(args):
+    """
+    Run a single replication of a point of the sweep. This function is executed in the worker processes.
+    :param args: tuple of point index, replication index, sim_param and n_limit
+    :return: tuple of point index, replication index and the SimResultRecord of the replication
+    """
+    point, replication, sim_param, n_limit = args
+    return point, replication, run_replication((sim_param, n_limit))
+
+
+class ParameterSweep(object):
+
+    """
+    ParameterSweep runs independent replications for every point of a list or grid of SimParam overrides.
+
+    All replications of all points are scheduled at once on a pool of worker processes. Like in the
+    ReplicationRunner, replication i uses the seeds derive_seed(SEED_IAT, i) and derive_seed(SEED_ST, i), so all points
+    see the same random streams (common random numbers) and the results do not depend on the number of processes.
+    With derive_seeds=False, all replications use the seeds SEED_IAT and SEED_ST of the base parameters instead, e.g.
+    for a study with a single run per point and fixed seeds.
+
+    The results are collected in a table with one row per replication: the overridden parameters, the column
+    "replication" and the fields of SimResult (see RESULT_FIELDS). Rows are added in the order, in which the
+    replications finish, and, if an output file is given, appended to this CSV file immediately. A sweep with an
+    existing output file loads its rows and only runs the missing replications, so an interrupted campaign can be
+    resumed.
+    """
+
+    def __init__(self, sim_param, points, replications=1, processes=None, n_limit=None, output=None,
+                 derive_seeds=True):
+        """
+        Create the sweep.
+        :param sim_param: SimParam object with the base parameters, which is copied for every replication
+        :param points: list of dicts of SimParam overrides or a grid (see expand_grid)
+        :param replications: number of replications per point
+        :param processes: number of worker processes (default: number of cores), 1 runs all replications serially
+        :param n_limit: if given, every replication stops after n_limit packets instead of SIM_TIME
+        :param output: path of a CSV file, to which the rows are streamed and from which a sweep is resumed
+        :param derive_seeds: if False, all replications use the seeds of sim_param instead of derived seeds
+        """
+        self.sim_param = sim_param
+        self.points = expand_grid(points) if isinstance(points, dict) else list(points)
+        self.parameters = sorted(set(name for point in self.points for name in point))
+        for name in self.parameters:
+            if not hasattr(sim_param, name):
+                raise ValueError("Unknown SimParam field " + str(name) + ".")
+        self.replications = replications
+        self.processes = processes if processes else multiprocessing.cpu_count()
+        self.n_limit = n_limit
+        self.output = output
+        self.derive_seeds = derive_seeds
+        self.columns = self.parameters + ["replication"] + RESULT_FIELDS
+        self.rows = []
+        self.done = set()
+        if output is not None and os.path.exists(output):
+            self.load(output)
+
+    def get_key(self, row):
+        """
+        :return: key of a row or of a point (with replication index), which identifies completed replications
+        """
+        return tuple(repr(row.get(name)) for name in self.parameters) + (row["replication"],)
+
+    def load(self, path):
+        """
+        Load the rows of a previous run of the sweep from a CSV file.
+        An incomplete last line (of an interrupted write) is removed from the file, its replication is run again.
+        """
+        with open(path, "rb+") as f:
+            content = f.read()
+            if content and not content.endswith("\n"):
+                f.truncate(content.rfind("\n") + 1)
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, "rb") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != self.columns:
+                raise ValueError("Columns of " + path + " do not match the sweep.")
+            for line in reader:
+                row = dict((name, parse_value(line[name])) for name in self.columns)
+                self.add_row(row)
+
+    def add_row(self, row):
+        """
+        Add a row to the table and mark its replication as completed.
+        """
+        self.rows.append(row)
+        self.done.add(self.get_key(row))
+
+    def get_replication_param(self, point, replication):
+        """
+        :return: copy of the simulation parameters with the overrides of a point and the seeds of a replication
+        """
+        sim_param = copy.deepcopy(self.sim_param)
+        for name, value in point.items():
+            setattr(sim_param, name, value)
+        if self.derive_seeds:
+            sim_param.SEED_IAT = derive_seed(sim_param.SEED_IAT, replication)
+            sim_param.SEED_ST = derive_seed(sim_param.SEED_ST, replication)
+        return sim_param
+
+    def get_pending(self):
+        """
+        :return: list of (point index, replication index), that have not been run yet
+        """
+        pending = []
+        for i, point in enumerate(self.points):
+            for r in range(self.replications):
+                row = dict(point, replication=r)
+                if self.get_key(row) not in self.done:
+                    pending.append((i, r))
+        return pending
+
+    def run(self, callback=None):
+        """
+        Run all pending replications.
+        :param callback: function, which is called with every new row as soon as its replication has finished
+        :return: list of all rows
+        """
+        args = [(i, r, self.get_replication_param(self.points[i], r), self.n_limit) for i, r in self.get_pending()]
+        if not args:
+            return self.rows
+
+        writer = None
+        f = None
+        if self.output is not None:
+            new_file = not os.path.exists(self.output) or os.path.getsize(self.output) == 0
+            f = open(self.output, "ab")
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(self.columns)
+
+        pool = None
+        try:
+            if self.processes == 1:
+                results = itertools.imap(run_point, args)
+            else:
+                pool = multiprocessing.Pool(self.processes)
+                results = pool.imap_unordered(run_point, args)
+            for i, r, result in results:
+                row = dict(self.points[i], replication=r)
+                row.update((name, getattr(result, name)) for name in RESULT_FIELDS)
+                self.add_row(row)
+                if writer is not None:
+                    writer.writerow([repr(row.get(name)) for name in self.columns])
+                    f.flush()
+                if callback is not None:
+                    callback(row)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if f is not None:
+                f.close()
+        return self.rows
+
+    def get_rows(self, **params):
+        """
+        Return the rows of a point, ordered by replication index, e.g. get_rows(RHO=.9, S=5).
+        """
+        rows = [row for row in self.rows if all(row.get(name) == value for name, value in params.items())]
+        return sorted(rows, key=lambda row: (self.get_key(row)[:-1], row["replication"]))
+
+    def get_column(self, name, **params):
+        """
+        Return a column of the rows of a point, ordered by replication index.
+        """
+        return [row[name] for row in self.get_rows(**params)]
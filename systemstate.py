@@ -1,5 +1,5 @@
-from finitequeue import FiniteQueue
-from packet import Packet
+from finitequeue import create_queue
+from packet import PacketLedger
 
 
 class SystemState(object):
@@ -14,6 +14,12 @@ class SystemState(object):
     The integer variable buffer_content represents the buffer fill status, the flag
     server_busy indicates whether the server is busy or idle.
 
+    Packets are not stored as objects, but as integer ids referring to the packet ledger,
+    which keeps the timestamps of all packets in the system.
+
+    The time dependent counters are only informed when the queue length or the server status changes: right before
+    the change, the old state is counted for the time since the last change.
+
     The simulation object is only used to determine the maximum buffer space as
     determined in its object sim_param.
     """
@@ -25,12 +31,22 @@ class SystemState(object):
         packets in buffer
         :return: system_state object
         """
-        self.buffer = FiniteQueue(sim)
+        self.buffer = create_queue(sim)
+        self.ledger = PacketLedger(sim, sim.sim_param.S + 2)
         self.server_busy = False
-        self.served_packet = None
+        self.served_id = None
         self.sim = sim
         self.last_arrival = 0
 
+    @property
+    def served_packet(self):
+        """
+        Packet object of the packet currently in service (None if the server is idle).
+        """
+        if self.served_id is None:
+            return None
+        return self.ledger.get_packet(self.served_id)
+
     def add_packet_to_server(self):
         """
         Try to add a packet to the server unit.
@@ -39,10 +55,11 @@ class SystemState(object):
         if self.server_busy:
             return False
         else:
+            self.count_state()
             self.server_busy = True
-            self.served_packet = Packet(self.sim, self.sim.sim_state.now - self.last_arrival)
+            self.served_id = self.ledger.add_packet(self.sim.sim_state.now - self.last_arrival)
             self.last_arrival = self.sim.sim_state.now
-            self.served_packet.start_service()
+            self.ledger.start_service(self.served_id)
             return True
 
     def add_packet_to_queue(self):
@@ -50,23 +67,29 @@ class SystemState(object):
         Try to add a packet to the buffer.
         :return: True if buffer/queue is not full and packet has been added successfully.
         """
-        if self.buffer.add(Packet(self.sim, self.sim.sim_state.now - self.last_arrival)):
-            self.last_arrival = self.sim.sim_state.now
-            return True
-        else:
-            self.last_arrival = self.sim.sim_state.now
+        now = self.sim.sim_state.now
+        if self.buffer.is_full():
+            self.last_arrival = now
             return False
+        else:
+            self.count_state()
+            self.buffer.add(self.ledger.add_packet(now - self.last_arrival))
+            self.last_arrival = now
+            return True
 
     def complete_service(self):
         """
         Reset server status to idle after a service completion.
+        :return: id of the completed packet
         """
+        self.count_state()
         self.server_busy = False
-        p = self.served_packet
-        p.complete_service()
-        self.sim.counter_collection.count_packet(p)
-        self.served_packet = None
-        return p
+        packet_id = self.served_id
+        self.ledger.complete_service(packet_id)
+        self.sim.counter_collection.count_packet(self.ledger, packet_id)
+        self.ledger.release(packet_id)
+        self.served_id = None
+        return packet_id
 
     def start_service(self):
         """
@@ -76,11 +99,19 @@ class SystemState(object):
         if self.buffer.is_empty():
             return False
         else:
-            self.served_packet = self.buffer.remove()
-            self.served_packet.start_service()
+            self.count_state()
+            self.served_id = self.buffer.remove()
+            self.ledger.start_service(self.served_id)
             self.server_busy = True
             return True
 
+    def count_state(self):
+        """
+        Count the current queue length and server status, which have been valid since the last change.
+        This function is called before every change of the state and at the end of a simulation run.
+        """
+        self.sim.counter_collection.count_state(self.buffer.get_queue_length(), self.server_busy)
+
     def get_queue_length(self):
         """
         Return the current buffer content.